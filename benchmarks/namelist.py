@@ -0,0 +1,148 @@
+"""namelistの読み込みのベンチマーク.
+
+テンプレートから合成したplasma.inpのコーパスについて, 以下を比較する.
+
+    parse  : emout.InpFile (f90nml) と namelist.load
+    values : Loader.load_values と Loader.read_values (GUIの値の辞書まで)
+
+全てのファイルについて, dumps()が元のファイルとバイト単位で一致すること,
+値がf90nmlと一致することも確認する. 確認に失敗した場合や,
+parseの速度比が--min-speedupを下回った場合は終了コード1を返す.
+
+使い方:
+    python benchmarks/namelist.py
+    python benchmarks/namelist.py --files 5000 --min-speedup 10
+"""
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from argparse import ArgumentParser
+
+from emses_inp_generator import namelist
+from emses_inp_generator.batch import InpGenerator
+
+# コーパスの元となる設定 (GUIの値の上書き)
+BASES = (
+    {},
+    {'use_pe': True, 'Jp': 10.0},
+    {'use_em': True, 'use_pe': True, 'Jp': 10.0},
+)
+
+COMMENTS = (
+    '',
+    '  ! edited by hand\n',
+    '! sweep point\n',
+)
+
+
+def create_corpus(directory, nfiles, seed=0):
+    """nfiles個のファイルを作り, パスのリストを返す."""
+    rng = random.Random(seed)
+    generator = InpGenerator()
+
+    bases = []
+    for i, overrides in enumerate(BASES):
+        filename = os.path.join(directory, 'base{}.inp'.format(i))
+        generator.save(filename, overrides)
+        with open(filename, 'r', encoding='utf-8') as f:
+            bases.append(f.read())
+
+    filenames = []
+    for i in range(nfiles):
+        inp = namelist.parse(rng.choice(bases))
+        inp.set('tmgrid', 'nx', rng.choice([32, 64, 128]))
+        inp.set('jobcon', 'nstep', rng.randrange(1000, 1000000))
+        inp.set('plasma', 'wc', rng.uniform(0, 1))
+        path = inp.get('intp', 'path')
+        inp.set('intp', 'path', [value * rng.uniform(0.5, 2) for value in path],
+                start_index=inp.start_index('intp', 'path'))
+
+        text = inp.dumps()
+        comment = rng.choice(COMMENTS)
+        if comment:
+            lines = text.splitlines(keepends=True)
+            index = rng.randrange(1, len(lines))
+            text = ''.join(lines[:index] + [comment] + lines[index:])
+
+        filename = os.path.join(directory, '{:06d}.inp'.format(i))
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        filenames.append(filename)
+    return filenames
+
+
+def timeit(function, filenames):
+    # timeitモジュールと同じく, 計測中はGCを止める
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        results = [function(filename) for filename in filenames]
+        return time.perf_counter() - start, results
+    finally:
+        gc.enable()
+
+
+def verify(filenames, fast, slow):
+    """(バイト単位で一致しないファイル数, 値が一致しないファイル数) を返す."""
+    roundtrip_errors = 0
+    value_errors = 0
+    for filename, a, b in zip(filenames, fast, slow):
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            if a.dumps() != f.read():
+                roundtrip_errors += 1
+
+        expected = {name: dict(group) for name, group in b.nml.items()}
+        if a.to_dict() != expected:
+            value_errors += 1
+    return roundtrip_errors, value_errors
+
+
+def report(name, slow, fast, nfiles):
+    print('{:<7} f90nml {:8.3f} s ({:7.1f} us/file)  fast {:8.3f} s ({:7.1f} us/file)'
+          '  x{:.1f}'.format(name, slow, slow / nfiles * 1e6,
+                             fast, fast / nfiles * 1e6, slow / fast))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-speedup', type=float, default=10.0,
+                        help='Required speedup of parsing over f90nml')
+    args = parser.parse_args()
+
+    from emout import InpFile
+
+    # f90nmlは範囲外の値などで警告を出すため, 計測中は表示しない
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filenames = create_corpus(tmpdir, args.files, args.seed)
+        loader = InpGenerator().loader
+
+        slow, slow_files = timeit(InpFile, filenames)
+        fast, fast_files = timeit(namelist.load, filenames)
+        report('parse', slow, fast, len(filenames))
+        speedup = slow / fast
+
+        slow, slow_values = timeit(loader.load_values, filenames)
+        fast, fast_values = timeit(loader.read_values, filenames)
+        report('values', slow, fast, len(filenames))
+
+        roundtrip_errors, value_errors = verify(filenames, fast_files, slow_files)
+        value_errors += sum(a[1] != b[1] for a, b in zip(fast_values, slow_values))
+
+    print('round trip errors: {}, value errors: {}'.format(roundtrip_errors, value_errors))
+    ok = roundtrip_errors == 0 and value_errors == 0 and speedup >= args.min_speedup
+    if speedup < args.min_speedup:
+        print('parse speedup x{:.1f} is below x{:.1f}'.format(speedup, args.min_speedup))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""起動時間のベンチマーク.
+
+`python -X importtime`で以下を計測し, 予算を超えた場合や
+GUI関連のモジュールが読み込まれた場合は終了コード1を返す.
+
+    help   : inpgen --help (インタプリタ自体の起動時間を除く)
+    import : import emses_inp_generator.batch
+    save   : GUIを用いない1ファイルの生成 (emoutの読み込みを含む)
+
+使い方:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --help-budget 100 --repeat 10
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+# GUIを用いない処理で読み込まれてはならないモジュール
+GUI_MODULES = ('PySimpleGUI', 'tkinter', '_tkinter')
+
+HELP_FORBIDDEN = GUI_MODULES + ('emout', 'numpy', 'f90nml')
+IMPORT_FORBIDDEN = GUI_MODULES + ('emout',)
+SAVE_FORBIDDEN = GUI_MODULES
+
+SAVE_SCRIPT = """
+import sys
+from emses_inp_generator.batch import InpGenerator
+InpGenerator().save(sys.argv[1], {'use_pe': True})
+"""
+
+IMPORTTIME_PATTERN = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def run_importtime(args):
+    """(経過時間[ms], {モジュール名: (ネストの深さ, 累積import時間[us])}) を返す."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    elapsed = (time.perf_counter() - start) * 1e3
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_PATTERN.match(line)
+        if m:
+            modules[m.group(4)] = (len(m.group(3)), int(m.group(2)))
+    return elapsed, modules
+
+
+def best_of(repeat, args):
+    results = [run_importtime(args) for _ in range(repeat)]
+    return min(results, key=lambda result: result[0])
+
+
+def own_import_ms(modules):
+    """emses_inp_generator配下のモジュールのimport時間 (依存モジュールを含む) [ms]."""
+    depths = [depth for depth, _ in modules.values()]
+    top = min(depths) if depths else 0
+    total = sum(cumulative for name, (depth, cumulative) in modules.items()
+                if depth == top and name.startswith('emses_inp_generator'))
+    return total / 1e3
+
+
+def check(name, elapsed, modules, forbidden, budget=None, baseline=0.0):
+    loaded = [module for module in forbidden if module in modules]
+    overhead = elapsed - baseline
+    ok = not loaded and (budget is None or overhead <= budget)
+
+    print('{:<7} {:8.1f} ms (overhead {:7.1f} ms, package import {:6.1f} ms){}'.format(
+        name, elapsed, overhead, own_import_ms(modules),
+        '' if budget is None else ' budget {:.0f} ms'.format(budget)))
+    if loaded:
+        print('        loaded forbidden modules: {}'.format(', '.join(loaded)))
+    if budget is not None and overhead > budget:
+        print('        over budget')
+    return ok
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--help-budget', type=float, default=100.0,
+                        help='Budget of inpgen --help beyond interpreter startup [ms]')
+    parser.add_argument('--import-budget', type=float, default=100.0,
+                        help='Budget of importing the batch API [ms]')
+    parser.add_argument('--save-budget', type=float, default=None,
+                        help='Budget of a headless save [ms] (default: not checked)')
+    args = parser.parse_args()
+
+    baseline, _ = best_of(args.repeat, ['-c', 'pass'])
+    print('python  {:8.1f} ms (interpreter startup)'.format(baseline))
+
+    ok = True
+
+    elapsed, modules = best_of(args.repeat, ['-m', 'emses_inp_generator.main', '--help'])
+    ok &= check('help', elapsed, modules, HELP_FORBIDDEN,
+                budget=args.help_budget, baseline=baseline)
+
+    elapsed, modules = best_of(args.repeat, ['-c', 'import emses_inp_generator.batch'])
+    ok &= check('import', elapsed, modules, IMPORT_FORBIDDEN,
+                budget=args.import_budget, baseline=baseline)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'plasma.inp')
+        elapsed, modules = best_of(args.repeat, ['-c', SAVE_SCRIPT, filename])
+    ok &= check('save', elapsed, modules, SAVE_FORBIDDEN,
+                budget=args.save_budget, baseline=baseline)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,30 @@
 from .additional_parameter import AdditionalParameters
-from .charge_acceleration import ChargeAccelerationParameters
-from .simple_plasma import SimplePlasmaParameters
-from .boundary import BoundaryParameters
-from .photo_electron import PhotoParameters
-from .pic import PICParameters
-from .simple_hole import SimpleHoleParameters
-from .file_io_parameter import FileIOParameters
+from .registry import (BUILTIN_PLUGINS, ENTRY_POINT_GROUP, ParameterPlugin, active_plugins,
+                       available_plugins, register_plugin)
 
-def add_additional_parameter(config, window_creator, loader, saver):
-    param_classes = [
-        (SimplePlasmaParameters, 10),
-        (PICParameters, 50),
-        (PhotoParameters, 100),
-        (BoundaryParameters, 150),
-        (SimpleHoleParameters, 200),
-        (FileIOParameters, 300),
-        (ChargeAccelerationParameters, 800),
-    ]
+# パラメータのクラスは使うときに読み込む (registry.pyを参照)
+_CLASSES = {
+    'SimplePlasmaParameters': 'simple_plasma',
+    'PICParameters': 'pic',
+    'PhotoParameters': 'photo_electron',
+    'BoundaryParameters': 'boundary',
+    'SimpleHoleParameters': 'simple_hole',
+    'FileIOParameters': 'file_io',
+    'ChargeAccelerationParameters': 'charge_acceleration',
+}
+
+
+def __getattr__(name):
+    if name in _CLASSES:
+        plugin = next(p for p in BUILTIN_PLUGINS if p.name == _CLASSES[name])
+        return plugin.load()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
-    param_classes.sort(key=lambda x: x[1])
-    for param_class, _ in param_classes:
-        if param_class.is_active(config):
-            param_class().add_parameters(window_creator, loader, saver)
+
+def add_additional_parameter(config, window_creator, loader, saver):
+    params = []
+    for plugin in active_plugins(config):
+        param = plugin.load()()
+        param.add_parameters(window_creator, loader, saver)
+        params.append(param)
+    return params
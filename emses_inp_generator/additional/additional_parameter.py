@@ -1,18 +1,24 @@
 class AdditionalParameters:
     def add_parameters(self, window_creator, loader, saver):
-        window_creator.add_tab_creator(self.create_tab)
+        # window_creator is None when running without GUI (headless generation).
+        if window_creator is not None:
+            window_creator.add_tab_creator(self.create_tab)
         self.add_applyers(loader)
         self.add_savers(saver)
-    
+
     @classmethod
     def is_active(cls, config):
         return True
-    
+
+    def default_values(self):
+        """GUIのキーとその初期値の辞書を返す."""
+        return {}
+
     def create_tab(self):
         raise NotImplementedError()
-    
+
     def add_applyers(self, loader):
         raise NotImplementedError()
 
     def add_savers(self, saver):
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
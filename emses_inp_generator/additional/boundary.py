@@ -13,9 +13,10 @@ GUIのキー:
     npbndx[0-2] : Particles Boundary Y
     npbndx[0-2] : Particles Boundary Z
 """
-import PySimpleGUI as sg
-from ..gui import radio_box, selectIndex
+from ..lazy import sg
+from ..gui import radio_box, radio_values, selectIndex
 
+from ..species import count_species
 from . import AdditionalParameters
 
 
@@ -24,6 +25,14 @@ class BoundaryParameters(AdditionalParameters):
     def is_active(cls, config):
         return config['Control'].getboolean('ControlBoundaryParameter')
 
+    def default_values(self):
+        values = {}
+        for axis in 'xyz':
+            values.update(radio_values('nfbnd' + axis, 2))
+            values.update(radio_values('npbnd' + axis, 3))
+            values.update(radio_values('mtd_vbnd' + axis, 3))
+        return values
+
     def create_tab(self):
         layout = [
             radio_box('Field Boundary X', 'periodic',
@@ -76,10 +85,13 @@ class BoundaryParameters(AdditionalParameters):
         loader.add_applyer('mtd_vbndz2', lambda i, u: i['mtd_vbnd'][2] == 2)
 
     def add_savers(self, saver):
-        saver.add_saver(self._save_boundary)
+        depends = ['use_pe', 'extra_species']
+        for name, n in (('nfbnd', 2), ('npbnd', 3), ('mtd_vbnd', 3)):
+            depends += ['{}{}{}'.format(name, axis, i) for axis in 'xyz' for i in range(n)]
+        saver.add_saver(self._save_boundary, depends=depends)
 
     def _save_boundary(self, inp, values, unit):
-        nspec = 3 if values['use_pe'] else 2
+        nspec = count_species(values)
         inp.setlist('system', 'nfbnd', [selectIndex(values, 'nfbndx'),
                                         selectIndex(values, 'nfbndy'),
                                         selectIndex(values, 'nfbndz')])
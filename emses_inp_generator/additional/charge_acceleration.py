@@ -7,7 +7,7 @@
 GUIのキー:
     np_per_grid: Number of super particles per grid
 """
-import PySimpleGUI as sg
+from ..lazy import sg
 from ..gui import parameter, radio_box
 
 from . import AdditionalParameters
@@ -18,10 +18,14 @@ class ChargeAccelerationParameters(AdditionalParameters):
     def is_active(cls, config):
         return config['Control'].getboolean('ControlChargeAccelerationParameter')
 
+    def default_values(self):
+        return {'grad_coef': 1.0, 'smooth_coef': 1.0}
+
     def create_tab(self):
+        defaults = self.default_values()
         layout = [
-            parameter('Acceleration coefficient', 1.0, key='grad_coef'),
-            parameter('Smoothing coefficient', 1.0, key='smooth_coef'),
+            parameter('Acceleration coefficient', defaults['grad_coef'], key='grad_coef'),
+            parameter('Smoothing coefficient', defaults['smooth_coef'], key='smooth_coef'),
         ]
         return sg.Tab('帯電加速', layout)
 
@@ -30,7 +34,7 @@ class ChargeAccelerationParameters(AdditionalParameters):
         loader.add_applyer('smooth_coef', lambda i, u: i['smooth_coef'])
 
     def add_savers(self, saver):
-        saver.add_saver(self._save)
+        saver.add_saver(self._save, depends=('grad_coef', 'smooth_coef'))
 
     def _save(self, inp, values, unit):
         inp['gradema']['grad_coef'] = float(values['grad_coef'])
@@ -23,9 +23,10 @@ GUIのキー:
     pxxyz[0-2] : Output particle position xyz
     pvxyz[0-2] : Ouptput particle velocity xyz
 """
-import PySimpleGUI as sg
-from ..gui import parameter, checkboxes
+from ..lazy import sg
+from ..gui import parameter, checkboxes, checkbox_values
 
+from ..species import count_species, setvector
 from . import AdditionalParameters
 
 
@@ -34,9 +35,26 @@ class FileIOParameters(AdditionalParameters):
     def is_active(cls, config):
         return config['Control'].getboolean('ControlFileIOParameter')
 
+    def default_values(self):
+        values = {
+            'hdfdigstart': 0,
+            'output_field_interval': 10000,
+            'output_particles_interval': 0,
+            'ipadig': 1024,
+        }
+        values.update(checkbox_values('output_potential', 1, defaults=True))
+        values.update(checkbox_values('efxyz', 3, defaults=True))
+        values.update(checkbox_values('mfxyz', 3, defaults=True))
+        values.update(checkbox_values('ijxyz', 3, defaults=True))
+        values.update(checkbox_values('pxxyz', 3, defaults=False))
+        values.update(checkbox_values('pvxyz', 3, defaults=False))
+        return values
+
     def create_tab(self):
+        defaults = self.default_values()
         field_layout = [
-            parameter('Output field step interval [step]', 10000,
+            parameter('Output field step interval [step]',
+                      defaults['output_field_interval'],
                       key='output_field_interval'),
             [checkboxes('Output charge density and potential', '',
                         base_key='output_potential',
@@ -54,9 +72,10 @@ class FileIOParameters(AdditionalParameters):
         field_frame = sg.Frame('Field', field_layout)
 
         particle_layout = [
-            parameter('Output particles step interval [step]', 0,
+            parameter('Output particles step interval [step]',
+                      defaults['output_particles_interval'],
                       key='output_particles_interval'),
-            parameter('Number of output particles', 1024,
+            parameter('Number of output particles', defaults['ipadig'],
                       key='ipadig'),
             [checkboxes('Output particle position', 'x', 'y', 'z',
                         base_key='pxxyz',
@@ -67,7 +86,7 @@ class FileIOParameters(AdditionalParameters):
         ]
         particle_frame = sg.Frame('Particles', particle_layout)
         layout = [
-            parameter('Steps to start output [step]', 0,
+            parameter('Steps to start output [step]', defaults['hdfdigstart'],
                       key='hdfdigstart'),
             [field_frame],
             [particle_frame]
@@ -105,20 +124,29 @@ class FileIOParameters(AdditionalParameters):
         loader.add_applyer('pvxyz2', lambda i, u: i['ipaxyz'][5] == 1)
 
     def add_savers(self, saver):
-        saver.add_saver(self._save_steps)
-        saver.add_saver(self._save_ifjxyz)
-        saver.add_saver(self._save_ipaxyz)
+        saver.add_saver(self._save_steps,
+                        depends=('use_pe', 'extra_species', 'hdfdigstart', 'output_field_interval',
+                                 'output_particles_interval', 'ipadig'))
+        saver.add_saver(self._save_ifjxyz,
+                        depends=['efxyz{}'.format(i) for i in range(3)]
+                        + ['mfxyz{}'.format(i) for i in range(3)]
+                        + ['ijxyz{}'.format(i) for i in range(3)]
+                        + ['output_potential0'])
+        saver.add_saver(self._save_ipaxyz,
+                        depends=['use_pe', 'extra_species']
+                        + ['pxxyz{}'.format(i) for i in range(3)]
+                        + ['pvxyz{}'.format(i) for i in range(3)])
 
     def _save_steps(self, inp, values, unit):
-        nspec = 3 if values['use_pe'] else 2
+        nspec = count_species(values)
 
         inp['digcon']['hdfdigstart'] = int(values['hdfdigstart'])
         inp['digcon']['ifdiag'] = int(values['output_field_interval'])
         inp['digcon']['ijdiag'] = int(values['output_field_interval'])
 
-        inp.setlist('digcon', 'ipahdf', [
-                    int(values['output_particles_interval'])] * nspec)
-        inp.setlist('digcon', 'ipadig', [int(values['ipadig'])] * nspec)
+        setvector(inp, 'digcon', 'ipahdf',
+                  [int(values['output_particles_interval'])] * nspec)
+        setvector(inp, 'digcon', 'ipadig', [int(values['ipadig'])] * nspec)
 
     def _save_ifjxyz(self, inp, values, unit):
         efxyzs = [int(values['efxyz{}'.format(i)]) for i in range(3)]
@@ -130,7 +158,7 @@ class FileIOParameters(AdditionalParameters):
         inp.setlist('digcon', 'ijxyz', ijxyzs)
 
     def _save_ipaxyz(self, inp, values, unit):
-        nspec = 3 if values['use_pe'] else 2
+        nspec = count_species(values)
         pxxyzs = [int(values['pxxyz{}'.format(i)]) for i in range(3)]
         pvxyzs = [int(values['pvxyz{}'.format(i)]) for i in range(3)]
         inp['digcon']['ipaxyz'] = [*pxxyzs, *pvxyzs] * nspec
@@ -1,28 +1,28 @@
 """光電子のパラメータを管理する.
 
-管理するパラメータ:
-    &plasma
-        wp(3)
+管理するパラメータ (光電子は最後の種で, 番号はnspec):
     &intp
-        qm(3)
-        path(3)
-        peth(3)
-        npin(3)
-        np(3)
+        np(nspec)
     &emissn
-        nflag_emit(3)
-        curf(3)
-        dnsf(3)
+        nflag_emit(nspec)
+        curf(nspec)
+        dnsf(nspec)
+
+wp, qm, path, peth, npinはspecies.pyの粒子種の表からSimplePlasmaParameters,
+PICParametersが書き出す.
 
 GUIのキー:
     Jp : PE current density [microA/m^2]
     Tp : PE temprature [eV]
     dnsfp : Number of superparticles per photoelectron
+    nnp : Magnification of PE buffer (np = nnp * npin)
+    np_auto : Estimate the PE buffer from the emission (np_photo_auto in derived.py)
+    np_safety : Safety factor of the estimated PE buffer
 """
-import math
 
-import PySimpleGUI as sg
+from ..lazy import sg
 from ..gui import parameter
+from ..species import SPECIES_KEYS, emission_index, setentry, truncate
 
 from . import AdditionalParameters
 
@@ -32,56 +32,61 @@ class PhotoParameters(AdditionalParameters):
     def is_active(cls, config):
         return config['Control'].getboolean('ControlPhotoelectronParameter')
 
+    def default_values(self):
+        return {
+            'Jp': 0,
+            'Tp': 1.0,
+            'dnsfp': 40,
+            'nnp': 10,
+            'np_auto': False,
+            'np_safety': 2.0,
+        }
+
     def create_tab(self):
+        defaults = self.default_values()
         layout = [
-            parameter('PE current density [microA/m^2]', 0, key='Jp'),
-            parameter('PE temprature [eV]', 1.0, key='Tp'),
-            parameter('Number of superparticles per PE', 40, key='dnsfp'),
-            parameter('Magnification of PE buffer', 10, key='nnp'),
+            parameter('PE current density [microA/m^2]', defaults['Jp'], key='Jp'),
+            parameter('PE temprature [eV]', defaults['Tp'], key='Tp'),
+            parameter('Number of superparticles per PE', defaults['dnsfp'], key='dnsfp'),
+            parameter('Magnification of PE buffer', defaults['nnp'], key='nnp'),
+            [sg.Checkbox('Estimate PE buffer from emission',
+                         default=defaults['np_auto'], key='np_auto')],
+            parameter('Safety factor of PE buffer', defaults['np_safety'], key='np_safety'),
         ]
         return sg.Tab('光電子パラメータ', layout)
 
     def add_applyers(self, loader):
-        def use_pe(i, u): return i['nspec'] == 3
+        def use_pe(i, u): return emission_index(i) is not None
         loader.add_applyer('Jp', _curf_load, exceptor=use_pe)
         loader.add_applyer('Tp', _Tp, exceptor=use_pe)
         loader.add_applyer('dnsfp', lambda i, u: i['dnsf'][-1], exceptor=use_pe)
         loader.add_applyer('nnp', _nnp_load, exceptor=use_pe)
 
     def add_savers(self, saver):
-        saver.add_saver(self._save_photo, exceptor=lambda i, v, u: v['use_pe'])
+        saver.add_saver(self._save_photo, exceptor=lambda i, v, u: v['use_pe'],
+                        depends=SPECIES_KEYS + (
+                            'nx', 'ny', 'nz', 'nnp', 'Jp', 'dnsfp', 'np_auto', 'np_safety',
+                            'use_hole', 'zssurf', 'hole_xlen', 'hole_ylen',
+                            'hole_depth', 'zenith', 'azimuth', 'features'))
         saver.add_saver(self._remove_photo, exceptor=lambda i,
-                        v, u: not v['use_pe'])
+                        v, u: not v['use_pe'], depends=SPECIES_KEYS)
 
     def _save_photo(self, inp, values, unit):
-        nx = int(values['nx'])
-        ny = int(values['ny'])
-        nz = int(values['nz'])
-
-        inp.setlist('plasma', 'wp', _wpe(values, unit), start_index=3)
-
-        inp.setlist('intp', 'qm', -1.0, start_index=3)
-        inp.setlist('intp', 'path', _pathp(values, unit), start_index=3)
-        inp.setlist('intp', 'peth', _pathp(values, unit), start_index=3)
-        inp.setlist('intp', 'npin', 0, start_index=3)
+        index = values['species'].nspec
 
-        np = int(float(values['nnp'])) * int(values['np_per_grid']) * nx * ny * nz
-        inp.setlist('intp', 'np', np, start_index=3)
-
-        inp.setlist('emissn', 'curf', _curf_save(values, unit), start_index=3)
-        inp.setlist('emissn', 'nflag_emit', 2, start_index=3)
-        inp.setlist('emissn', 'dnsf', int(values['dnsfp']), start_index=3)
+        for group, name, value in (('intp', 'np', values['np_photo']),
+                                   ('emissn', 'curf', values['curf']),
+                                   ('emissn', 'nflag_emit', 2),
+                                   ('emissn', 'dnsf', int(values['dnsfp']))):
+            # 前回の保存では別の番号の場合があるため, 電子とイオンより後の値を置き換える
+            setentry(inp, group, name, index, value, first=3)
 
     def _remove_photo(self, inp, values, unit):
-        inp.remove('qm', index=3)
-        inp.remove('nflag_emit', index=3)
-        inp.remove('wp', index=3)
-        inp.remove('path', index=3)
-        inp.remove('peth', index=3)
-        inp.remove('npin', index=3)
-        inp.remove('np', index=3)
-        inp.remove('curf', index=3)
-        inp.remove('dnsf', index=3)
+        # 放出される種の番号は追加の種の数で変わる (前回の保存では別の番号の場合がある) ため,
+        # 電子とイオンより後を全て削除する (追加の種の値はEMSESの初期値を用いる)
+        for group, name in (('intp', 'np'), ('emissn', 'curf'),
+                            ('emissn', 'nflag_emit'), ('emissn', 'dnsf')):
+            truncate(inp, group, name, 2)
 
 
 def _curf_load(inp, unit):
@@ -95,26 +100,5 @@ def _nnp_load(inp, unit):
 def _Tp(inp, unit):
     qe = unit.qe.from_unit
     me = unit.me.from_unit
-    path = unit.v.reverse(inp['intp']['path'][2])
+    path = unit.v.reverse(inp['intp']['path'][emission_index(inp) - 1])
     return me * path * path / qe
-
-
-def _wpe(values, unit):
-    ne = float(values['n0']) * 1e6  # /cc to /m^3
-    qe = unit.qe.from_unit
-    me = unit.me.from_unit
-    e0 = unit.e0.from_unit
-    wpe_phisic = math.sqrt(ne * qe * qe / me / e0)
-    return unit.f.trans(wpe_phisic)
-
-
-def _pathp(values, unit):
-    qe = unit.qe.from_unit
-    me = unit.me.from_unit
-    Tp = float(values['Tp'])
-    pathp_phisic = math.sqrt(qe * Tp / me)
-    return unit.v.trans(pathp_phisic)
-
-
-def _curf_save(values, unit):
-    return unit.J.trans(float(values['Jp']) * 1e-6)
@@ -2,35 +2,50 @@
 
 管理するパラメータ:
     &intp
-        npin(1:2)
+        npin(1:nspec) (放出される種は0)
 
 GUIのキー:
     np_per_grid: Number of super particles per grid
+    np_per_grid_i: Ion super particles per grid (空欄では電子と同じ)
+    noise_target: Target noise level (Optimize particlesで用いる, analysis/particles.py)
+    np_budget: Particle budget per grid (全ての種の合計, 空欄では制限しない)
 """
-import PySimpleGUI as sg
+from ..lazy import sg
 from ..gui import parameter, radio_box
+from ..species import SPECIES_KEYS, setvector
 from . import AdditionalParameters
 
 class PICParameters(AdditionalParameters):
+    def default_values(self):
+        return {'np_per_grid': 40,
+                'np_per_grid_i': '',
+                'noise_target': 0.1,
+                'np_budget': ''}
+
     def create_tab(self):
+        defaults = self.default_values()
         layout = [
-            parameter('Number of super particles per grid', 40, key='np_per_grid')
+            parameter('Number of super particles per grid',
+                      defaults['np_per_grid'], key='np_per_grid'),
+            parameter('Ion super particles per grid (blank: same)',
+                      defaults['np_per_grid_i'], key='np_per_grid_i'),
+            parameter('Target noise level', defaults['noise_target'], key='noise_target'),
+            parameter('Particle budget per grid (blank: none)',
+                      defaults['np_budget'], key='np_budget'),
+            [sg.Button('Optimize particles')],
         ]
         return sg.Tab('PICパラメータ', layout)
-    
+
     def add_applyers(self, loader):
         loader.add_applyer('np_per_grid', _np_per_grid)
-    
+        loader.add_applyer('np_per_grid_i', _np_per_grid_i)
+
     def add_savers(self, saver):
-        saver.add_saver(self._save_pic)
+        saver.add_saver(self._save_pic, depends=SPECIES_KEYS + ('nx', 'ny', 'nz'))
 
     def _save_pic(self, inp, values, unit):
-        nx = int(values['nx'])
-        ny = int(values['ny'])
-        nz = int(values['nz'])
-        np = int(values['np_per_grid']) * nx * ny * nz
-
-        inp.setlist('intp', 'npin', [np] * 2)
+        vectors = values['species'].vectors(unit, values['ngrid'])
+        setvector(inp, 'intp', 'npin', vectors['intp', 'npin'])
 
 
 def _np_per_grid(inp, unit):
@@ -38,3 +53,10 @@ def _np_per_grid(inp, unit):
     ny = inp['ny']
     nz = inp['nz']
     return int(inp['npin'][0] / (nx * ny * nz))
+
+
+def _np_per_grid_i(inp, unit):
+    npin = inp['npin']
+    if len(npin) < 2 or npin[1] == npin[0]:
+        return ''
+    return int(npin[1] / (inp['nx'] * inp['ny'] * inp['nz']))
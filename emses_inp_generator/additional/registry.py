@@ -0,0 +1,131 @@
+"""追加のパラメータ (AdditionalParameters) のプラグインの登録.
+
+プラグインはParameterPluginで名前, クラスの場所 ('モジュール:クラス'), 優先度,
+有効にするconfig.iniの[Control]のキー (switch) を登録する. 優先度の小さい順にGUIのタブ,
+applyer, saverを追加する (後のsaverは前のsaverの結果を上書きできる).
+
+モジュールはswitchが有効な場合だけ読み込むため, 無効なプラグインはGUIのタブやsaverだけでなく
+モジュールの読み込み (PySimpleGUIの部品の定義, 派生量の登録など) も行わない.
+switchがNoneのプラグインは常に有効とする.
+
+外部のパッケージはentry pointのグループ ENTRY_POINT_GROUP にParameterPluginを登録する.
+entry pointはParameterPluginを定義した軽いモジュールを指し, クラスのモジュールは
+'モジュール:クラス'の文字列で渡す.
+
+    # mypackage/__init__.py
+    from emses_inp_generator.additional import ParameterPlugin
+    probe = ParameterPlugin('probe', 'mypackage.probe:ProbeParameters',
+                            priority=400, switch='ControlProbeParameter')
+
+    # setup.py
+    entry_points={'emses_inp_generator.parameters': ['probe = mypackage:probe']}
+
+entry pointがAdditionalParametersのクラスを直接指す場合は, クラスのpriority属性
+(無ければDEFAULT_PRIORITY) を優先度とし, is_activeで有効かどうかを判定する.
+同じ名前のプラグインは先に登録したもの (組み込みのプラグイン) を用いる.
+"""
+import importlib
+from dataclasses import dataclass
+from typing import Optional, Union
+
+ENTRY_POINT_GROUP = 'emses_inp_generator.parameters'
+DEFAULT_PRIORITY = 500
+
+
+@dataclass
+class ParameterPlugin:
+    name: str
+    target: Union[str, type]  # 'モジュール:クラス' またはクラス
+    priority: int = DEFAULT_PRIORITY
+    switch: Optional[str] = None  # config.iniの[Control]のキー
+    source: str = 'builtin'
+
+    def is_active(self, config):
+        if self.switch is not None:
+            return config['Control'].getboolean(self.switch, fallback=False)
+        if isinstance(self.target, str):
+            return True
+        return bool(self.target.is_active(config))
+
+    def load(self):
+        """パラメータのクラスを返す (初めて呼んだときにモジュールを読み込む)."""
+        if isinstance(self.target, str):
+            module_name, _, class_name = self.target.partition(':')
+            module = importlib.import_module(module_name, package=__package__)
+            self.target = getattr(module, class_name)
+        return self.target
+
+
+SIMPLE_PLASMA = ParameterPlugin('simple_plasma', '.simple_plasma:SimplePlasmaParameters', 10)
+PIC = ParameterPlugin('pic', '.pic:PICParameters', 50)
+PHOTO_ELECTRON = ParameterPlugin('photo_electron', '.photo_electron:PhotoParameters', 100,
+                                 'ControlPhotoelectronParameter')
+BOUNDARY = ParameterPlugin('boundary', '.boundary:BoundaryParameters', 150,
+                           'ControlBoundaryParameter')
+SIMPLE_HOLE = ParameterPlugin('simple_hole', '.simple_hole:SimpleHoleParameters', 200,
+                              'ControlSimpleHoleParameter')
+FILE_IO = ParameterPlugin('file_io', '.file_io_parameter:FileIOParameters', 300,
+                          'ControlFileIOParameter')
+CHARGE_ACCELERATION = ParameterPlugin(
+    'charge_acceleration', '.charge_acceleration:ChargeAccelerationParameters', 800,
+    'ControlChargeAccelerationParameter')
+
+# setup.pyのentry pointにも登録するが, インストールせずに実行する場合のためここでも登録する
+BUILTIN_PLUGINS = [SIMPLE_PLASMA, PIC, PHOTO_ELECTRON, BOUNDARY, SIMPLE_HOLE, FILE_IO,
+                   CHARGE_ACCELERATION]
+
+_plugins = None
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python 3.7
+        return []
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, []))
+
+
+def _from_entry_point(ep):
+    obj = ep.load()
+    if isinstance(obj, ParameterPlugin):
+        plugin = obj
+    elif isinstance(obj, type):
+        plugin = ParameterPlugin(ep.name, obj,
+                                 priority=getattr(obj, 'priority', DEFAULT_PRIORITY))
+    else:
+        raise TypeError('entry point {!r} ({}) is neither a ParameterPlugin nor a class'
+                        .format(ep.name, ep.value))
+    plugin.source = ep.value
+    return plugin
+
+
+def register_plugin(plugin):
+    """プラグインを登録する. 同じ名前のプラグインが既にあれば登録しない."""
+    plugins = available_plugins()
+    if any(p.name == plugin.name for p in plugins):
+        return False
+    plugins.append(plugin)
+    return True
+
+
+def available_plugins():
+    """登録された全てのプラグイン (組み込みとentry point). entry pointは初回だけ探す."""
+    global _plugins
+    if _plugins is None:
+        _plugins = list(BUILTIN_PLUGINS)
+        names = {plugin.name for plugin in _plugins}
+        for ep in _entry_points():
+            if ep.name in names:
+                continue
+            _plugins.append(_from_entry_point(ep))
+            names.add(ep.name)
+    return _plugins
+
+
+def active_plugins(config):
+    """config.iniで有効なプラグインを優先度の小さい順に返す."""
+    plugins = [plugin for plugin in available_plugins() if plugin.is_active(config)]
+    return sorted(plugins, key=lambda plugin: plugin.priority)
@@ -9,6 +9,7 @@
         zlrechole(1:2)
         zurechole(1:2)
     &emissn
+        nepl(nspec) (光電子は最後の種)
         nemd(1)
         xmine(1)
         xmaxe(1)
@@ -24,40 +25,23 @@ GUIのキー:
     hole_xlen : Hole X side length [grid]
     hole_ylen : Hole Y side length [grid]
     hole_depth : Hole depth [grid]
-    thetaz : Sunlight incident angle z [dig]
-    thetaxy : Sunlight incident angle xy [dig]
+    zenith : Sunlight zenith angle [dig]
+    azimuth : Sunlight azimuth angle [dig] (direction of the light in the xy plane, 0: +x)
+    features : Boxes, holes and steps on the surface (see geometry.py)
 """
 import math
-from typing import List
+from typing import TYPE_CHECKING, List
 
-import PySimpleGUI as sg
+from ..derived import quantity
+from ..geometry import EmissionSurface, Feature, Terrain, parse_features
+from ..lazy import sg
 from ..gui import parameter, radio_box
+from ..species import SPECIES_KEYS, getentry, setentry, truncate
 
 from . import AdditionalParameters
-from dataclasses import dataclass
-from emout import InpFile
-
-
-@dataclass
-class EmissionSurface:
-    nemd: int
-    curf: float
-    xmin: float
-    xmax: float
-    ymin: float
-    ymax: float
-    zmin: float
-    zmax: float
-
-    def saveinp(self, inp: InpFile, index: int):
-        inp.setlist('emissn', 'nemd', self.nemd, start_index=index)
-        inp.setlist('emissn', 'curfs', self.curf, start_index=index)
-        inp.setlist('emissn', 'xmine', self.xmin, start_index=index)
-        inp.setlist('emissn', 'xmaxe', self.xmax, start_index=index)
-        inp.setlist('emissn', 'ymine', self.ymin, start_index=index)
-        inp.setlist('emissn', 'ymaxe', self.ymax, start_index=index)
-        inp.setlist('emissn', 'zmine', self.zmin, start_index=index)
-        inp.setlist('emissn', 'zmaxe', self.zmax, start_index=index)
+
+if TYPE_CHECKING:
+    from emout import InpFile
 
 
 class SimpleHoleParameters(AdditionalParameters):
@@ -65,19 +49,35 @@ class SimpleHoleParameters(AdditionalParameters):
     def is_active(cls, config):
         return config['Control'].getboolean('ControlSimpleHoleParameter')
 
+    def default_values(self):
+        return {
+            'use_hole': False,
+            'hole_xlen': 10,
+            'hole_ylen': 10,
+            'hole_depth': 10,
+            'zssurf': 10,
+            'zenith': 0.0,
+            'azimuth': 0.0,
+            'features': '',
+        }
+
     def create_tab(self):
+        defaults = self.default_values()
         frame_layout = [
-            [sg.Checkbox('Use hole', default=False, key='use_hole')],
-            parameter('X side length [grid]', 10, key='hole_xlen'),
-            parameter('Y side length [grid]', 10, key='hole_ylen'),
-            parameter('depth [grid]', 10, key='hole_depth')
+            [sg.Checkbox('Use hole', default=defaults['use_hole'], key='use_hole')],
+            parameter('X side length [grid]', defaults['hole_xlen'], key='hole_xlen'),
+            parameter('Y side length [grid]', defaults['hole_ylen'], key='hole_ylen'),
+            parameter('depth [grid]', defaults['hole_depth'], key='hole_depth')
         ]
         hole_frame = sg.Frame('Hole', layout=frame_layout)
 
         tab_layout = [
-            parameter('Surface hight [grid]', 10, key='zssurf'),
+            parameter('Surface hight [grid]', defaults['zssurf'], key='zssurf'),
             [hole_frame],
-            parameter('Sunlight zenith angle [dig]', 0.0, key='zenith'),
+            parameter('Sunlight zenith angle [dig]', defaults['zenith'], key='zenith'),
+            parameter('Sunlight azimuth angle [dig]', defaults['azimuth'], key='azimuth'),
+            [sg.Text('Surface features (box/hole/step)')],
+            [sg.Multiline(defaults['features'], size=(40, 4), key='features')],
         ]
         return sg.Tab('穴パラメータ', layout=tab_layout)
 
@@ -94,92 +94,41 @@ class SimpleHoleParameters(AdditionalParameters):
         loader.add_applyer('hole_depth', hole_depth, exceptor=use_hole)
 
         def use_emit(i, u): return 'curfs' in i
-        def calc_zenith(i, j): return math.degrees(math.acos(abs(i['curfs'][0] / i['curf'][-1])))
-        loader.add_applyer('zenith', calc_zenith, exceptor=use_emit)
+        loader.add_applyer('zenith', _zenith_load, exceptor=use_emit)
+        loader.add_applyer('azimuth', _azimuth_load, exceptor=use_emit)
 
     def add_savers(self, saver):
-        saver.add_saver(self._save_hole_shape, lambda i, v, u: v['use_hole'])
-        saver.add_saver(self._remove_hole, lambda i, v, u: not v['use_hole'])
-
-        saver.add_saver(self._save_emission, lambda i, v, u: v['use_pe'])
+        hole_keys = ('use_hole', 'nx', 'ny', 'zssurf', 'hole_xlen', 'hole_ylen', 'hole_depth')
+        saver.add_saver(self._save_hole_shape, lambda i, v, u: v['use_hole'],
+                        depends=hole_keys)
+        saver.add_saver(self._remove_hole, lambda i, v, u: not v['use_hole'],
+                        depends=('use_hole',))
+
+        saver.add_saver(self._save_emission, lambda i, v, u: v['use_pe'],
+                        depends=hole_keys + SPECIES_KEYS + ('Jp', 'zenith', 'azimuth', 'features'))
         saver.add_saver(self._remove_emission,
-                        lambda i, v, u: not v['use_pe'] or not v['use_hole'])
+                        lambda i, v, u: not v['use_pe'] or not v['use_hole'],
+                        depends=SPECIES_KEYS + ('use_hole',))
 
     def _save_hole_shape(self, inp, values, unit):
-        nx = int(values['nx'])
-        ny = int(values['ny'])
-        zssurf = float(values['zssurf'])
-        hole_xlen = float(values['hole_xlen'])
-        hole_ylen = float(values['hole_ylen'])
-        hole_depth = float(values['hole_depth'])
-        hole_x_min = (nx - hole_xlen) / 2
-        hole_x_max = (nx + hole_xlen) / 2
-        hole_y_min = (ny - hole_ylen) / 2
-        hole_y_max = (ny + hole_ylen) / 2
+        hole = values['hole_bounds']
+        zssurf = hole.zmax
 
         inp['ptcond']['zssurf'] = zssurf
-        inp.setlist('ptcond', 'xlrechole', [hole_x_min] * 2)
-        inp.setlist('ptcond', 'xurechole', [hole_x_max] * 2)
-        inp.setlist('ptcond', 'ylrechole', [hole_y_min] * 2)
-        inp.setlist('ptcond', 'yurechole', [hole_y_max] * 2)
-        inp.setlist('ptcond', 'zlrechole', [zssurf-1.0, zssurf-hole_depth])
+        inp.setlist('ptcond', 'xlrechole', [hole.xmin] * 2)
+        inp.setlist('ptcond', 'xurechole', [hole.xmax] * 2)
+        inp.setlist('ptcond', 'ylrechole', [hole.ymin] * 2)
+        inp.setlist('ptcond', 'yurechole', [hole.ymax] * 2)
+        inp.setlist('ptcond', 'zlrechole', [zssurf-1.0, hole.zmin])
         inp.setlist('ptcond', 'zurechole', [zssurf, zssurf-1.0])
 
-    def _save_emission(self, inp: InpFile, values, unit):
-        nx = int(values['nx'])
-        ny = int(values['ny'])
-        zssurf = float(values['zssurf'])
-
-        # 垂直に太陽光が照射される場合の光電子電流
-        curf = unit.J.trans(float(values['Jp']) * 1e-6)
-
-        # 照射角を取得
-        zenith_deg = float(values['zenith'])
-        zenith_rad = math.radians((zenith_deg + 360) % 360)
-
-        # 光電子電流を計算
-        curf_horizon = curf * abs(math.cos(zenith_rad))
-        curf_vertical = curf * abs(math.sin(zenith_rad))
-
-        esurfs: List[EmissionSurface] = []
-        if values['use_hole']:
-            hole_xlen = float(values['hole_xlen'])
-            hole_ylen = float(values['hole_ylen'])
-            hole_depth = float(values['hole_depth'])
-            hole_x_min = (nx - hole_xlen) / 2
-            hole_x_max = (nx + hole_xlen) / 2
-            hole_y_min = (ny - hole_ylen) / 2
-            hole_y_max = (ny + hole_ylen) / 2
-            hole_z_min = zssurf-hole_depth
-
-            emit_x_min = hole_x_min + hole_depth * math.tan(zenith_rad)
-            if zenith_rad == 0:
-                emit_z_min = math.inf
-            else:
-                emit_z_min = max(zssurf - hole_xlen / math.tan(zenith_rad), hole_z_min)
-
-            # 光電子発生面を設定する
-            esurfs.append(EmissionSurface(3, curf_horizon,
-                                          0, hole_x_min, 0, ny, zssurf, zssurf))
-            esurfs.append(EmissionSurface(3, curf_horizon,
-                                          hole_x_min, hole_x_max, 0, hole_y_min, zssurf, zssurf))
-            esurfs.append(EmissionSurface(3, curf_horizon,
-                                          hole_x_max, nx, 0, ny, zssurf, zssurf))
-            esurfs.append(EmissionSurface(3, curf_horizon,
-                                          hole_x_min, hole_x_max, hole_y_max, ny, zssurf, zssurf))
-            if emit_x_min < hole_x_max:
-                esurfs.append(EmissionSurface(3, curf_horizon,
-                                              emit_x_min, hole_x_max, hole_y_min, hole_y_max, hole_z_min, hole_z_min))
-            if emit_z_min < zssurf:
-                esurfs.append(EmissionSurface(-1, curf_vertical,
-                                              hole_x_max, hole_x_max, hole_y_min, hole_y_max, emit_z_min, zssurf))
-        else:
-            esurfs.append(EmissionSurface(3, curf_horizon,
-                                          0, nx, 0, ny, zssurf, zssurf))
+    def _save_emission(self, inp: 'InpFile', values, unit):
+        esurfs: List[EmissionSurface] = values['emission_surfaces']
 
-        # 光電子面数を設定
+        # 光電子面数を設定. 光電子は最後の種で, 前回の保存では別の番号の場合があるため
+        # 電子とイオンより後の値を置き換える
         nepl = len(esurfs)
-        inp.setlist('emissn', 'nepl', nepl, start_index=3)
+        setentry(inp, 'emissn', 'nepl', values['species'].nspec, nepl, first=3)
 
         for i, esurf in enumerate(esurfs):
             esurf.saveinp(inp, index=i+1)
@@ -196,17 +145,70 @@ class SimpleHoleParameters(AdditionalParameters):
             inp.remove('zlrechole', index=index)
             inp.remove('zurechole', index=index)
 
-    def _remove_emission(self, inp: InpFile, values, unit):
-        nepl = nemd = 0
-        if 'nepl' in inp:
-            nepl = inp['nepl'][-1]
+    def _remove_emission(self, inp: 'InpFile', values, unit):
+        if values['use_pe']:
+            nepl = getentry(inp, 'emissn', 'nepl', values['species'].nspec, 0)
+        else:
+            # 放出される種が無いため放出面は全て削除する
+            truncate(inp, 'emissn', 'nepl', 2)
+            nepl = 0
+        nemd = 0
         if 'nemd' in inp:
             nemd = len(inp['nemd'])
+        # nepl+1番目以降を削除する
         for i in range(nepl, nemd):
-            inp.remove('nemd', index=nepl)
-            inp.remove('xmine', index=nepl)
-            inp.remove('xmaxe', index=nepl)
-            inp.remove('ymine', index=nepl)
-            inp.remove('ymaxe', index=nepl)
-            inp.remove('zmine', index=nepl)
-            inp.remove('zmaxe', index=nepl)
+            inp.remove('nemd', index=nepl + 1)
+            inp.remove('curfs', index=nepl + 1)
+            inp.remove('xmine', index=nepl + 1)
+            inp.remove('xmaxe', index=nepl + 1)
+            inp.remove('ymine', index=nepl + 1)
+            inp.remove('ymaxe', index=nepl + 1)
+            inp.remove('zmine', index=nepl + 1)
+            inp.remove('zmaxe', index=nepl + 1)
+
+
+@quantity('terrain')
+def _terrain(values):
+    features = parse_features(values.get('features', '') or '')
+    if values['use_hole']:
+        bounds = values['hole_bounds']
+        features.insert(0, Feature(bounds.xmin, bounds.xmax, bounds.ymin, bounds.ymax,
+                                   bounds.zmin - bounds.zmax))
+    return Terrain(int(values['nx']), int(values['ny']), float(values['zssurf']), features)
+
+
+@quantity('emission_surfaces')
+def _emission_surfaces(values) -> List[EmissionSurface]:
+    """太陽光の向きと地形から光電子の放出面を求める."""
+    return values['terrain'].emission_surfaces(values['curf'],
+                                               float(values['zenith']),
+                                               float(values.get('azimuth', 0.0)))
+
+
+def _sun_components(inp):
+    """放出面の電流から太陽の方向の成分 {nemdの軸: 成分} を求める."""
+    curf = inp['curf'][-1]
+    components = {}
+    if curf == 0:
+        return components
+    nemds = inp['nemd'] if isinstance(inp['nemd'], list) else [inp['nemd']]
+    curfss = inp['curfs'] if isinstance(inp['curfs'], list) else [inp['curfs']]
+    for nemd, curfs in zip(nemds, curfss):
+        components.setdefault(abs(nemd), math.copysign(curfs / curf, nemd))
+    return components
+
+
+def _zenith_load(inp, unit):
+    components = _sun_components(inp)
+    if 3 not in components:
+        return 90.0
+    return math.degrees(math.acos(min(abs(components[3]), 1.0)))
+
+
+def _azimuth_load(inp, unit):
+    components = _sun_components(inp)
+    sx = components.get(1, 0.0)
+    sy = components.get(2, 0.0)
+    if sx == 0 and sy == 0:
+        return 0.0
+    return math.degrees(math.atan2(-sy, -sx))
@@ -2,13 +2,19 @@
 
 管理するパラメータ:
     &plasma
-        wp(1:2)
+        wp(1:nspec)
         wc
     &intp
-        qm(1:2)
-        path(1:2)
-        peth(1:2)
-        vdri(1:2)
+        qm(1:nspec)
+        path(1:nspec)
+        peth(1:nspec)
+        vdri(1:nplasma)
+        vdthz(1:nplasma)
+        vdthxy(1:nplasma)
+    &inp
+        inpf, inpb, injct, npr (1:nplasma, 追加の種は元のファイルの最後の種の値)
+
+種ごとの値はspecies.pyの粒子種の表から求める (光電子の種を含む).
 
 GUIのキー:
     n0 : Plasma density [/cc]
@@ -18,27 +24,46 @@ GUIのキー:
     vdrie : Electron flow speed [m/s]
     vdrii : Ion flow speed [m/s]
     B : Magntic field [nT]
+    extra_species : Additional species (see species.py)
 """
-import math
 
-import PySimpleGUI as sg
+from ..lazy import sg
 from ..gui import parameter
+from ..species import (SPECIES_KEYS, Species, emission_index, format_species,
+                       padvector, setvector)
 
 from . import AdditionalParameters
 
 
 class SimplePlasmaParameters(AdditionalParameters):
+    def default_values(self):
+        return {
+            'n0': 5000,
+            'Te': 1.0,
+            'Ti': 0.5,
+            'mi2me': 1000,
+            'vdrie': 1000,
+            'vdrii': 1000,
+            'B': 0,
+            'vdthz': 0,
+            'vdthxy': 180,
+            'extra_species': '',
+        }
+
     def create_tab(self):
+        defaults = self.default_values()
         layout = [
-            parameter('Plasma density [/cc]', 5000, key='n0'),
-            parameter('Electron temperature [eV]', 1.0, key='Te'),
-            parameter('Ion temperature [eV]', 0.5, key='Ti'),
-            parameter('Ion-to-electron mass ratio', 1000, key='mi2me'),
-            parameter('Electron flow speed [m/s]', 1000, key='vdrie'),
-            parameter('Ion flow speed [m/s]', 1000, key='vdrii'),
-            parameter('Magnetic field [nT]', 0, key='B'),
-            parameter('Plasma flow z-angle [deg]', 0, key='vdthz'),
-            parameter('Plasma flow xy-angle [deg]', 180, key='vdthxy'),
+            parameter('Plasma density [/cc]', defaults['n0'], key='n0'),
+            parameter('Electron temperature [eV]', defaults['Te'], key='Te'),
+            parameter('Ion temperature [eV]', defaults['Ti'], key='Ti'),
+            parameter('Ion-to-electron mass ratio', defaults['mi2me'], key='mi2me'),
+            parameter('Electron flow speed [m/s]', defaults['vdrie'], key='vdrie'),
+            parameter('Ion flow speed [m/s]', defaults['vdrii'], key='vdrii'),
+            parameter('Magnetic field [nT]', defaults['B'], key='B'),
+            parameter('Plasma flow z-angle [deg]', defaults['vdthz'], key='vdthz'),
+            parameter('Plasma flow xy-angle [deg]', defaults['vdthxy'], key='vdthxy'),
+            [sg.Text('Additional species (name charge mass density temperature drift np_per_grid)')],
+            [sg.Multiline(defaults['extra_species'], size=(40, 4), key='extra_species')],
         ]
         return sg.Tab('プラズマパラメータ', layout)
 
@@ -52,20 +77,20 @@ class SimplePlasmaParameters(AdditionalParameters):
         loader.add_applyer('B', _B)
         loader.add_applyer('vdthz', lambda i, u: i['vdthz'][0])
         loader.add_applyer('vdthxy', lambda i, u: i['vdthxy'][0])
+        loader.add_applyer('extra_species', _extra_species)
 
     def add_savers(self, saver):
-        saver.add_saver(self._save_simple_plasma)
+        saver.add_saver(self._save_simple_plasma, depends=SPECIES_KEYS + ('B',))
 
     def _save_simple_plasma(self, inp, values, unit):
-        inp.setlist('plasma', 'wp', [_wpe(values, unit), _wpi(values, unit)])
-        inp['plasma']['wc'] = _wc(values, unit)
+        inp['plasma']['wc'] = values['wc']
 
-        inp.setlist('intp', 'qm', [-1.0, 1.0/float(values['mi2me'])])
-        inp.setlist('intp', 'path', [_pathe(values, unit), _pathi(values, unit)])
-        inp.setlist('intp', 'peth', [_pathe(values, unit), _pathi(values, unit)])
-        inp.setlist('intp', 'vdri', [_vdrie(values, unit), _vdrii(values, unit)])
-        inp.setlist('intp', 'vdthz', [float(values['vdthz'])] * 2)
-        inp.setlist('intp', 'vdthxy', [float(values['vdthxy'])] * 2)
+        species = values['species']
+        for (group, name), vector in species.vectors(unit, values['ngrid']).items():
+            if name != 'npin':  # PICParameters
+                setvector(inp, group, name, vector)
+        for name in ('inpf', 'inpb', 'injct', 'npr'):
+            padvector(inp, 'inp', name, species.nplasma)
 
 
 # For load
@@ -91,59 +116,38 @@ def _Ti(inp, unit):
     return mi * path * path / qe
 
 
-def _B(inp, unit):
-    me = unit.me.from_unit
-    qe = unit.qe.from_unit
-    wc = unit.f.reverse(inp['plasma']['wc'])
-    return me * wc / qe * 1e9
-
-
-# For save
-def _wpe(values, unit):
-    ne = float(values['n0']) * 1e6  # /cc to /m^3
+def _extra_species(inp, unit):
+    """電子, イオン, 光電子以外の種. 電荷は±1 [e] とし, 質量はqmから求める."""
     qe = unit.qe.from_unit
     me = unit.me.from_unit
     e0 = unit.e0.from_unit
-    wpe_phisic = math.sqrt(ne * qe * qe / me / e0)
-    return unit.f.trans(wpe_phisic)
-
-
-def _wpi(values, unit):
-    ni = float(values['n0']) * 1e6
-    qe = unit.qe.from_unit
-    mi = unit.me.from_unit * float(values['mi2me'])
-    e0 = unit.e0.from_unit
-    wpi_phisic = math.sqrt(ni * qe * qe / mi / e0)
-    return unit.f.trans(wpi_phisic)
 
+    npin = inp['npin'] if isinstance(inp['npin'], list) else [inp['npin']]
+    nplasma = inp['nspec'] - (emission_index(inp) is not None)
+    ngrid = inp['nx'] * inp['ny'] * inp['nz']
+
+    species = []
+    for index in range(2, nplasma):
+        qm = inp['qm'][index]
+        charge = 1.0 if qm > 0 else -1.0
+        mass = charge / qm
+        wp = unit.f.reverse(inp['plasma']['wp'][index])
+        path = unit.v.reverse(inp['intp']['path'][index])
+        vdri = inp['vdri'][index] if len(inp['vdri']) > index else 0.0
+        species.append(Species(
+            name='s{}'.format(index + 1),
+            charge=charge,
+            mass=mass,
+            density=mass * me * e0 * wp * wp / (qe * qe) * 1e-6,
+            temperature=mass * me * path * path / qe,
+            drift=unit.v.reverse(vdri),
+            np_per_grid=npin[index] / ngrid,
+        ))
+    return format_species(species)
 
-def _wc(values, unit):
-    B = float(values['B']) * 1e-9
-    qe = unit.qe.from_unit
-    me = unit.me.from_unit
-    wc_phisic = qe * B / me
-    return unit.f.trans(wc_phisic)
 
-
-def _pathe(values, unit):
-    qe = unit.qe.from_unit
+def _B(inp, unit):
     me = unit.me.from_unit
-    Te = float(values['Te'])
-    pathe_phisic = math.sqrt(qe * Te / me)
-    return unit.v.trans(pathe_phisic)
-
-
-def _pathi(values, unit):
     qe = unit.qe.from_unit
-    mi = unit.me.from_unit * float(values['mi2me'])
-    Ti = float(values['Ti'])
-    pathi_phisic = math.sqrt(qe * Ti / mi)
-    return unit.v.trans(pathi_phisic)
-
-
-def _vdrie(values, unit):
-    return unit.v.trans(float(values['vdrie']))
-
-
-def _vdrii(values, unit):
-    return unit.v.trans(float(values['vdrii']))
+    wc = unit.f.reverse(inp['plasma']['wc'])
+    return me * wc / qe * 1e9
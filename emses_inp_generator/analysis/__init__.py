@@ -0,0 +1,8 @@
+from .memory import GIB, MemoryEstimate, MemoryModel, estimate_memory
+from .decomposition import Decomposition, best_nodes, optimize_nodes
+from .cost import CostModel, cheapest_nranks, cost_inputs, fit_cost_model
+from .particles import (ParticlePlan, current_noise, optimize_particles,
+                        particle_budget, particle_costs, plan_overrides)
+from .output_volume import OutputEstimate, estimate_output, suggest_interval
+from .stability import (ERROR, OK, WARNING, check_stability, max_severity,
+                        stability_numbers, values_table, violations)
@@ -0,0 +1,119 @@
+"""inpgen cost: 計算時間のモデルの較正と予測.
+inpgen particles: 種ごとの超粒子数の配分 (particles.py).
+"""
+from argparse import ArgumentParser
+
+from .cost import CostModel, cost_inputs, fit_cost_model
+from .memory import GIB, MemoryModel
+from .particles import (current_noise, noise_weights, optimize_particles,
+                        particle_budget, particle_costs, plan_overrides, plasma_species)
+
+
+def parse_cost_args(argv=None):
+    parser = ArgumentParser(prog='inpgen cost',
+                            description='Calibrate and use the run-cost model')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit = subparsers.add_parser('fit', help='Fit coefficients from past runs')
+    fit.add_argument('runs', help='CSV of past runs (see analysis/cost.py)')
+    fit.add_argument('-o', '--output', default='cost_model.json',
+                     help='Output model file')
+
+    predict = subparsers.add_parser('predict', help='Predict wall time of an inp file')
+    predict.add_argument('inppath', help='plasma.inp')
+    predict.add_argument('--model', default=None, help='Model file (default: config.ini)')
+    predict.add_argument('--config', default=None, help='Config file')
+    predict.add_argument('--nranks', type=int, nargs='+', default=None,
+                         help='Process counts to predict (default: nodes in the file)')
+    return parser.parse_args(argv)
+
+
+def cost_main(argv=None):
+    args = parse_cost_args(argv)
+
+    if args.command == 'fit':
+        model, relative_error = fit_cost_model(args.runs)
+        model.save(args.output)
+        for name, value in model.coefficients.items():
+            print('{:<16} {:.4e}'.format(name, value))
+        print('relative error: mean {:.3f}, max {:.3f} ({} runs)'.format(
+            abs(relative_error).mean(), abs(relative_error).max(), len(relative_error)))
+        return
+
+    from ..batch import InpGenerator, load_config
+    from ..batch.generator import ROOT_DIR
+
+    config = load_config(args.config)
+    if args.model is None:
+        model = CostModel.from_config(config, root_dir=ROOT_DIR)
+    else:
+        model = CostModel.load(args.model)
+
+    inputs = cost_inputs(InpGenerator(config, base=args.inppath).values())
+    nranks = args.nranks or [inputs['nranks']]
+
+    print('{:>8} {:>14} {:>14}'.format('nranks', 'wall time [h]', 'core hours'))
+    for n, wall in zip(nranks, model.predict(inputs, nranks)):
+        print('{:>8} {:>14.3f} {:>14.1f}'.format(n, wall / 3600, wall * n / 3600))
+
+
+def parse_particles_args(argv=None):
+    parser = ArgumentParser(prog='inpgen particles',
+                            description='Choose super particles per grid for each species')
+    parser.add_argument('inppath', help='plasma.inp')
+    parser.add_argument('--target', type=float, default=None,
+                        help='Target noise level (1/sqrt(N) for N particles of every species)')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Budget of super particles per grid (sum over species)')
+    parser.add_argument('--memory-gib', type=float, default=None,
+                        help='Budget of total memory [GiB] (converted to particles per grid)')
+    parser.add_argument('--minimum', type=int, default=1,
+                        help='Minimum super particles per grid of each species')
+    parser.add_argument('--config', default=None, help='Config file')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Write plasma.inp with the chosen npin')
+    args = parser.parse_args(argv)
+    if args.target is None and args.budget is None and args.memory_gib is None:
+        parser.error('one of --target, --budget or --memory-gib is required')
+    return args
+
+
+def particles_main(argv=None):
+    from ..batch import InpGenerator, load_config
+
+    args = parse_particles_args(argv)
+    config = load_config(args.config)
+    generator = InpGenerator(config, base=args.inppath)
+    values = generator.values()
+
+    budget = args.budget
+    costs = None
+    if args.memory_gib is not None:
+        model = MemoryModel.from_config(config)
+        memory_budget = particle_budget(values, args.memory_gib * GIB, model)
+        # 重み付けした合計 (費用は1以上) を--budget以下にすれば重み無しの合計も以下となる
+        costs = particle_costs(values, model)
+        budget = memory_budget if budget is None else min(budget, memory_budget)
+
+    plan = optimize_particles(values, args.target, budget, minimum=args.minimum,
+                              costs=costs)
+    species = plasma_species(values)
+
+    print('{:<8} {:>12} {:>10} {:>8} {:>10} {:>10}'.format(
+        'species', 'n [/cc]', 'T [eV]', 'weight', 'current', 'optimized'))
+    for s, weight, n in zip(species, noise_weights(species), plan.np_per_grid):
+        print('{:<8} {:>12.4g} {:>10.4g} {:>8.3f} {:>10.4g} {:>10}'.format(
+            s.name, s.density, s.temperature, weight, s.np_per_grid, n))
+    print('noise: current {:.4f}, optimized {:.4f}'.format(current_noise(values), plan.noise))
+    print('particles per grid: current {:.4g}, optimized {}'.format(
+        sum(s.np_per_grid for s in species), plan.total))
+    if plan.limited:
+        weighted = sum(c * n for c, n in zip(costs or [1.0] * len(species), plan.np_per_grid))
+        if weighted > budget:
+            print('warning: --minimum particles per grid exceed the budget')
+        else:
+            print('warning: the budget does not reach the target noise level')
+
+    if args.output is not None:
+        generator.save(args.output, plan_overrides(values, plan))
+        print('wrote {}'.format(args.output))
@@ -0,0 +1,194 @@
+"""計算時間 (wall time) とコア時間を予測する.
+
+実行時間を以下の量の線形和でモデル化する (係数は過去の実行結果から求める).
+
+    particle_steps : nstep * particles / nranks       (粒子の push)
+    cell_steps     : nstep * nx * ny * nz / nranks    (場の計算)
+    em_cell_steps  : cell_steps (EMモードのときのみ)
+    field_dumps    : (nstep / ifdiag) * nx * ny * nz / nranks  (場の出力)
+    particle_dumps : (nstep / ipahdf) * particles / nranks     (粒子の出力)
+    steps          : nstep                            (通信の遅延など, ステップごとの固定時間)
+
+過去の実行結果のCSVは以下の列を持つ (GUIの値からはcost_inputsで作る).
+
+    nstep, nx, ny, nz, particles, nranks, use_em, ifdiag, ipahdf, wall_time [s]
+
+particlesはプラズマ粒子 (電子, イオン, 追加の種) の初期粒子数の合計 (npinの和) とする.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict
+
+from ..lazy import np
+from ..species import create_species
+
+FEATURES = (
+    'particle_steps',
+    'cell_steps',
+    'em_cell_steps',
+    'field_dumps',
+    'particle_dumps',
+    'steps',
+)
+
+INPUT_COLUMNS = ('nstep', 'nx', 'ny', 'nz', 'particles', 'nranks',
+                 'use_em', 'ifdiag', 'ipahdf')
+
+# 較正前に用いる目安の係数 [s]
+DEFAULT_COEFFICIENTS = {
+    'particle_steps': 5e-8,
+    'cell_steps': 2e-8,
+    'em_cell_steps': 2e-8,
+    'field_dumps': 1e-7,
+    'particle_dumps': 1e-7,
+    'steps': 1e-3,
+}
+
+
+def cost_inputs(values):
+    """GUIの値の辞書からモデルの入力を作る."""
+    ngrid = int(values['nx']) * int(values['ny']) * int(values['nz'])
+    np_per_grid = sum(int(s.np_per_grid) for s in create_species(values) if not s.emission)
+    return {
+        'nstep': int(values['nstep']),
+        'nx': int(values['nx']),
+        'ny': int(values['ny']),
+        'nz': int(values['nz']),
+        'particles': np_per_grid * ngrid,
+        'nranks': int(values['nodesx']) * int(values['nodesy']) * int(values['nodesz']),
+        'use_em': bool(values['use_em']),
+        'ifdiag': int(values.get('output_field_interval', 0)),
+        'ipahdf': int(values.get('output_particles_interval', 0)),
+    }
+
+
+def _per_step(interval, nstep):
+    interval = np.asarray(interval, dtype=float)
+    safe = np.where(interval > 0, interval, 1.0)
+    return np.where(interval > 0, nstep / safe, 0.0)
+
+
+def features(inputs, nranks=None):
+    """特徴量の行列 (shape: (..., len(FEATURES))) を返す. 入力は配列でもよい."""
+    nstep = np.asarray(inputs['nstep'], dtype=float)
+    cells = (np.asarray(inputs['nx'], dtype=float)
+             * np.asarray(inputs['ny'], dtype=float)
+             * np.asarray(inputs['nz'], dtype=float))
+    particles = np.asarray(inputs['particles'], dtype=float)
+    if nranks is None:
+        nranks = inputs['nranks']
+    nranks = np.asarray(nranks, dtype=float)
+    use_em = np.asarray(inputs['use_em'], dtype=float)
+
+    cell_steps = nstep * cells / nranks
+    columns = [
+        nstep * particles / nranks,
+        cell_steps,
+        cell_steps * use_em,
+        _per_step(inputs['ifdiag'], nstep) * cells / nranks,
+        _per_step(inputs['ipahdf'], nstep) * particles / nranks,
+        nstep * np.ones_like(nranks),
+    ]
+    return np.stack(np.broadcast_arrays(*columns), axis=-1)
+
+
+@dataclass
+class CostModel:
+    coefficients: Dict[str, float] = field(
+        default_factory=lambda: dict(DEFAULT_COEFFICIENTS))
+
+    def _vector(self):
+        return np.array([self.coefficients.get(name, 0.0) for name in FEATURES])
+
+    def predict(self, inputs, nranks=None):
+        """wall time [s] を返す. nranksに配列を与えると各プロセス数での予測を返す."""
+        return features(inputs, nranks) @ self._vector()
+
+    def core_hours(self, inputs, nranks=None):
+        if nranks is None:
+            nranks = inputs['nranks']
+        return self.predict(inputs, nranks) * np.asarray(nranks) / 3600
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'coefficients': self.coefficients}, f, indent=4)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            return cls(coefficients=dict(json.load(f)['coefficients']))
+
+    @classmethod
+    def from_config(cls, config, root_dir=None):
+        """config.iniの[Cost]のModelPathから読み込む. 無ければ目安の係数を用いる."""
+        path = ''
+        if config is not None and config.has_section('Cost'):
+            path = config['Cost'].get('ModelPath', '')
+        if not path:
+            return cls()
+        path = Path(path)
+        if root_dir is not None and not path.is_absolute():
+            path = Path(root_dir) / path
+        if not path.exists():
+            return cls()
+        return cls.load(path)
+
+
+def read_runs(filename):
+    """過去の実行結果のCSVを列ごとの配列の辞書として読み込む."""
+    with open(filename, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    columns = {}
+    for name in INPUT_COLUMNS + ('wall_time',):
+        if name == 'use_em':
+            columns[name] = np.array([row[name].strip().lower() in ('1', 'true', 'yes')
+                                      for row in rows])
+        else:
+            columns[name] = np.array([float(row[name]) for row in rows])
+    return columns
+
+
+def fit_cost_model(runs):
+    """係数を非負の最小二乗法で求める. (CostModel, 相対誤差の配列) を返す.
+
+    runsはread_runsの返り値 (またはCSVのパス).
+    """
+    if not isinstance(runs, dict):
+        runs = read_runs(runs)
+
+    A = features(runs)
+    b = runs['wall_time']
+
+    # 負の係数となった特徴量を除いて解き直す (簡易的な非負最小二乗法).
+    coefficients = dict.fromkeys(FEATURES, 0.0)
+    active = list(range(len(FEATURES)))
+    while active:
+        solution, *_ = np.linalg.lstsq(A[:, active], b, rcond=None)
+        negative = [index for index, value in zip(active, solution) if value < 0]
+        if not negative:
+            for index, value in zip(active, solution):
+                coefficients[FEATURES[index]] = float(value)
+            break
+        active = [index for index in active if index not in negative]
+
+    model = CostModel(coefficients)
+    relative_error = (model.predict(runs) - b) / b
+    return model, relative_error
+
+
+def cheapest_nranks(inputs, deadline, candidates, model=None):
+    """wall timeがdeadline [s] 以下となるプロセス数のうちコア時間が最小のもの.
+
+    満たすものが無ければNoneを返す.
+    """
+    model = model or CostModel()
+    candidates = np.asarray(sorted(candidates))
+    wall = model.predict(inputs, candidates)
+    ok = wall <= deadline
+    if not ok.any():
+        return None
+    core_hours = wall * candidates
+    return int(candidates[ok][np.argmin(core_hours[ok])])
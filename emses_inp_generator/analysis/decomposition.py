@@ -0,0 +1,109 @@
+"""MPIの領域分割 nodes(1:3) を選ぶ.
+
+総プロセス数を3つの整数の積に分解する全ての組について, 以下を評価する.
+
+    surface_to_volume : 各ランクの領域の表面積 / 体積 [1/grid] (袖領域の通信量の目安)
+    imbalance         : 粒子数が最大のランクの粒子数 / 平均 (1で均等)
+    divisible         : nx, ny, nzがnodesで割り切れるか
+
+粒子は表面 (zssurf) より上と穴 (use_hole) の内部にのみ存在するものとして
+各ランクの粒子数を求める. scoreが小さいほど良い分割とする.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import Tuple
+
+from ..derived import Derived
+from ..lazy import np
+
+
+@dataclass
+class Decomposition:
+    nodes: Tuple[int, int, int]
+    surface_to_volume: float
+    imbalance: float
+    divisible: bool
+    score: float
+
+
+def factorizations(nranks):
+    """a * b * c == nranksとなる(a, b, c)を全て返す."""
+    divisors = [d for d in range(1, nranks + 1) if nranks % d == 0]
+    return [(a, b, nranks // (a * b))
+            for a, b in itertools.product(divisors, repeat=2)
+            if nranks % (a * b) == 0]
+
+
+def _plasma_boxes(values):
+    """粒子が存在する領域の直方体のリスト [(xmin, xmax, ymin, ymax, zmin, zmax), ...]."""
+    nx, ny, nz = int(values['nx']), int(values['ny']), int(values['nz'])
+    if 'zssurf' not in values:
+        return [(0, nx, 0, ny, 0, nz)]
+
+    zssurf = float(values['zssurf'])
+    boxes = [(0, nx, 0, ny, zssurf, nz)]
+    if values.get('use_hole'):
+        boxes.append(tuple(Derived(values)['hole_bounds']))
+    return boxes
+
+
+def _overlap(lower, upper, box_min, box_max):
+    return np.clip(np.minimum(upper, box_max) - np.maximum(lower, box_min), 0, None)
+
+
+def particle_loads(values, nodes):
+    """各ランクの領域内で粒子が存在する体積 (shape: nodes) を返す."""
+    ngrids = (int(values['nx']), int(values['ny']), int(values['nz']))
+    edges = [np.linspace(0, n, m + 1) for n, m in zip(ngrids, nodes)]
+
+    loads = np.zeros(nodes)
+    for box in _plasma_boxes(values):
+        lengths = [_overlap(edge[:-1], edge[1:], box[2 * i], box[2 * i + 1])
+                   for i, edge in enumerate(edges)]
+        loads += np.einsum('i,j,k->ijk', *lengths)
+    return loads
+
+
+def evaluate(values, nodes, halo_weight=1.0, uneven_penalty=1.0):
+    ngrids = (int(values['nx']), int(values['ny']), int(values['nz']))
+    divisible = all(n % m == 0 for n, m in zip(ngrids, nodes))
+    local = [n / m for n, m in zip(ngrids, nodes)]
+
+    surface_to_volume = 2 * sum(1 / length for length in local)
+
+    loads = particle_loads(values, nodes)
+    mean = loads.mean()
+    imbalance = float(loads.max() / mean) if mean > 0 else 1.0
+
+    score = (imbalance - 1) + halo_weight * surface_to_volume
+    if not divisible:
+        score += uneven_penalty
+    return Decomposition(tuple(nodes), surface_to_volume, imbalance, divisible, score)
+
+
+def optimize_nodes(values, nranks, allow_uneven=False, **kwargs):
+    """nodes(1:3)の候補をscoreの小さい順に返す.
+
+    allow_uneven=Falseのとき, nx, ny, nzを割り切れない分割は候補から除く.
+    領域の一辺が1格子未満になる分割は常に除く.
+    """
+    ngrids = (int(values['nx']), int(values['ny']), int(values['nz']))
+
+    candidates = []
+    for nodes in factorizations(int(nranks)):
+        if any(m > n for n, m in zip(ngrids, nodes)):
+            continue
+        decomposition = evaluate(values, nodes, **kwargs)
+        if decomposition.divisible or allow_uneven:
+            candidates.append(decomposition)
+
+    candidates.sort(key=lambda d: d.score)
+    return candidates
+
+
+def best_nodes(values, nranks, **kwargs):
+    """最も良いnodes(1:3)を返す. 候補が無ければNone."""
+    candidates = optimize_nodes(values, nranks, **kwargs)
+    if len(candidates) == 0:
+        return None
+    return candidates[0].nodes
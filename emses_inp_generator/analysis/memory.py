@@ -0,0 +1,117 @@
+"""MPIランクあたりのメモリ使用量を見積もる.
+
+GUIの値の辞書 (Saverに渡すものと同じ) から, 各ランクが持つ粒子配列と場の配列の
+大きさを計算する.
+
+    粒子: npin(s) = np_per_grid(s) * nx * ny * nz (PICParameters._save_pic)
+          (電子, イオン, extra_speciesの種. species.create_species)
+          np(nspec) = nnp * np_per_grid * nx * ny * nz (PhotoParameters._save_photo)
+                  (np_autoが真なら放出面からの見積もり, derived.pyのnp_photo_auto)
+    場:   (nx / nodesx + 2 * ghost) * (ny / nodesy + 2 * ghost) * (nz / nodesz + 2 * ghost)
+          の格子点ごとに field_arrays (EMモードでは + em_field_arrays) 個の実数
+
+粒子1個あたりのバイト数などはMemoryModelで変更できる (config.iniの[Memory]).
+"""
+from dataclasses import dataclass, field
+from typing import List
+
+from ..derived import Derived
+from ..species import create_species
+
+GIB = 1024 ** 3
+
+
+@dataclass
+class MemoryModel:
+    # x, y, z, vx, vy, vz, 粒子ID/所属情報 (倍精度8個)
+    bytes_per_particle: float = 64.0
+    # プラズマ粒子 (電子, イオン, 追加の種) の配列の大きさ / 初期粒子数
+    particle_margin: float = 2.0
+    bytes_per_value: float = 8.0
+    # 静電モードで格子点ごとに持つ実数の数 (電位, 電荷密度, 電場, 磁場, 電流密度など)
+    field_arrays: int = 16
+    # EMモードで追加される実数の数 (電磁場の時間発展用の配列など)
+    em_field_arrays: int = 24
+    ghost_cells: int = 2
+
+    @classmethod
+    def from_config(cls, config):
+        """config.iniの[Memory]セクションから作る. 無い項目は初期値を用いる."""
+        model = cls()
+        if config is None or not config.has_section('Memory'):
+            return model
+        section = config['Memory']
+        return cls(
+            bytes_per_particle=section.getfloat('BytesPerParticle', model.bytes_per_particle),
+            particle_margin=section.getfloat('ParticleMargin', model.particle_margin),
+            bytes_per_value=section.getfloat('BytesPerValue', model.bytes_per_value),
+            field_arrays=section.getint('FieldArrays', model.field_arrays),
+            em_field_arrays=section.getint('EMFieldArrays', model.em_field_arrays),
+            ghost_cells=section.getint('GhostCells', model.ghost_cells),
+        )
+
+
+@dataclass
+class MemoryEstimate:
+    nodes: int
+    # 種ごとの1ランクあたりの粒子配列の大きさ
+    particles_per_rank: List[float] = field(default_factory=list)
+    particle_bytes: float = 0.0
+    field_bytes: float = 0.0
+
+    @property
+    def bytes_per_rank(self):
+        return self.particle_bytes + self.field_bytes
+
+    @property
+    def total_bytes(self):
+        return self.bytes_per_rank * self.nodes
+
+    def summary(self):
+        return '{:.3g} GiB/rank (particles {:.3g}, fields {:.3g}), total {:.3g} GiB'.format(
+            self.bytes_per_rank / GIB, self.particle_bytes / GIB,
+            self.field_bytes / GIB, self.total_bytes / GIB)
+
+
+def nodes_of(values):
+    return (int(values['nodesx']), int(values['nodesy']), int(values['nodesz']))
+
+
+def species_capacities(values, model=None):
+    """種ごとの粒子配列の大きさ (全ランクの合計) のリスト."""
+    model = model or MemoryModel()
+    ngrid = int(values['nx']) * int(values['ny']) * int(values['nz'])
+
+    capacities = []
+    for species in create_species(values):
+        if species.emission:
+            if 'nnp' in values:
+                capacities.append(Derived(values)['np_photo'])
+            continue
+        capacities.append(int(species.np_per_grid) * ngrid * model.particle_margin)
+    return capacities
+
+
+def estimate_memory(values, model=None):
+    model = model or MemoryModel()
+
+    nodesx, nodesy, nodesz = nodes_of(values)
+    nodes = nodesx * nodesy * nodesz
+
+    particles_per_rank = [capacity / nodes
+                          for capacity in species_capacities(values, model)]
+    particle_bytes = sum(particles_per_rank) * model.bytes_per_particle
+
+    ghost = 2 * model.ghost_cells
+    local_points = ((int(values['nx']) / nodesx + ghost)
+                    * (int(values['ny']) / nodesy + ghost)
+                    * (int(values['nz']) / nodesz + ghost))
+    arrays = model.field_arrays
+    if values['use_em']:
+        arrays += model.em_field_arrays
+    field_bytes = local_points * arrays * model.bytes_per_value
+
+    return MemoryEstimate(nodes=nodes,
+                          particles_per_rank=particles_per_rank,
+                          particle_bytes=particle_bytes,
+                          field_bytes=field_bytes)
@@ -0,0 +1,120 @@
+"""HDF5出力の総量を見積もる.
+
+FileIOParametersが設定する&digconのパラメータから, nstepまでに書き出される
+ダンプの回数とバイト数を計算する.
+
+    場:   ifdiag (ijdiag) ステップごとに, 有効な成分数 * nx * ny * nz 個の値
+          ifxyz(1:6) : 電場, 磁場の各成分
+          ifxyz(7)   : 電荷密度と電位 (2成分として数える)
+          ijxyz(1:3) : 電流密度の各成分
+    粒子: ipahdf ステップごとに, 種ごとに ipadig 個の粒子の有効な ipaxyz 成分
+
+hdfdigstart以降のintervalの倍数のステップで出力されるものとする.
+"""
+import math
+from dataclasses import dataclass
+
+from ..species import count_species
+
+GIB = 1024 ** 3
+
+# 出力される値1個あたりのバイト数 (場は単精度, 粒子は倍精度)
+FIELD_BYTES_PER_VALUE = 4
+PARTICLE_BYTES_PER_VALUE = 8
+
+
+@dataclass
+class OutputEstimate:
+    nranks: int
+    field_dumps: int
+    particle_dumps: int
+    field_bytes_per_dump: float
+    particle_bytes_per_dump: float
+
+    @property
+    def field_bytes(self):
+        return self.field_dumps * self.field_bytes_per_dump
+
+    @property
+    def particle_bytes(self):
+        return self.particle_dumps * self.particle_bytes_per_dump
+
+    @property
+    def total_bytes(self):
+        return self.field_bytes + self.particle_bytes
+
+    @property
+    def field_bytes_per_dump_per_rank(self):
+        return self.field_bytes_per_dump / self.nranks
+
+    def summary(self):
+        return ('{:.3g} GiB total (fields: {} dumps x {:.3g} GiB, {:.3g} MiB/rank; '
+                'particles: {} dumps x {:.3g} GiB)').format(
+            self.total_bytes / GIB,
+            self.field_dumps, self.field_bytes_per_dump / GIB,
+            self.field_bytes_per_dump_per_rank / 1024 ** 2,
+            self.particle_dumps, self.particle_bytes_per_dump / GIB)
+
+
+def count_dumps(nstep, interval, start=0):
+    """start <= step <= nstepのうちintervalの倍数のステップ数."""
+    if interval <= 0 or start > nstep:
+        return 0
+    first = math.ceil(start / interval)
+    return nstep // interval - first + 1
+
+
+def _enabled(values, base_key, n):
+    return sum(bool(values.get('{}{}'.format(base_key, i), False)) for i in range(n))
+
+
+def estimate_output(values):
+    nx, ny, nz = int(values['nx']), int(values['ny']), int(values['nz'])
+    nranks = int(values['nodesx']) * int(values['nodesy']) * int(values['nodesz'])
+    nstep = int(values['nstep'])
+    nspec = count_species(values)
+
+    start = int(values.get('hdfdigstart', 0))
+    field_interval = int(values.get('output_field_interval', 0))
+    particle_interval = int(values.get('output_particles_interval', 0))
+
+    field_components = (_enabled(values, 'efxyz', 3)
+                        + _enabled(values, 'mfxyz', 3)
+                        + 2 * _enabled(values, 'output_potential', 1)
+                        + _enabled(values, 'ijxyz', 3))
+    field_bytes_per_dump = field_components * nx * ny * nz * FIELD_BYTES_PER_VALUE
+
+    particle_components = _enabled(values, 'pxxyz', 3) + _enabled(values, 'pvxyz', 3)
+    particle_bytes_per_dump = (nspec * int(values.get('ipadig', 0))
+                               * particle_components * PARTICLE_BYTES_PER_VALUE)
+
+    return OutputEstimate(
+        nranks=nranks,
+        field_dumps=count_dumps(nstep, field_interval, start),
+        particle_dumps=count_dumps(nstep, particle_interval, start),
+        field_bytes_per_dump=field_bytes_per_dump,
+        particle_bytes_per_dump=particle_bytes_per_dump,
+    )
+
+
+def suggest_interval(values, budget_bytes, key='output_field_interval'):
+    """出力の総量がbudget_bytes以下となる最小の出力間隔 (values[key]) を返す.
+
+    他の出力だけで予算を超える場合や出力が無い場合はNoneを返す.
+    """
+    nstep = int(values['nstep'])
+
+    def total(interval):
+        return estimate_output(dict(values, **{key: interval})).total_bytes
+
+    if total(nstep) > budget_bytes:
+        return None
+
+    lower, upper = 1, nstep
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if total(middle) <= budget_bytes:
+            upper = middle
+        else:
+            lower = middle + 1
+    return lower
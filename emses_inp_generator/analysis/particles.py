@@ -0,0 +1,167 @@
+"""種ごとの1格子あたりの超粒子数 (npin / ngrid) を選ぶ.
+
+雑音のモデル:
+    1格子あたりN個の超粒子で表した種の密度の揺らぎは 1/√N 程度であり,
+    その揺らぎが作る場の揺らぎのエネルギーは種の熱エネルギー n * T に比例する.
+    そこで全ての種の熱エネルギーに対する場の揺らぎの相対的な大きさ (雑音のレベル) を
+
+        noise = √(Σ_s f_s / N_s),  f_s = n_s T_s / Σ_j n_j T_j
+
+    とする. 全ての種でN_s = Nなら noise = 1/√N となる.
+
+超粒子数の合計 Σ N_s (粒子の計算量とメモリに比例する) が最小となる配分は N_s ∝ √f_s で,
+
+    目標の雑音のレベル target : N_s = √f_s * Σ_j √f_j / target^2
+    超粒子数の合計の予算 budget : N_s = budget * √f_s / Σ_j √f_j
+
+となる. 両方を与えた場合, 目標を満たす配分が予算を超えるときは予算での配分とする.
+
+予算は種ごとの費用 c_s で重み付けした合計 Σ c_s N_s に対するものとし (省略時は c_s = 1),
+予算での配分は N_s = budget * √(f_s / c_s) / Σ_j √(f_j c_j) とする.
+光電子の粒子配列 (nnp * 電子のnpin) は電子の超粒子数に比例するため, メモリの予算
+(particle_budget) では電子の費用に含める (particle_costs).
+温度が低い種 (Te >> Tiのイオンなど) は雑音への寄与が小さいため超粒子数が少なくなる.
+放出される種 (光電子) は対象としない.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import List
+
+from ..derived import Derived
+from ..species import create_species, format_species, parse_species
+from .memory import MemoryModel, estimate_memory
+
+
+@dataclass
+class ParticlePlan:
+    names: List[str] = field(default_factory=list)
+    # 種ごとの1格子あたりの超粒子数
+    np_per_grid: List[int] = field(default_factory=list)
+    weights: List[float] = field(default_factory=list)
+    noise: float = 0.0
+    # 予算で制限された (目標の雑音のレベルを満たさない) か
+    limited: bool = False
+
+    @property
+    def total(self):
+        return sum(self.np_per_grid)
+
+
+def plasma_species(values):
+    return [s for s in create_species(values) if not s.emission]
+
+
+def noise_weights(species):
+    """種ごとの雑音の重み f_s (合計1). 全ての種の温度が0なら等しい重みとする."""
+    energies = [s.density * s.temperature for s in species]
+    total = sum(energies)
+    if total <= 0:
+        return [1 / len(species)] * len(species)
+    return [energy / total for energy in energies]
+
+
+def noise_level(weights, np_per_grid):
+    return math.sqrt(sum(f / n if n > 0 else math.inf
+                         for f, n in zip(weights, np_per_grid) if f > 0))
+
+
+def current_noise(values):
+    """GUIの値の超粒子数での雑音のレベル."""
+    species = plasma_species(values)
+    return noise_level(noise_weights(species), [s.np_per_grid for s in species])
+
+
+def _photo_per_electron(values):
+    """電子の1格子あたりの超粒子数1個あたりの光電子の粒子配列の大きさ / 格子数.
+
+    光電子の粒子配列が電子の超粒子数によらない (np_autoなど) 場合は0.
+    """
+    if 'nnp' not in values or values.get('np_auto', False):
+        return 0.0
+    if not any(s.emission for s in create_species(values)):
+        return 0.0
+    return float(values['nnp'])
+
+
+def particle_costs(values, model=None):
+    """種ごとの1格子あたりの超粒子1個のメモリ (プラズマ粒子の配列の大きさで割ったもの).
+
+    電子は光電子の粒子配列 (nnp * 電子のnpin) の分を含む.
+    """
+    model = model or MemoryModel()
+    costs = [1.0] * len(plasma_species(values))
+    if costs:
+        costs[0] += _photo_per_electron(values) / model.particle_margin
+    return costs
+
+
+def particle_budget(values, budget_bytes, model=None):
+    """全てのランクのメモリの合計がbudget_bytesとなる, 1格子あたりの超粒子数の合計.
+
+    合計はparticle_costsで重み付けしたもの. 場の配列と (電子の超粒子数によらない)
+    光電子の粒子配列は現在の値のものを差し引く.
+    """
+    model = model or MemoryModel()
+    memory = estimate_memory(values, model)
+    nplasma = len(plasma_species(values))
+    plasma_bytes = (sum(memory.particles_per_rank[:nplasma]) * memory.nodes
+                    * model.bytes_per_particle)
+    ngrid = int(values['nx']) * int(values['ny']) * int(values['nz'])
+    if _photo_per_electron(values) > 0:
+        plasma_bytes += Derived(values)['np_photo'] * model.bytes_per_particle
+    others = memory.total_bytes - plasma_bytes
+
+    per_grid = ngrid * model.particle_margin * model.bytes_per_particle
+    return max((budget_bytes - others) / per_grid, 0.0)
+
+
+def optimize_particles(values, target=None, budget=None, minimum=1, costs=None):
+    """雑音のレベルの目標 target と超粒子数の合計の予算 budget から配分を選ぶ.
+
+    minimumは各種の1格子あたりの超粒子数の下限. costsは予算での種ごとの費用
+    (particle_costs. 省略すると全て1). 下限により予算を超える場合もlimitedとする.
+    """
+    if target is None and budget is None:
+        raise ValueError('either target or budget is required')
+    if target is not None and target <= 0:
+        raise ValueError('target must be positive')
+
+    species = plasma_species(values)
+    weights = noise_weights(species)
+    if costs is None:
+        costs = [1.0] * len(species)
+    roots = [math.sqrt(f) for f in weights]
+    scale = sum(roots)
+
+    def cost(counts):
+        return sum(c * n for c, n in zip(costs, counts))
+
+    limited = False
+    if target is not None:
+        counts = [math.ceil(root * scale / target ** 2) for root in roots]
+        limited = budget is not None and cost(counts) > budget
+    if target is None or limited:
+        weighted = sum(math.sqrt(f * c) for f, c in zip(weights, costs))
+        counts = [math.floor(budget * math.sqrt(f / c) / weighted)
+                  for f, c in zip(weights, costs)]
+    counts = [max(int(n), minimum) for n in counts]
+    if budget is not None and cost(counts) > budget:
+        limited = True
+
+    return ParticlePlan(names=[s.name for s in species],
+                        np_per_grid=counts,
+                        weights=weights,
+                        noise=noise_level(weights, counts),
+                        limited=limited)
+
+
+def plan_overrides(values, plan):
+    """配分をGUIの値 (np_per_grid, np_per_grid_i, extra_species) にする."""
+    electrons, ions, *extras = plan.np_per_grid
+    overrides = {'np_per_grid': electrons, 'np_per_grid_i': ions}
+    if extras:
+        species = parse_species(values.get('extra_species', '') or '')
+        for s, n in zip(species, extras):
+            s.np_per_grid = n
+        overrides['extra_species'] = format_species(species)
+    return overrides
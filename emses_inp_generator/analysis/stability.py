@@ -0,0 +1,116 @@
+"""数値安定性と解像度を検査する.
+
+simple_plasma.pyと同じ式でEMSES単位系の周波数と速度を求め, 以下の無次元数を計算する
+(EMSES単位系ではdx = 1).
+
+    wpe_dt     : 電子プラズマ周波数 * dt
+    cfl        : 光速 * dt / dx (EMモードのみ)
+    vth_dt     : 最大の熱速度 * dt / dx
+    dx_debye   : dx / デバイ長
+    wce_dt     : 電子サイクロトロン周波数 * dt
+
+GUIの値の辞書の各値は配列でもよく, その場合はスイープの全ての点を一度に検査する.
+"""
+import math
+
+from ..lazy import np
+from ..units import get_units, to_emses
+
+OK = 0
+WARNING = 1
+ERROR = 2
+
+SEVERITY_NAMES = {OK: 'ok', WARNING: 'warning', ERROR: 'error'}
+
+# (warningとする下限, errorとする下限)
+THRESHOLDS = {
+    'wpe_dt': (0.2, 2.0),
+    # 3次元の陽解法のCFL条件 c·dt/dx < 1/√3
+    'cfl': (0.5, 1 / math.sqrt(3)),
+    'vth_dt': (0.3, 1.0),
+    'dx_debye': (1.0, 3.0),
+    'wce_dt': (0.35, 2.0),
+}
+
+LABELS = {
+    'wpe_dt': 'ωpe·dt',
+    'cfl': 'c·dt/dx',
+    'vth_dt': 'vth·dt/dx',
+    'dx_debye': 'dx/λD',
+    'wce_dt': 'ωce·dt',
+}
+
+
+def _column(values, key):
+    return np.asarray(values[key], dtype=float)
+
+
+def stability_numbers(values, use_physical_dt=False):
+    """無次元数の辞書を返す. valuesの各値が配列なら各無次元数も配列になる."""
+    unit = get_units()
+    qe = unit.qe.from_unit
+    me = unit.me.from_unit
+    e0 = unit.e0.from_unit
+
+    dx = _column(values, 'dx')
+    to_c = _column(values, 'em_c')
+    dt = _column(values, 'dt')
+    if use_physical_dt:
+        dt = to_emses('t', dt, dx, to_c)
+
+    n0 = _column(values, 'n0') * 1e6
+    mi = me * _column(values, 'mi2me')
+    B = _column(values, 'B') * 1e-9
+
+    wpe = to_emses('f', np.sqrt(n0 * qe * qe / me / e0), dx, to_c)
+    wce = to_emses('f', qe * np.abs(B) / me, dx, to_c)
+    vthe = to_emses('v', np.sqrt(qe * _column(values, 'Te') / me), dx, to_c)
+    vthi = to_emses('v', np.sqrt(qe * _column(values, 'Ti') / mi), dx, to_c)
+    vth = np.maximum(vthe, vthi)
+    if 'Tp' in values:
+        vthp = to_emses('v', np.sqrt(qe * _column(values, 'Tp') / me), dx, to_c)
+        vth = np.where(np.asarray(values['use_pe'], dtype=bool),
+                       np.maximum(vth, vthp), vth)
+
+    use_em = np.asarray(values['use_em'], dtype=bool)
+
+    return {
+        'wpe_dt': wpe * dt,
+        'cfl': np.where(use_em, to_c * dt, 0.0),
+        'vth_dt': vth * dt,
+        'dx_debye': wpe / vthe,
+        'wce_dt': wce * dt,
+    }
+
+
+def check_stability(values, use_physical_dt=False, thresholds=None):
+    """(無次元数の辞書, 重大度 (OK, WARNING, ERROR) の辞書) を返す."""
+    thresholds = dict(THRESHOLDS, **(thresholds or {}))
+    numbers = stability_numbers(values, use_physical_dt)
+
+    severities = {}
+    for name, number in numbers.items():
+        warning, error = thresholds[name]
+        severities[name] = np.where(number >= error, ERROR,
+                                    np.where(number > warning, WARNING, OK))
+    return numbers, severities
+
+
+def max_severity(severities):
+    return np.max(np.stack(np.broadcast_arrays(*severities.values())), axis=0)
+
+
+def violations(values, use_physical_dt=False, thresholds=None):
+    """1点のGUIの値について, 問題のある無次元数を (ラベル, 値, 重大度の名前) で返す."""
+    numbers, severities = check_stability(values, use_physical_dt, thresholds)
+    return [(LABELS[name], float(numbers[name]), SEVERITY_NAMES[int(severities[name])])
+            for name in numbers if int(severities[name]) != OK]
+
+
+def values_table(values_list, keys=None):
+    """GUIの値の辞書のリストを, キーごとの配列の辞書に変換する."""
+    if keys is None:
+        keys = ('dx', 'em_c', 'dt', 'n0', 'Te', 'Ti', 'mi2me', 'B',
+                'use_em', 'use_pe', 'Tp')
+    keys = [key for key in keys if all(key in values for values in values_list)]
+    return {key: np.array([values[key] for values in values_list]) for key in keys}
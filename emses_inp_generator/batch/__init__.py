@@ -0,0 +1,2 @@
+from .generator import InpGenerator, load_config
+from .spec import iter_runs, load_spec
@@ -0,0 +1,200 @@
+"""生成したplasma.inpを内容のハッシュで共有するキャッシュ.
+
+2段階のキーを用いる.
+
+    値のキー   : 有効なsaverが読むGUIの値 (Saver.relevant_keys), ベースファイル, saverの構成のハッシュ.
+                 同じ値のキーの点は生成せずにキャッシュのファイルを用いる.
+                 無効なsaverだけが読むキー (use_peが偽のときの光電子のパラメータなど) は含めない.
+    内容のキー : キーを並べ替えたnamelist (dumps(sort=True)) のハッシュ.
+                 値のキーが異なっても内容が同じファイルは1つだけ保存する.
+
+出力先にはキャッシュのファイルをハードリンクする (できなければシンボリックリンク, コピー).
+キャッシュのファイルは書き込み禁止とし, リンクした出力先を直接書き換えないこと.
+キャッシュの大きさが上限を超えると, 最後に使われてから長いファイルから削除する (evict).
+storeで新しいファイルを保存して大きさ (プロセスごとの見積もり) が上限を超えた場合に削除するため,
+InpGeneratorを用いる全ての保存 (batch, diurnal, store, GUI, API) で上限を保つ.
+ハードリンクした出力先は残るが, シンボリックリンクはリンク切れになる.
+
+設定は仕様ファイルの[cache]テーブル, またはconfig.iniの[Cache]セクションで行う.
+
+    path   : キャッシュのディレクトリ (空欄では用いない)
+    maxgib : キャッシュの大きさの上限 [GiB] (空欄では削除しない)
+    link   : hard, symbolic, copy
+
+生成の処理を変更した場合はCACHE_VERSIONを上げる (古いキャッシュを用いないため).
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+from pathlib import Path
+
+from ..default.saver import write_atomic
+
+CACHE_VERSION = 1
+GIB = 1024 ** 3
+LINK_MODES = ('hard', 'symbolic', 'copy')
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _plain(value):
+    # numpyのスカラー (スイープの値) をPythonの値にする
+    return value.item() if hasattr(value, 'item') else value
+
+
+def values_key(values, keys, enabled, context):
+    """値のキー. contextはベースファイルとsaverの構成を表す文字列."""
+    items = [(key, repr(_plain(values[key])) if key in values else None)
+             for key in sorted(keys)]
+    return _digest(json.dumps([CACHE_VERSION, context, enabled, items]))
+
+
+def content_key(text):
+    """内容のキー. textはキーを並べ替えたnamelist."""
+    return _digest(text)
+
+
+class InpCache:
+    def __init__(self, directory, max_bytes=None, link='hard'):
+        if link not in LINK_MODES:
+            raise ValueError('link must be one of {}'.format(', '.join(LINK_MODES)))
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.link_mode = link
+        self._size = None  # キャッシュの大きさの見積もり (storeで最初に数える)
+
+    @classmethod
+    def from_settings(cls, settings, root_dir=None):
+        """path, maxgib, linkを持つ辞書 (configのセクションでもよい) から作る. pathが空ならNone."""
+        path = settings.get('path', '') if settings is not None else ''
+        if not path:
+            return None
+        path = Path(path)
+        if root_dir is not None and not path.is_absolute():
+            path = Path(root_dir) / path
+        maxgib = settings.get('maxgib', '')
+        max_bytes = float(maxgib) * GIB if maxgib not in ('', None) else None
+        return cls(path, max_bytes, settings.get('link', 'hard') or 'hard')
+
+    def object_path(self, digest):
+        return self.directory / 'objects' / digest[:2] / (digest + '.inp')
+
+    def _key_path(self, key):
+        return self.directory / 'keys' / key[:2] / key
+
+    def lookup(self, key):
+        """値のキーに対応する内容のキー. 無ければ (削除された場合も) None."""
+        try:
+            digest = self._key_path(key).read_text(encoding='ascii')
+        except OSError:
+            return None
+        return digest if self.object_path(digest).exists() else None
+
+    def remember(self, key, digest):
+        _write_atomic(self._key_path(key), digest.encode('ascii'))
+
+    def store(self, canonical, text):
+        """ファイルの内容textを保存し, 内容のキーを返す. 同じ内容が既にあれば保存しない."""
+        digest = content_key(canonical)
+        path = self.object_path(digest)
+        if not path.exists():
+            data = text.encode('utf-8')
+            _write_atomic(path, data, mode=stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            if self.max_bytes is not None:
+                if self._size is None:
+                    self._size = self.size()
+                else:
+                    self._size += len(data)
+                if self._size > self.max_bytes:
+                    self.evict(keep=path)
+        return digest
+
+    def link(self, digest, filename):
+        """filenameをキャッシュのファイルへのリンクにする. 既に同じファイルならFalseを返す."""
+        source = self.object_path(digest)
+        filename = Path(filename)
+        os.utime(source)  # 最後に使った時刻 (evictで用いる)
+        try:
+            if os.path.samefile(source, filename):
+                return False
+        except OSError:
+            pass
+
+        temporary = filename.with_name('.{}.{}.tmp'.format(filename.name, os.getpid()))
+        _unlink(temporary)
+        mode = self.link_mode
+        if mode == 'hard':
+            try:
+                os.link(source, temporary)
+            except OSError:
+                mode = 'symbolic'
+        if mode == 'symbolic':
+            try:
+                os.symlink(source.resolve(), temporary)
+            except OSError:
+                mode = 'copy'
+        if mode == 'copy':
+            shutil.copyfile(source, temporary)
+        os.replace(temporary, filename)
+        return True
+
+    def _objects(self):
+        objects = []
+        for root, _, files in os.walk(self.directory / 'objects'):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    objects.append((os.stat(path), path))
+                except OSError:
+                    pass
+        return objects
+
+    def size(self):
+        return sum(st.st_size for st, _ in self._objects())
+
+    def evict(self, max_bytes=None, keep=None):
+        """大きさが上限以下になるまで古いファイルを削除する. 削除した数を返す.
+
+        keep (これからリンクするファイルのパス) は削除しない.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+
+        objects = sorted(self._objects(), key=lambda item: item[0].st_mtime_ns)
+        total = sum(st.st_size for st, _ in objects)
+        removed = 0
+        for st, path in objects:
+            if total <= max_bytes:
+                break
+            if keep is not None and Path(path) == Path(keep):
+                continue
+            _unlink(path)
+            total -= st.st_size
+            removed += 1
+        self._size = total
+
+        if removed:
+            for root, _, files in os.walk(self.directory / 'keys'):
+                for name in files:
+                    path = Path(root) / name
+                    if self.lookup(name) is None:
+                        _unlink(path)
+        return removed
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(path, data, mode=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, data, mode=mode)
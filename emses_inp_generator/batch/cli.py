@@ -0,0 +1,191 @@
+"""inpgen batch: 仕様ファイルからplasma.inpを一括生成する."""
+import csv
+import itertools
+import os
+import time
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from pathlib import Path
+
+from .generator import InpGenerator, load_config
+from .spec import iter_runs, load_spec
+
+MANIFEST_NAME = 'manifest.csv'
+# キャッシュを用いる場合の各ファイルの内容のキー (同じ内容のファイルの一覧)
+DIGESTS_NAME = 'digests.csv'
+
+# --skip-unstableで一度に検査する点の数
+STABILITY_CHUNKSIZE = 4096
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(prog='inpgen batch',
+                            description='Generate plasma.inp files without GUI')
+    parser.add_argument('spec', help='Parameter spec file (.toml, .json, .yaml)')
+    parser.add_argument('-o', '--outdir', default='.', help='Output directory')
+    parser.add_argument('--config', default=None,
+                        help='Config file (overrides "config" in spec)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes (0: all cores)')
+    parser.add_argument('--chunksize', type=int, default=64,
+                        help='Number of runs sent to a worker at once')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only list output files')
+    parser.add_argument('--skip-unstable', action='store_true',
+                        help='Skip runs that violate stability conditions (error level)')
+    parser.add_argument('--cache', default=None,
+                        help='Cache directory shared by campaigns (see batch/cache.py)')
+    parser.add_argument('--cache-gib', type=float, default=None,
+                        help='Maximum size of the cache [GiB]')
+    return parser.parse_args(argv)
+
+
+def create_generator(spec, config_path=None):
+    from emout import UnitConversionKey
+
+    from .cache import InpCache
+
+    config = load_config(config_path or spec.get('config'))
+
+    convkey = None
+    if 'convkey' in spec:
+        convkey = UnitConversionKey(float(spec['convkey']['dx']),
+                                    float(spec['convkey']['to_c']))
+
+    cache = InpCache.from_settings(spec['cache']) if 'cache' in spec else None
+    return InpGenerator(config, base=spec.get('base'), convkey=convkey, cache=cache)
+
+
+# 各ワーカープロセスで一度だけ作るInpGenerator
+_worker_generator = None
+
+
+def _init_worker(spec, config_path):
+    global _worker_generator
+    _worker_generator = create_generator(spec, config_path)
+
+
+def _save_run(job):
+    """job: (ファイル名, overrides) または (ファイル名, overrides, 派生量の辞書).
+
+    (ファイル名, 内容のキー) を返す. キャッシュを用いない場合は内容のキーはNone.
+    """
+    filename, overrides = job[:2]
+    _worker_generator.save(filename, overrides, *job[2:])
+    return filename, _worker_generator.last_digest
+
+
+def create_cache(spec, config_path=None):
+    """仕様ファイルの[cache], またはconfig.iniの[Cache]のキャッシュ. 用いない場合はNone."""
+    from .cache import InpCache
+    from .generator import ROOT_DIR
+
+    if 'cache' in spec:
+        return InpCache.from_settings(spec['cache'])
+    config = load_config(config_path or spec.get('config'))
+    if config.has_section('Cache'):
+        return InpCache.from_settings(config['Cache'], root_dir=ROOT_DIR)
+    return None
+
+
+def write_digests(filename, outdir, results):
+    """(ファイル名, 内容のキー) のリストから, 同じ内容のファイルの一覧を書き出す.
+
+    same_asは同じ内容のファイルのうちパスが最小のもの (自身が最小なら空欄).
+    同じ内容のジョブを重ねて投入しないために用いる. 内容の種類の数を返す.
+    """
+    rows = sorted((os.path.relpath(path, outdir), digest) for path, digest in results)
+    first = {}
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'digest', 'same_as'])
+        for path, digest in rows:
+            same_as = first.setdefault(digest, path)
+            writer.writerow([path, digest, same_as if same_as != path else ''])
+    return len(first)
+
+
+def iter_stable_runs(runs, generator, chunksize=STABILITY_CHUNKSIZE):
+    """数値安定性の条件をerrorの水準で破る点を除く. chunksize点ずつまとめて検査する."""
+    from ..analysis import ERROR
+
+    runs = iter(runs)
+    while True:
+        chunk = list(itertools.islice(runs, chunksize))
+        if len(chunk) == 0:
+            return
+        severities = generator.stability_severities([run[2] for run in chunk])
+        for run, severity in zip(chunk, severities):
+            if severity < ERROR:
+                yield run
+
+
+def iter_jobs(spec, outdir, manifest_writer=None, generator=None):
+    """(ファイル名, overrides) を返す. generatorを与えると不安定な点を除く."""
+    axes = list(spec.get('sweep', {}).get('axes', {}))
+    runs = iter_runs(spec)
+    if generator is not None:
+        runs = iter_stable_runs(runs, generator)
+    for name, output, overrides in runs:
+        filename = outdir / output
+        if manifest_writer is not None:
+            manifest_writer.writerow([name, output] + [overrides[axis] for axis in axes])
+        yield filename, overrides
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    spec = load_spec(args.spec)
+    outdir = Path(args.outdir)
+    if args.cache is not None or args.cache_gib is not None:
+        spec['cache'] = dict(spec.get('cache', {}))
+        if args.cache is not None:
+            spec['cache']['path'] = args.cache
+        if args.cache_gib is not None:
+            spec['cache']['maxgib'] = args.cache_gib
+
+    checker = create_generator(spec, args.config) if args.skip_unstable else None
+
+    if args.dry_run:
+        for filename, _ in iter_jobs(spec, outdir, generator=checker):
+            print(filename)
+        return
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    axes = list(spec.get('sweep', {}).get('axes', {}))
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    count = 0
+    digests = []
+    with open(outdir / MANIFEST_NAME, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'path'] + axes)
+
+        # ジョブは遅延生成し, 書き出したファイル名だけを受け取る.
+        job_iter = iter_jobs(spec, outdir, writer, generator=checker)
+        if jobs == 1:
+            _init_worker(spec, args.config)
+            results = map(_save_run, job_iter)
+            for filename, digest in results:
+                count += 1
+                if digest is not None:
+                    digests.append((filename, digest))
+        else:
+            with Pool(jobs, initializer=_init_worker,
+                      initargs=(spec, args.config)) as pool:
+                for filename, digest in pool.imap_unordered(_save_run, job_iter,
+                                                            chunksize=args.chunksize):
+                    count += 1
+                    if digest is not None:
+                        digests.append((filename, digest))
+
+    if digests:
+        unique = write_digests(outdir / DIGESTS_NAME, outdir, digests)
+        create_cache(spec, args.config).evict()
+    elapsed = time.perf_counter() - start
+
+    print('Generated {} files in {:.2f} s ({} jobs)'.format(count, elapsed, jobs))
+    if digests:
+        print('{} distinct contents (see {})'.format(unique, DIGESTS_NAME))
@@ -0,0 +1,171 @@
+"""inpgen diurnal: 太陽の天頂角を変えた一連のplasma.inpを生成する (月面の1日の追跡など).
+
+太陽の向きは --start/--stop/--step (天頂角 [deg]) か, 時系列のCSVファイル (--series) で与える.
+CSVの列は zenith (必須), azimuth, name (省略可) で, その他の列はmanifestにそのまま書く.
+
+全ての点の放出面は地形 (geometry.Terrain) の1回の判定 (sweep) でまとめて求め,
+事前に計算した放出面 (emission_surfaces) として各ワーカープロセスに渡して並列に書き出す.
+放出面の構成 (nemd, curfs, 範囲) が直前の点と同じ点はファイルを書かず,
+manifestで直前のファイルを参照する (夜間などで放出面が無い点が続く場合など).
+
+仕様ファイル (--spec) はbatchと同じ形式で, base, config, values, outputを用いる.
+outputでは {name}, {index}, {zenith}, {azimuth} を使える.
+"""
+import csv
+import os
+import time
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from pathlib import Path
+
+from .cli import MANIFEST_NAME, _init_worker, _save_run, create_generator
+from .spec import load_spec
+
+DEFAULT_OUTPUT = '{name}/plasma.inp'
+DEFAULT_NAME = 'step{index:04d}'
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(prog='inpgen diurnal',
+                            description='Generate plasma.inp files following the Sun')
+    angles = parser.add_mutually_exclusive_group(required=True)
+    angles.add_argument('--start', type=float, help='First zenith angle [deg]')
+    angles.add_argument('--series', default=None,
+                        help='CSV with a "zenith" column (and optional azimuth, name)')
+    parser.add_argument('--stop', type=float, default=None, help='Last zenith angle [deg]')
+    parser.add_argument('--step', type=float, default=1.0, help='Zenith step [deg]')
+    parser.add_argument('--azimuth', type=float, default=None,
+                        help='Azimuth angle [deg] (default: the value in the base file)')
+    parser.add_argument('--spec', default=None,
+                        help='Spec file for base, config, values and output (see batch)')
+    parser.add_argument('-o', '--outdir', default='.', help='Output directory')
+    parser.add_argument('--config', default=None, help='Config file')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes (0: all cores)')
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help='Number of steps sent to a worker at once')
+    parser.add_argument('--digits', type=int, default=6,
+                        help='Digits compared when deduplicating emission layouts')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Write every step even if its layout repeats')
+    parser.add_argument('--dry-run', action='store_true', help='Only list output files')
+    args = parser.parse_args(argv)
+    if args.start is not None and args.stop is None:
+        parser.error('--start requires --stop')
+    return args
+
+
+def angle_range(start, stop, step):
+    """startからstopまで (stopを含む) step間隔の天頂角のリスト."""
+    if step == 0:
+        raise ValueError('step must not be zero')
+    count = int((stop - start) / step + 1e-9) + 1
+    return [start + i * step for i in range(max(count, 0))]
+
+
+def read_series(filename):
+    """時系列のCSVを読み, 行 (列名 -> 文字列) のリストを返す."""
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    if rows and 'zenith' not in rows[0]:
+        raise ValueError('{} has no "zenith" column'.format(filename))
+    return rows
+
+
+def layout_key(surfaces, curf, digits=6):
+    """放出面の構成を比較するためのキー (curfsはcurfとの比で比較する)."""
+    scale = curf if curf != 0 else 1.0
+    return tuple((s.nemd, round(s.curf / scale, digits))
+                 + tuple(round(v, digits) for v in (s.xmin, s.xmax, s.ymin, s.ymax,
+                                                   s.zmin, s.zmax))
+                 for s in surfaces)
+
+
+def emission_layouts(generator, zeniths, azimuths, overrides=None):
+    """各点の放出面 (EmissionSurfaceのリスト) を1回の判定で求める."""
+    from ..derived import Derived
+
+    values = Derived(generator.values(overrides))
+    if 'zssurf' not in values:
+        raise ValueError('ControlSimpleHoleParameter must be enabled in config.ini')
+    return values['terrain'].sweep(values['curf'], zeniths, azimuths), values['curf']
+
+
+def plan(rows, generator, spec, outdir, digits=6, dedup=True):
+    """(書き出すジョブのリスト, manifestの行のリスト) を返す.
+
+    ジョブは (ファイル名, overrides, 事前に計算した派生量).
+    """
+    common = dict(spec.get('values', {}))
+    output = spec.get('output', DEFAULT_OUTPUT)
+
+    zeniths = [float(row['zenith']) for row in rows]
+    azimuths = [float(row['azimuth']) for row in rows]
+    layouts, curf = emission_layouts(generator, zeniths, azimuths, common)
+
+    jobs = []
+    manifest = []
+    previous = None
+    path = None
+    for index, (row, surfaces) in enumerate(zip(rows, layouts)):
+        key = layout_key(surfaces, curf, digits)
+        overrides = dict(common, zenith=zeniths[index], azimuth=azimuths[index])
+        name = row.get('name') or DEFAULT_NAME.format(index=index)
+
+        written = not dedup or key != previous
+        if written:
+            fields = dict(overrides, name=name, index=index)
+            path = output.format_map(fields)
+            jobs.append((outdir / path, overrides, {'emission_surfaces': surfaces}))
+        previous = key
+        manifest.append(dict(row, name=name, path=path, written=int(written)))
+    return jobs, manifest
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    spec = load_spec(args.spec) if args.spec else {}
+    outdir = Path(args.outdir)
+    generator = create_generator(spec, args.config)
+
+    if args.series is not None:
+        rows = read_series(args.series)
+    else:
+        rows = [{'zenith': zenith} for zenith in angle_range(args.start, args.stop, args.step)]
+
+    default_azimuth = args.azimuth
+    if default_azimuth is None:
+        default_azimuth = generator.values(spec.get('values')).get('azimuth', 0.0)
+    for row in rows:
+        if not row.get('azimuth'):
+            row['azimuth'] = default_azimuth
+
+    start = time.perf_counter()
+    jobs, manifest = plan(rows, generator, spec, outdir, args.digits, not args.no_dedup)
+
+    if args.dry_run:
+        for filename, _, _ in jobs:
+            print(filename)
+        return
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    nprocs = args.jobs if args.jobs > 0 else os.cpu_count()
+    if nprocs == 1:
+        _init_worker(spec, args.config)
+        for _ in map(_save_run, jobs):
+            pass
+    else:
+        with Pool(nprocs, initializer=_init_worker, initargs=(spec, args.config)) as pool:
+            for _ in pool.imap_unordered(_save_run, jobs, chunksize=args.chunksize):
+                pass
+
+    columns = list(manifest[0]) if manifest else ['name', 'path', 'written']
+    with open(outdir / MANIFEST_NAME, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(manifest)
+    elapsed = time.perf_counter() - start
+
+    print('Generated {} files for {} steps in {:.2f} s ({} jobs)'.format(
+        len(jobs), len(manifest), elapsed, nprocs))
@@ -0,0 +1,155 @@
+"""GUIを用いずにplasma.inpを生成する.
+
+GUIと同じLoader/Saverの連鎖 (create_default_loader, create_default_saver,
+add_additional_parameter) を用いる.
+GUIの値の辞書の代わりに, 各パラメータの初期値をベースファイルから読み込んだ値で
+上書きし, さらに指定した値で上書きした辞書をSaverに渡す.
+
+cache (batch/cache.py) を与えると (省略時はconfig.iniの[Cache]), saveは値や内容が同じ
+ファイルを生成せずにキャッシュのファイルへのリンクとする.
+"""
+from configparser import ConfigParser
+from pathlib import Path
+
+from ..additional import add_additional_parameter
+from ..analysis import (CostModel, MemoryModel, check_stability, cost_inputs,
+                        estimate_memory, estimate_output, max_severity,
+                        optimize_nodes, optimize_particles, values_table)
+from ..default.loader import create_default_loader
+from ..default.saver import IncrementalSaver, copy_inp, create_default_saver, dumps
+from ..default.values import create_default_values
+from .cache import InpCache, content_key, values_key
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def load_config(filename=None):
+    config = ConfigParser()
+    config.read(filename or ROOT_DIR / 'config.ini')
+    return config
+
+
+class InpGenerator:
+    def __init__(self, config=None, base=None, convkey=None, cache=None):
+        if config is None:
+            config = load_config()
+        self.config = config
+
+        if cache is None and config.has_section('Cache'):
+            cache = InpCache.from_settings(config['Cache'], root_dir=ROOT_DIR)
+        self.cache = cache
+        self.last_digest = None  # 直前のsaveのファイルの内容のキー (cacheを用いる場合)
+
+        use_physical_dt = config['Control'].getboolean('UsePhysicalDt')
+        self.loader = create_default_loader(use_physical_dt=use_physical_dt)
+        self.saver = create_default_saver(use_physical_dt=use_physical_dt)
+        self.params = add_additional_parameter(config, None, self.loader, self.saver)
+
+        self.defaults = create_default_values()
+        for param in self.params:
+            self.defaults.update(param.default_values())
+
+        if base is None:
+            base = ROOT_DIR / config['Default']['DefaultInpPath']
+        self.set_base(base, convkey=convkey)
+
+    def set_base(self, filename, convkey=None):
+        """生成の元となるパラメータファイルを設定する (GUIのLoadに相当)."""
+        self.base, loaded_values = self.loader.load_values(filename, convkey)
+        self.incremental = IncrementalSaver(self.saver, self.base)
+        self.base_values = dict(self.defaults)
+        self.base_values.update(loaded_values)
+        # 値のキーに含める, ベースファイルとsaverの構成
+        self._cache_context = [content_key(dumps(self.base, self.base.convkey, sort=True)),
+                               [saver.__qualname__ for saver in self.saver.savers]]
+
+    def values(self, overrides=None):
+        """ベースの値をoverridesで上書きしたGUIの値の辞書を返す."""
+        values = dict(self.base_values)
+        if overrides:
+            unknown = [key for key in overrides if key not in values]
+            if unknown:
+                raise KeyError('Unknown parameter(s): {}'.format(', '.join(unknown)))
+            values.update(overrides)
+        return values
+
+    def estimate_memory(self, overrides=None, model=None):
+        """MPIランクあたりのメモリ使用量の見積もり (MemoryEstimate) を返す."""
+        if model is None:
+            model = MemoryModel.from_config(self.config)
+        return estimate_memory(self.values(overrides), model)
+
+    def optimize_nodes(self, nranks, overrides=None, **kwargs):
+        """nodes(1:3)の候補 (Decomposition) を良い順に返す."""
+        return optimize_nodes(self.values(overrides), nranks, **kwargs)
+
+    def optimize_particles(self, target=None, budget=None, overrides=None, **kwargs):
+        """種ごとの1格子あたりの超粒子数の配分 (ParticlePlan) を返す.
+
+        値にするにはanalysis.plan_overridesを用いる.
+        """
+        return optimize_particles(self.values(overrides), target, budget, **kwargs)
+
+    def predict_wall_time(self, overrides=None, nranks=None, model=None):
+        """予測されるwall time [s] を返す. nranksを省略するとnodesの積を用いる."""
+        if model is None:
+            model = CostModel.from_config(self.config, root_dir=ROOT_DIR)
+        return model.predict(cost_inputs(self.values(overrides)), nranks)
+
+    def estimate_output(self, overrides=None):
+        """HDF5出力の総量の見積もり (OutputEstimate) を返す."""
+        return estimate_output(self.values(overrides))
+
+    def check_stability(self, overrides=None):
+        """(無次元数の辞書, 重大度の辞書) を返す (analysis.check_stability)."""
+        use_physical_dt = self.config['Control'].getboolean('UsePhysicalDt')
+        return check_stability(self.values(overrides), use_physical_dt=use_physical_dt)
+
+    def stability_severities(self, overrides_list):
+        """overridesのリストの各点の最大の重大度の配列を返す (まとめて計算する)."""
+        use_physical_dt = self.config['Control'].getboolean('UsePhysicalDt')
+        table = values_table([self.values(overrides) for overrides in overrides_list])
+        _, severities = check_stability(table, use_physical_dt=use_physical_dt)
+        return max_severity(severities)
+
+    def _values_with(self, overrides, derived):
+        values = self.values(overrides)
+        if derived:
+            # 事前に計算した派生量 (derived.py) はDerivedで計算し直さずに用いる
+            values.update(derived)
+        return values
+
+    def generate(self, overrides=None, derived=None):
+        """(InpFile, UnitConversionKey)を返す. ファイルには書き出さない."""
+        inp = copy_inp(self.base)
+        convkey = self.saver.apply(inp, self._values_with(overrides, derived))
+        return inp, convkey
+
+    def save(self, filename, overrides=None, derived=None):
+        """前回のsaveから値が変わったsaverだけを実行して保存する (IncrementalSaver).
+
+        内容が同じ既存のファイルは書き換えない. derivedには事前に計算した派生量
+        (例: {'emission_surfaces': [...]}) を与えられる.
+        cacheを用いる場合は, 値のキーがキャッシュにある点は生成せずにリンクする.
+        """
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        values = self._values_with(overrides, derived)
+
+        if self.cache is None:
+            self.incremental.save(filename, values)
+            return filename
+
+        keys, enabled = self.saver.relevant_keys(self.base, values)
+        key = None
+        if keys is not None:
+            key = values_key(values, keys, enabled, self._cache_context)
+        digest = self.cache.lookup(key) if key is not None else None
+        if digest is None:
+            inp, convkey = self.incremental.update(values)
+            digest = self.cache.store(dumps(inp, convkey, sort=True), dumps(inp, convkey))
+            if key is not None:
+                self.cache.remember(key, digest)
+        self.cache.link(digest, filename)
+        self.last_digest = digest
+        return filename
@@ -0,0 +1,460 @@
+"""inpgen report / inpgen diff: 過去の実行のplasma.inpをまとめて読み込み, 値を比較する.
+
+各ファイルはLoader (config.iniで有効なパラメータのapplyer) で物理単位系のGUIの値にする.
+!!keyヘッダが無いファイルは--dx, --to-cの値を用いる. 与えない場合はcvと--hint (物理単位系の
+値が分かっているキー, 例えば --hint n0=100) から(dx, to_c)を推定し (default/inference.py),
+表のkey_sourceとkey_confidenceに記録する. confidenceが--min-confidence (既定 DEFAULT_MIN_CONFIDENCE)
+未満のファイルと, dxまたはto_cが決まらずfallbackの値となったファイル (--allow-fallbackで許す) はエラーとする.
+
+    inpgen report runs/ -o runs.csv -j 8
+        runs/以下の*.inpを並列に読み込み, 1ファイル1行の表 (CSVまたはParquet) を書き出す.
+        全ての値が同じファイルを同じ番号の構成 (cluster) にまとめ, 構成ごとのファイル数と
+        ファイルによって値が異なるパラメータを表示する.
+        表は読み込んだ順に書き出し, 全てのファイルの値は保持しない (メモリは構成の数に比例する).
+
+    inpgen diff a/plasma.inp b/plasma.inp ...
+        値が異なるパラメータだけをファイルごとに並べて表示する.
+
+浮動小数点数はSIGNIFICANT_DIGITS桁に丸めて比較する (単位の変換の誤差を同じ値とみなす).
+Parquetの書き出しにはpyarrowが必要. 列の型は最初の行のまとまりで決め, 合わない値は空とする.
+"""
+import csv
+import hashlib
+import itertools
+import math
+import numbers
+import os
+import time
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+from multiprocessing import Pool
+from pathlib import Path
+
+DEFAULT_PATTERN = '*.inp'
+SIGNIFICANT_DIGITS = 10
+# 要約で並べる異なる値の数の上限 (これを超えると範囲だけを表示する)
+MAX_DISTINCT = 8
+# 一度に並列の読み込みに投入するファイルの数 (読み込んだ値を溜め込まないため)
+BATCH_SIZE = 1024
+PARQUET_ROW_GROUP = 4096
+
+META_COLUMNS = ('path', 'cluster', 'sha1', 'error', 'key_source', 'key_confidence')
+# dxだけが決まらない推定 (cvのみ) のconfidenceは0.5以下となる
+DEFAULT_MIN_CONFIDENCE = 0.5
+
+
+_worker_loader = None
+_worker_convkey = None
+_worker_hints = None
+_worker_min_confidence = DEFAULT_MIN_CONFIDENCE
+_worker_allow_fallback = False
+
+
+def _init_worker(config_path, convkey, hints=None, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                 allow_fallback=False):
+    global _worker_loader, _worker_convkey, _worker_hints, _worker_min_confidence
+    global _worker_allow_fallback
+    from ..templates import create_template_loader
+    from .generator import load_config
+
+    _worker_loader = create_template_loader(load_config(config_path))
+    _worker_convkey = convkey
+    _worker_hints = hints
+    _worker_min_confidence = min_confidence
+    _worker_allow_fallback = allow_fallback
+
+
+def iter_inp_files(paths, pattern=DEFAULT_PATTERN):
+    """ファイルはそのまま, ディレクトリは再帰的にpatternに一致するファイルをパスの順に返す."""
+    for path in paths:
+        path = Path(path)
+        if not path.is_dir():
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if fnmatch(name, pattern):
+                    yield Path(root) / name
+
+
+def normalize(value):
+    """比較と書き出しに用いる値. numpyのスカラーはPythonの値にし, 浮動小数点数は丸める."""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isfinite(value):
+        return float('{:.{}g}'.format(value, SIGNIFICANT_DIGITS))
+    return value
+
+
+def read_run(path):
+    """(パス, 内容のsha1, GUIの値の辞書, エラーのメッセージ) を返す. 読めない場合は値を空とする.
+
+    値の辞書にはkey_source (header, given, inferred) とkey_confidenceを含める.
+    """
+    from emout import UnitConversionKey
+
+    from ..default.loader import MissingConversionKey
+
+    path = str(path)
+    try:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        source, confidence = 'header', 1.0
+        if _worker_convkey is None:
+            _, values, inference = _worker_loader.infer_values(path, _worker_hints)
+            if inference is not None:
+                source, confidence = 'inferred', inference.confidence
+                if not all(inference.determined) and not _worker_allow_fallback:
+                    names = [name for name, ok in zip(('dx', 'to_c'), inference.determined)
+                             if not ok]
+                    raise ValueError('{} not determined (give --hint or --dx/--to-c): {}'.format(
+                        ' and '.join(names), inference.summary()))
+                if confidence < _worker_min_confidence:
+                    raise ValueError('low confidence: ' + inference.summary())
+        else:
+            try:
+                _, values = _worker_loader.read_values(path)
+            except MissingConversionKey:
+                source = 'given'
+                _, values = _worker_loader.read_values(path, UnitConversionKey(*_worker_convkey))
+    except Exception as e:
+        return path, None, {}, '{}: {}'.format(type(e).__name__, e)
+    values = {key: normalize(value) for key, value in values.items()}
+    values.update(key_source=source, key_confidence=normalize(confidence))
+    return path, digest, values, ''
+
+
+def iter_read(paths, jobs=1, config_path=None, convkey=None, hints=None,
+              min_confidence=DEFAULT_MIN_CONFIDENCE, allow_fallback=False, chunksize=16):
+    """pathsを読み込み, read_runの結果をpathsの順に返す. convkeyは (dx, to_c) またはNone."""
+    paths = iter(paths)
+    initargs = (config_path, convkey, hints, min_confidence, allow_fallback)
+    if jobs == 1:
+        _init_worker(*initargs)
+        yield from map(read_run, paths)
+        return
+
+    with Pool(jobs, initializer=_init_worker, initargs=initargs) as pool:
+        while True:
+            batch = list(itertools.islice(paths, BATCH_SIZE))
+            if not batch:
+                break
+            yield from pool.imap(read_run, batch, chunksize=chunksize)
+
+
+class ColumnSummary:
+    """1つの列の値の要約. 異なる値はMAX_DISTINCT個まで保持する."""
+
+    def __init__(self):
+        self.count = 0
+        self.distinct = []
+        self.overflow = False  # 異なる値がMAX_DISTINCT個を超えた
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.count += 1
+        if not self.overflow and value not in self.distinct:
+            if len(self.distinct) < MAX_DISTINCT:
+                self.distinct.append(value)
+            else:
+                self.overflow = True
+        if isinstance(value, numbers.Real) and not isinstance(value, bool):
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def varies(self, total):
+        """ファイルによって値が異なる (一部のファイルにだけ値がある場合も含む) か."""
+        return self.overflow or len(self.distinct) > 1 or 0 < self.count < total
+
+    def describe(self):
+        if not self.overflow:
+            return ', '.join(_format(value) for value in self.distinct)
+        if self.minimum is not None:
+            return '>{} values in [{}, {}]'.format(
+                MAX_DISTINCT, _format(self.minimum), _format(self.maximum))
+        return '>{} values'.format(MAX_DISTINCT)
+
+
+class ArchiveSummary:
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.columns = {key: ColumnSummary() for key in self.keys}
+        self.clusters = {}  # 値のハッシュ -> [番号, ファイル数, 最初のファイル]
+        self.total = 0
+        self.errors = []  # (パス, メッセージ)
+
+    def add(self, path, values, error=''):
+        """1ファイルの値を加え, 構成の番号を返す (読めなかったファイルはNone)."""
+        if error:
+            self.errors.append((path, error))
+            return None
+
+        self.total += 1
+        for key in self.keys:
+            if key in values:
+                self.columns[key].add(values[key])
+
+        key = config_key(values, self.keys)
+        cluster = self.clusters.get(key)
+        if cluster is None:
+            cluster = self.clusters[key] = [len(self.clusters), 0, path]
+        cluster[1] += 1
+        return cluster[0]
+
+    def varying(self):
+        return [key for key in self.keys if self.columns[key].varies(self.total)]
+
+
+def config_key(values, keys):
+    """構成を表すハッシュ (値が全て同じファイルは同じ値になる)."""
+    items = [(key, values.get(key)) for key in keys]
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '{:.{}g}'.format(value, SIGNIFICANT_DIGITS)
+    return str(value)
+
+
+class CsvTable:
+    def __init__(self, filename, columns):
+        self.columns = columns
+        self._file = open(filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, row):
+        self._writer.writerow([_format(row.get(column)) for column in self.columns])
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetTable:
+    """PARQUET_ROW_GROUP行ずつParquetのファイルに書き出す."""
+
+    def __init__(self, filename, columns):
+        import pyarrow  # noqa: F401 (pyarrowが無ければ書き出しを始める前に失敗させる)
+
+        self.filename = filename
+        self.columns = columns
+        self.kinds = None
+        self._rows = []
+        self._writer = None
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows and self._writer is not None:
+            return
+        if self.kinds is None:
+            self.kinds = {column: _kind(row.get(column) for row in self._rows)
+                          for column in self.columns}
+        types = {'bool': pa.bool_(), 'int': pa.int64(), 'float': pa.float64(),
+                 'str': pa.string()}
+        schema = pa.schema([(column, types[self.kinds[column]]) for column in self.columns])
+        table = pa.table({column: [_coerce(row.get(column), self.kinds[column])
+                                   for row in self._rows]
+                          for column in self.columns}, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.filename, schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+
+def _kind(values):
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add('bool')
+        elif isinstance(value, numbers.Integral):
+            kinds.add('int')
+        elif isinstance(value, numbers.Real):
+            kinds.add('float')
+        else:
+            kinds.add('str')
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds == {'int', 'float'}:
+        return 'float'
+    return 'str'
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    if kind == 'str':
+        return _format(value)
+    if kind == 'bool':
+        return value if isinstance(value, bool) else None
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return None
+    return int(value) if kind == 'int' else float(value)
+
+
+def open_table(filename, columns):
+    """拡張子 (.csv, .parquet) に応じた書き出し先."""
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.csv':
+        return CsvTable(filename, columns)
+    if suffix in ('.parquet', '.pq'):
+        return ParquetTable(filename, columns)
+    raise ValueError('Unsupported table format: {}'.format(filename))
+
+
+def value_keys(config_path=None):
+    """表の列とするGUIのキー (config.iniで有効なパラメータのapplyerの順)."""
+    from ..templates import create_template_loader
+    from .generator import load_config
+
+    return list(create_template_loader(load_config(config_path)).applyers)
+
+
+def _add_common_arguments(parser):
+    parser.add_argument('paths', nargs='+', help='plasma.inp files or directories')
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN,
+                        help='File name pattern in directories (default: *.inp)')
+    parser.add_argument('--config', default=None, help='Config file')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes (0: all cores)')
+    parser.add_argument('--dx', type=float, default=None,
+                        help='Grid width [m] for files without "!!key" header')
+    parser.add_argument('--to-c', type=float, default=None,
+                        help='Light speed in EMSES unit for files without "!!key" header')
+    parser.add_argument('--hint', action='append', default=[], metavar='KEY=VALUE',
+                        help='Known physical value (e.g. n0=100) to infer dx and to_c '
+                             'of files without "!!key" header')
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help='Treat files whose inferred dx and to_c have lower confidence '
+                             'as errors (default: {})'.format(DEFAULT_MIN_CONFIDENCE))
+    parser.add_argument('--allow-fallback', action='store_true',
+                        help='Accept files whose dx or to_c could not be inferred '
+                             '(the default values are used)')
+
+
+def _hints(args):
+    hints = {}
+    for hint in args.hint:
+        key, sep, value = hint.partition('=')
+        if not sep:
+            raise SystemExit('--hint must be KEY=VALUE: {}'.format(hint))
+        hints[key.strip()] = float(value)
+    return hints or None
+
+
+def _convkey(args):
+    if args.dx is None and args.to_c is None:
+        return None
+    if args.dx is None or args.to_c is None:
+        raise SystemExit('--dx and --to-c must be given together')
+    return args.dx, args.to_c
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(prog='inpgen report',
+                            description='Summarize parameters of many plasma.inp files')
+    _add_common_arguments(parser)
+    parser.add_argument('-o', '--output', default=None,
+                        help='Table of all files (.csv or .parquet)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of largest clusters to print')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    start = time.perf_counter()
+
+    keys = value_keys(args.config)
+    summary = ArchiveSummary(keys)
+    inferred = []  # dx, to_cを推定したファイルのconfidence
+    table = open_table(args.output, list(META_COLUMNS) + keys) if args.output else None
+    try:
+        runs = iter_read(iter_inp_files(args.paths, args.pattern), jobs=jobs,
+                         config_path=args.config, convkey=_convkey(args), hints=_hints(args),
+                         min_confidence=args.min_confidence,
+                         allow_fallback=args.allow_fallback)
+        for path, digest, values, error in runs:
+            cluster = summary.add(path, values, error)
+            if values.get('key_source') == 'inferred':
+                inferred.append(values['key_confidence'])
+            if table is not None:
+                table.write(dict(values, path=path, cluster=cluster, sha1=digest,
+                                 error=error or None))
+    finally:
+        if table is not None:
+            table.close()
+
+    print('Read {} files in {:.2f} s ({} jobs), {} errors'.format(
+        summary.total + len(summary.errors), time.perf_counter() - start, jobs,
+        len(summary.errors)))
+    for path, error in summary.errors:
+        print('  error: {}: {}'.format(path, error))
+    if inferred:
+        print('{} files without "!!key" header (inferred dx and to_c, confidence {:.2f}-{:.2f})'
+              .format(len(inferred), min(inferred), max(inferred)))
+
+    clusters = sorted(summary.clusters.values(), key=lambda c: (-c[1], c[0]))
+    print('{} distinct configurations'.format(len(clusters)))
+    for number, count, path in clusters[:args.top]:
+        print('  #{:<5} {:>6} files  {}'.format(number, count, path))
+
+    varying = summary.varying()
+    print('{} parameters differ between files'.format(len(varying)))
+    for key in varying:
+        print('  {:<30} {}'.format(key, summary.columns[key].describe()))
+
+
+def parse_diff_args(argv=None):
+    parser = ArgumentParser(prog='inpgen diff',
+                            description='Show parameters that differ between plasma.inp files')
+    _add_common_arguments(parser)
+    parser.add_argument('--all', action='store_true', help='Print all parameters')
+    return parser.parse_args(argv)
+
+
+def diff_main(argv=None):
+    args = parse_diff_args(argv)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    keys = value_keys(args.config)
+    runs = list(iter_read(iter_inp_files(args.paths, args.pattern), jobs=jobs,
+                          config_path=args.config, convkey=_convkey(args), hints=_hints(args),
+                          min_confidence=args.min_confidence,
+                          allow_fallback=args.allow_fallback))
+    for path, _, _, error in runs:
+        if error:
+            print('error: {}: {}'.format(path, error))
+    runs = [(path, values) for path, _, values, error in runs if not error]
+    if not runs:
+        return
+
+    if not args.all:
+        keys = [key for key in keys
+                if len({repr(values.get(key)) for _, values in runs}) > 1]
+
+    width = max([len(key) for key in keys] + [9])
+    print('{:<{}}  {}'.format('parameter', width, '  '.join(path for path, _ in runs)))
+    for key in keys:
+        print('{:<{}}  {}'.format(key, width, '  '.join(
+            '{:<{}}'.format(_format(values.get(key)), len(path))
+            for path, values in runs)).rstrip())
@@ -0,0 +1,96 @@
+"""batch生成のパラメータ仕様ファイル (TOML/JSON/YAML) を読み込む.
+
+仕様ファイルの形式 (TOMLの例):
+
+    base = "template/default.inp"   # 省略時はconfig.iniのDefaultInpPath
+    config = "config.ini"           # 省略時はパッケージのconfig.ini
+    output = "{name}/plasma.inp"    # 出力先 (runの値で format される)
+
+    [convkey]                       # baseに!!keyヘッダが無い場合のみ必要
+    dx = 0.01
+    to_c = 10000.0
+
+    [values]                        # 全runに共通の値 (GUIのキー)
+    use_pe = true
+
+    [[runs]]
+    name = "n0_10"
+    n0 = 10
+
+[sweep]テーブルがある場合は, 各runにスイープの各点の値を重ねたものを生成する
+(sweep.pyを参照).
+
+[cache]テーブル (path, maxgib, link) で生成したファイルのキャッシュを用いる (cache.pyを参照).
+
+base, config, cacheのpathは仕様ファイルからの相対パスとして扱う.
+"""
+import json
+from pathlib import Path
+
+DEFAULT_OUTPUT = '{name}/plasma.inp'
+
+
+def load_spec(filename):
+    filename = Path(filename)
+    suffix = filename.suffix.lower()
+
+    if suffix == '.json':
+        with open(filename, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    elif suffix == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(filename, 'rb') as f:
+            spec = tomllib.load(f)
+    elif suffix in ('.yaml', '.yml'):
+        import yaml
+        with open(filename, 'r', encoding='utf-8') as f:
+            spec = yaml.safe_load(f)
+    else:
+        raise ValueError('Unsupported spec format: {}'.format(filename))
+
+    for key in ('base', 'config'):
+        if key in spec:
+            spec[key] = str(filename.parent / spec[key])
+    if spec.get('cache', {}).get('path'):
+        spec['cache']['path'] = str(filename.parent / spec['cache']['path'])
+    if 'sweep' in spec:
+        from .sweep import check_sweep
+        check_sweep(spec['sweep'])
+    return spec
+
+
+def iter_runs(spec):
+    """(name, 出力パス, GUIの値の辞書) を順に返す."""
+    output = spec.get('output', DEFAULT_OUTPUT)
+    common = spec.get('values', {})
+
+    runs = spec.get('runs', [{}])
+    if 'sweep' in spec:
+        runs = _sweep_runs(runs, spec['sweep'])
+
+    for index, run in enumerate(runs):
+        run = dict(run)
+        name = str(run.pop('name', index))
+        run_output = run.pop('output', output)
+
+        overrides = dict(common)
+        overrides.update(run)
+
+        fields = dict(overrides, name=name, index=index)
+        yield name, run_output.format_map(fields), overrides
+
+
+def _sweep_runs(runs, sweep):
+    from .sweep import iter_points
+
+    # 乱数シードの無いlhs, sobolでも全てのrunで同じ点を用いるため, 1回だけ展開する
+    points = list(iter_points(sweep))
+    for run in runs:
+        for index, point in enumerate(points):
+            swept = dict(run, **point)
+            if 'name' in run:
+                swept['name'] = '{}_{}'.format(run['name'], index)
+            yield swept
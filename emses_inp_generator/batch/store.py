@@ -0,0 +1,406 @@
+"""キャンペーン (大量のスイープの点) の値を1つの列指向のファイルに保存する.
+
+inpgen batchのように点ごとにplasma.inpを書き出す代わりに, 全ての点のGUIの値と派生量を
+ディレクトリ内の2つのファイルに保存する.
+
+    columns.npy : (列の数, 点の数) のfloat64の配列 (各列は連続する). np.loadのmmap_modeで開く
+    store.json  : 列の名前と種類, 全ての点で同じ値 (constants), 点の名前と出力先, 仕様
+
+列は以下の2種類.
+
+    GUIの値 : 仕様ファイルで指定したキーのうち点によって値が変わるもの.
+              bool, int, floatはそのまま, それ以外 (文字列など) はcategoriesの番号で持つ
+    派生量  : DERIVED_COLUMNS (derived.pyの派生量) と数値安定性の無次元数
+              (analysis/stability.pyのwpe_dt, cfl, vth_dt, dx_debye, wce_dt) とseverity
+
+plasma.inpは必要になったときに1点ずつ (materialize), またはまとめて (materialize_all) 書き出す.
+どちらも既にあるファイルは書き出さない. まとめて書き出す場合はファイルごとのfsyncを行わず,
+最後にファイルを書いたディレクトリと新しく作ったディレクトリの親 (出力先など) を1回ずつfsyncする.
+
+検索の条件 (query) は空白区切りの比較で, 全てを満たす点の番号を返す.
+
+    wpe_dt>0.2 n0<=100 use_em=true
+"""
+import hashlib
+import json
+import math
+import numbers
+import os
+import re
+import time
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from pathlib import Path
+
+from ..lazy import np
+from ..templates import OPERATORS
+from .spec import iter_runs, load_spec
+
+COLUMNS_NAME = 'columns.npy'
+HEADER_NAME = 'store.json'
+STORE_VERSION = 1
+
+# 派生量を計算するときに一度にまとめる点の数 (数値安定性の検査はまとめて行う)
+CHUNKSIZE = 4096
+
+DERIVED_COLUMNS = (
+    'wpe', 'wpi', 'wc', 'pathe', 'pathi', 'pathp', 'em_vdrie', 'em_vdrii', 'curf',
+    'ngrid', 'npin', 'debye_length', 'egyro_radius', 'igyro_radius',
+)
+STABILITY_COLUMNS = ('wpe_dt', 'cfl', 'vth_dt', 'dx_debye', 'wce_dt', 'severity')
+
+QUERY_PATTERN = re.compile(r'([A-Za-z_]\w*)\s*(==|!=|<=|>=|=|<|>)\s*(\S+)')
+
+
+def _kind(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, numbers.Integral):
+        return 'int'
+    if isinstance(value, numbers.Real):
+        return 'float'
+    return 'str'
+
+
+def _plain(value):
+    """numpyのスカラーをJSONで保存できるPythonの値にする."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _column_kind(values):
+    kinds = {_kind(value) for value in values}
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds == {'int', 'float'}:
+        return 'float'
+    return 'str'
+
+
+def _category_key(value):
+    return type(value).__name__, value
+
+
+def _hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def fsync_directory(path):
+    """ディレクトリのエントリを永続化する (対応しないOSでは何もしない)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _derived_row(values):
+    from ..derived import Derived
+
+    derived = Derived(values)
+    row = []
+    for name in DERIVED_COLUMNS:
+        try:
+            row.append(float(derived[name]))
+        except (KeyError, ValueError, ZeroDivisionError):
+            row.append(math.nan)
+    return row
+
+
+class CampaignStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / HEADER_NAME, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('version') != STORE_VERSION:
+            raise ValueError('Unsupported store version: {}'.format(header.get('version')))
+        self.header = header
+        self.spec = header['spec']
+        self.names = header['names']
+        self.outputs = header['outputs']
+        self.override_keys = header['override_keys']
+        self.constants = header['constants']
+        self.columns = {column['name']: column for column in header['columns']}
+        self._rows = {name: row for row, name in enumerate(self.columns)}
+        self.data = np.load(self.directory / COLUMNS_NAME, mmap_mode='r')
+        self._generator = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def create(cls, directory, spec, config_path=None, generator=None):
+        """仕様ファイルの全ての点の値を計算してdirectoryに保存する."""
+        from ..analysis import check_stability, max_severity, values_table
+        from .cli import create_generator
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        spec = dict(spec)
+        if config_path is not None:
+            spec['config'] = str(config_path)
+        if generator is None:
+            generator = create_generator(spec)
+        use_physical_dt = generator.config['Control'].getboolean('UsePhysicalDt')
+
+        runs = list(iter_runs(spec))
+        override_keys = sorted({key for _, _, overrides in runs for key in overrides})
+        base_values = generator.values()
+
+        constants = {}
+        value_columns = []
+        for key in override_keys:
+            column = [_plain(run[2].get(key, base_values.get(key))) for run in runs]
+            first = column[0]
+            if all(_kind(value) == _kind(first) and value == first for value in column):
+                constants[key] = first
+            else:
+                value_columns.append((key, column))
+
+        header_columns = []
+        for key, column in value_columns:
+            kind = _column_kind(column)
+            entry = {'name': key, 'kind': kind, 'source': 'value'}
+            if kind == 'str':
+                categories = {}
+                for value in column:
+                    categories.setdefault(_category_key(value), value)
+                entry['categories'] = list(categories.values())
+            header_columns.append(entry)
+        for name in DERIVED_COLUMNS + STABILITY_COLUMNS:
+            kind = 'int' if name == 'severity' else 'float'
+            header_columns.append({'name': name, 'kind': kind, 'source': 'derived'})
+
+        temporary = directory / (COLUMNS_NAME + '.tmp')
+        data = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float64,
+                                         shape=(len(header_columns), len(runs)))
+        for row, (entry, (_, column)) in enumerate(zip(header_columns, value_columns)):
+            if entry['kind'] == 'str':
+                codes = {_category_key(value): code
+                         for code, value in enumerate(entry['categories'])}
+                column = [codes[_category_key(value)] for value in column]
+            data[row] = np.asarray(column, dtype=np.float64)
+
+        first_derived = len(value_columns)
+        first_stability = first_derived + len(DERIVED_COLUMNS)
+        for start in range(0, len(runs), CHUNKSIZE):
+            stop = min(start + CHUNKSIZE, len(runs))
+            values_list = [generator.values(run[2]) for run in runs[start:stop]]
+            rows = [_derived_row(values) for values in values_list]
+            data[first_derived:first_stability, start:stop] = np.array(rows).T
+
+            stability, severities = check_stability(values_table(values_list),
+                                                    use_physical_dt=use_physical_dt)
+            for offset, name in enumerate(STABILITY_COLUMNS[:-1]):
+                data[first_stability + offset, start:stop] = stability[name]
+            data[first_stability + len(STABILITY_COLUMNS) - 1, start:stop] = \
+                max_severity(severities)
+        data.flush()
+        del data
+        os.replace(temporary, directory / COLUMNS_NAME)
+
+        stored_spec = {key: spec[key] for key in ('base', 'config', 'convkey', 'output', 'cache')
+                       if key in spec}
+        if 'base' in stored_spec:
+            stored_spec['base'] = str(Path(stored_spec['base']).resolve())
+        header = {
+            'version': STORE_VERSION,
+            'spec': stored_spec,
+            'base_sha1': _hash(stored_spec['base']) if 'base' in stored_spec else None,
+            'names': [name for name, _, _ in runs],
+            'outputs': [output for _, output, _ in runs],
+            'override_keys': override_keys,
+            'constants': constants,
+            'columns': header_columns,
+        }
+        temporary = directory / (HEADER_NAME + '.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(temporary, directory / HEADER_NAME)
+        return cls(directory)
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            from .cli import create_generator
+
+            base = self.spec.get('base')
+            if base is not None and _hash(base) != self.header['base_sha1']:
+                raise ValueError('{} has changed since the store was built'.format(base))
+            self._generator = create_generator(self.spec)
+        return self._generator
+
+    def column(self, name):
+        """列の値の配列 (memmap). 文字列の列はcategoriesの番号を返す."""
+        if name in self._rows:
+            return self.data[self._rows[name]]
+        if name in self.constants:
+            return np.full(len(self), self.constants[name], dtype=object)
+        raise KeyError(name)
+
+    def _decode(self, name, index):
+        if name in self.constants:
+            return self.constants[name]
+        entry = self.columns[name]
+        value = self.data[self._rows[name], index]
+        if entry['kind'] == 'str':
+            return entry['categories'][int(value)]
+        if entry['kind'] == 'bool':
+            return bool(value)
+        if entry['kind'] == 'int':
+            return int(value)
+        return float(value)
+
+    def overrides(self, index):
+        """点の生成に用いたGUIの値 (仕様ファイルで指定したキーのみ)."""
+        return {key: self._decode(key, index) for key in self.override_keys}
+
+    def row(self, index):
+        """点の全ての列の値の辞書."""
+        row = dict(self.constants)
+        row.update((name, self._decode(name, index)) for name in self.columns)
+        return row
+
+    def _mask(self, name, op, text):
+        lower = text.lower()
+        if lower in ('true', 'yes', 'on', 'false', 'no', 'off'):
+            expected = lower in ('true', 'yes', 'on')
+        else:
+            try:
+                expected = float(text)
+            except ValueError:
+                expected = text
+
+        entry = self.columns.get(name)
+        if entry is not None and entry['kind'] == 'str':
+            categories = entry['categories']
+            column = [categories[int(code)] for code in self.column(name)]
+            return np.array([isinstance(value, type(expected)) and op(value, expected)
+                             for value in column], dtype=bool)
+        column = self.column(name)
+        if isinstance(expected, str):
+            return np.array([op(str(value), expected) for value in column], dtype=bool)
+        return np.asarray(op(column.astype(float), float(expected)), dtype=bool)
+
+    def query(self, text=''):
+        """条件を全て満たす点の番号の配列."""
+        mask = np.ones(len(self), dtype=bool)
+        for m in QUERY_PATTERN.finditer(text):
+            name, op, expected = m.groups()
+            if name not in self.columns and name not in self.constants:
+                raise KeyError('Unknown column: {}'.format(name))
+            mask &= self._mask(name, OPERATORS[op], expected)
+        return np.flatnonzero(mask)
+
+    def path(self, index, outdir=None):
+        return Path(outdir or self.directory) / self.outputs[index]
+
+    def generate(self, index):
+        """点の (InpFile, UnitConversionKey). ファイルには書き出さない."""
+        return self.generator.generate(self.overrides(index))
+
+    def materialize(self, index, outdir=None):
+        """点のplasma.inpを書き出す (既にあれば書き出さない). ファイル名を返す."""
+        filename = self.path(index, outdir)
+        if not filename.exists():
+            self.generator.save(filename, self.overrides(index))
+        return filename
+
+    def materialize_all(self, indices=None, outdir=None, jobs=1, chunksize=64):
+        """indices (省略時は全ての点) のplasma.inpを書き出す (既にあるファイルは書き出さない).
+
+        書き出した数を返す.
+        """
+        from .cli import _init_worker, _save_run
+
+        if indices is None:
+            indices = range(len(self))
+        directories = set()  # 最後にfsyncするディレクトリ
+        jobs_iter = self._pending(indices, outdir, directories)
+
+        count = 0
+        if jobs == 1:
+            _init_worker(self.spec, None)
+            for _ in map(_save_run, jobs_iter):
+                count += 1
+        else:
+            with Pool(jobs, initializer=_init_worker, initargs=(self.spec, None)) as pool:
+                for _ in pool.imap_unordered(_save_run, jobs_iter, chunksize=chunksize):
+                    count += 1
+
+        for directory in sorted(directories):
+            fsync_directory(directory)
+        return count
+
+    def _pending(self, indices, outdir, directories):
+        """書き出すジョブ (ファイル名, overrides) を返し, fsyncするディレクトリを集める.
+
+        ファイルのエントリはその親に, 新しく作るディレクトリのエントリはさらにその親にある.
+        """
+        for index in indices:
+            filename = self.path(index, outdir)
+            if filename.exists():
+                continue
+            directory = filename.parent
+            directories.add(directory)
+            while not directory.exists() and directory.parent != directory:
+                directory = directory.parent
+                directories.add(directory)
+            yield filename, self.overrides(index)
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(prog='inpgen store',
+                            description='Columnar store of a generated campaign')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Compute all points of a spec file')
+    build.add_argument('spec', help='Parameter spec file (see batch)')
+    build.add_argument('-o', '--store', default='campaign', help='Store directory')
+    build.add_argument('--config', default=None, help='Config file')
+
+    query = subparsers.add_parser('query', help='List points matching conditions')
+    query.add_argument('store', help='Store directory')
+    query.add_argument('query', nargs='*', help='Conditions such as "wpe_dt>0.2 n0<=100"')
+    query.add_argument('--columns', nargs='+', default=None, help='Columns to print')
+
+    materialize = subparsers.add_parser('materialize', help='Write plasma.inp files')
+    materialize.add_argument('store', help='Store directory')
+    materialize.add_argument('query', nargs='*', help='Conditions (default: all points)')
+    materialize.add_argument('-o', '--outdir', default=None,
+                             help='Output directory (default: the store directory)')
+    materialize.add_argument('-j', '--jobs', type=int, default=1,
+                             help='Number of worker processes (0: all cores)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+
+    if args.command == 'build':
+        store = CampaignStore.create(args.store, load_spec(args.spec), args.config)
+        print('Stored {} points ({} columns) in {:.2f} s'.format(
+            len(store), len(store.columns), time.perf_counter() - start))
+        return
+
+    store = CampaignStore(args.store)
+    indices = store.query(' '.join(args.query))
+
+    if args.command == 'query':
+        columns = args.columns or []
+        print('\t'.join(['name'] + columns))
+        for index in indices:
+            row = store.row(index)
+            print('\t'.join([store.names[index]] + ['{}'.format(row[c]) for c in columns]))
+        return
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    count = store.materialize_all(indices, args.outdir, jobs=jobs)
+    print('Generated {} files in {:.2f} s ({} jobs)'.format(
+        count, time.perf_counter() - start, jobs))
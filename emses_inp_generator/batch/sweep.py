@@ -0,0 +1,153 @@
+"""パラメータスイープの点を展開する.
+
+仕様ファイルの[sweep]テーブルで指定する (TOMLの例):
+
+    [sweep]
+    mode = "product"    # product, zip, lhs, sobol
+    samples = 256       # lhs, sobolの点数 (必須)
+    seed = 0            # lhs, sobolの乱数シード
+
+    [sweep.axes]
+    n0 = [10, 100, 1000]                          # 値のリスト
+    Te = {start = 1.0, stop = 10.0, num = 10}     # 等間隔 (log = trueで対数間隔)
+    zenith = {min = 0.0, max = 80.0}              # lhs, sobol用の範囲
+    np_per_grid = {min = 10, max = 100, int = true}
+
+product, zipでは各軸を値のリスト (またはstart/stop/num) として扱い,
+lhs, sobolでは各軸をmin/max (log = trueで対数一様) の範囲として扱う.
+展開した点のうち同じ値の組は1つにまとめる. sobolにはscipyが必要 (pip install emses_inp_generator[sobol]).
+"""
+import importlib.util
+import itertools
+import math
+
+from ..lazy import np
+
+
+def axis_values(name, axis):
+    if isinstance(axis, (list, tuple)):
+        return list(axis)
+
+    if 'start' in axis:
+        start = float(axis['start'])
+        stop = float(axis['stop'])
+        num = int(axis['num'])
+        if axis.get('log', False):
+            values = np.logspace(math.log10(start), math.log10(stop), num)
+        else:
+            values = np.linspace(start, stop, num)
+        return _cast(values, axis)
+
+    raise ValueError('Axis "{}" must be a list or have start/stop/num'.format(name))
+
+
+def axis_scale(name, axis, samples):
+    """[0, 1)の一様サンプルを軸の範囲に写す."""
+    if not isinstance(axis, dict) or 'min' not in axis:
+        raise ValueError('Axis "{}" must have min/max for sampling'.format(name))
+
+    vmin = float(axis['min'])
+    vmax = float(axis['max'])
+    if axis.get('log', False):
+        values = 10 ** (math.log10(vmin) + samples * (math.log10(vmax) - math.log10(vmin)))
+    else:
+        values = vmin + samples * (vmax - vmin)
+    return _cast(values, axis)
+
+
+def _cast(values, axis):
+    if axis.get('int', False):
+        return [int(v) for v in np.rint(values)]
+    return [float(v) for v in values]
+
+
+def expand_product(axes, **kwargs):
+    names = list(axes)
+    columns = [axis_values(name, axes[name]) for name in names]
+    for point in itertools.product(*columns):
+        yield dict(zip(names, point))
+
+
+def expand_zip(axes, **kwargs):
+    names = list(axes)
+    columns = [axis_values(name, axes[name]) for name in names]
+    if len(set(map(len, columns))) > 1:
+        raise ValueError('All axes must have the same length in zip mode')
+    for point in zip(*columns):
+        yield dict(zip(names, point))
+
+
+def expand_lhs(axes, samples, seed=None):
+    rng = np.random.default_rng(seed)
+    names = list(axes)
+
+    # 各軸で[0, 1)をsamples個の区間に分け, 区間の並びを軸ごとに入れ替える.
+    unit = np.empty((samples, len(names)))
+    for j in range(len(names)):
+        unit[:, j] = (rng.permutation(samples) + rng.random(samples)) / samples
+
+    yield from _scale_samples(axes, names, unit)
+
+
+def expand_sobol(axes, samples, seed=None):
+    try:
+        from scipy.stats import qmc
+    except ImportError as e:
+        raise ImportError(SCIPY_MESSAGE) from e
+
+    names = list(axes)
+    unit = qmc.Sobol(len(names), scramble=True, seed=seed).random(samples)
+
+    yield from _scale_samples(axes, names, unit)
+
+
+def _scale_samples(axes, names, unit):
+    columns = [axis_scale(name, axes[name], unit[:, j])
+               for j, name in enumerate(names)]
+    for point in zip(*columns):
+        yield dict(zip(names, point))
+
+
+EXPANDERS = {
+    'product': expand_product,
+    'zip': expand_zip,
+    'lhs': expand_lhs,
+    'sobol': expand_sobol,
+}
+# 点数 (samples) を必要とするモード
+SAMPLED_MODES = ('lhs', 'sobol')
+SCIPY_MESSAGE = ('Sweep mode "sobol" requires scipy '
+                 '(pip install scipy, or emses_inp_generator[sobol])')
+
+
+def check_sweep(sweep):
+    """[sweep]テーブルのmode, axes, samplesを確かめる. 誤りがあればValueErrorを送出する.
+
+    sobolでscipyが無い場合はImportErrorを送出する.
+    """
+    mode = sweep.get('mode', 'product')
+    if mode not in EXPANDERS:
+        raise ValueError('Unknown sweep mode: {}'.format(mode))
+    if not isinstance(sweep.get('axes'), dict):
+        raise ValueError('[sweep] requires an "axes" table')
+    if mode in SAMPLED_MODES and int(sweep.get('samples', 0)) < 1:
+        raise ValueError('Sweep mode "{}" requires samples >= 1'.format(mode))
+    if mode == 'sobol' and importlib.util.find_spec('scipy') is None:
+        raise ImportError(SCIPY_MESSAGE)
+
+
+def iter_points(sweep):
+    """スイープの点 (軸名 -> 値の辞書) を重複を除いて順に返す."""
+    check_sweep(sweep)
+    expander = EXPANDERS[sweep.get('mode', 'product')]
+    points = expander(sweep['axes'],
+                      samples=int(sweep.get('samples', 0)),
+                      seed=sweep.get('seed'))
+
+    seen = set()
+    for point in points:
+        key = tuple(point.items())
+        if key in seen:
+            continue
+        seen.add(key)
+        yield point
@@ -1,4 +1,4 @@
 from .gui import WindowCreator
 from .loader import create_default_loader
-from .saver import create_default_saver
+from .saver import IncrementalSaver, create_default_saver
 from .unit_conversion import create_conversion_window, to_emses_unit, to_physical_unit
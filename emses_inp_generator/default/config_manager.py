@@ -1,6 +1,5 @@
-import PySimpleGUI as sg
 from ..gui.basic_components import parameter
-from emout import UnitConversionKey, Units
+from ..lazy import sg
 
 
 def create_config_window(config, location=None):
@@ -1,9 +1,9 @@
 import glob
 import os
 
-import PySimpleGUI as sg
-
 from ..gui import basis_parameter, parameter
+from ..lazy import sg
+from .values import create_default_values
 
 
 class WindowCreator:
@@ -22,10 +22,10 @@ class WindowCreator:
     def add_tab_creator(self, tab_creator):
         self.tab_creators.append(tab_creator)
 
-    def create_window(self, use_physical_dt=False):
+    def create_window(self, use_physical_dt=False, template_files=None):
         sg.theme(self.theme)
 
-        template_frame = create_template_frame()
+        template_frame = create_template_frame(template_files)
         main_frame = create_main_frame(self.tab_creators, use_physical_dt)
 
         layout = [
@@ -38,11 +38,12 @@ class WindowCreator:
 
 
 def create_basis_frame():
+    defaults = create_default_values()
     layout = [
-        basis_parameter('Grid width [m]', 1.0, 1.0,
+        basis_parameter('Grid width [m]', defaults['dx'], 1.0,
                         key='dx', fix_em_unit=True),
         basis_parameter('Light speed [m/s]', 2.997925e8,
-                        10000, key='c', fix_unit=True),
+                        defaults['em_c'], key='c', fix_unit=True),
         basis_parameter('Electron charge-to-mass ratio',
                         -1.758820e11, -1.0, key='qe/me', fix_unit=True, fix_em_unit=True),
         basis_parameter(
@@ -52,31 +53,41 @@ def create_basis_frame():
 
 
 def create_simulation_frame(use_physical_dt):
+    defaults = create_default_values()
     if use_physical_dt:
         layout = [
-            parameter('dt [s]', 0.01, key='dt'),
-            parameter('nx', 64, key='nx'),
-            parameter('ny', 64, key='ny'),
-            parameter('nz', 512, key='nz'),
-            parameter('nstep', 100000, key='nstep')
+            parameter('dt [s]', defaults['dt'], key='dt'),
+            parameter('nx', defaults['nx'], key='nx'),
+            parameter('ny', defaults['ny'], key='ny'),
+            parameter('nz', defaults['nz'], key='nz'),
+            parameter('nstep', defaults['nstep'], key='nstep')
         ]
     else:
         layout = [
-            parameter('dt', 0.01, key='dt'),
-            parameter('nx', 64, key='nx'),
-            parameter('ny', 64, key='ny'),
-            parameter('nz', 512, key='nz'),
-            parameter('nstep', 100000, key='nstep')
+            parameter('dt', defaults['dt'], key='dt'),
+            parameter('nx', defaults['nx'], key='nx'),
+            parameter('ny', defaults['ny'], key='ny'),
+            parameter('nz', defaults['nz'], key='nz'),
+            parameter('nstep', defaults['nstep'], key='nstep')
         ]
     return sg.Frame('シミュレーションパラメータ', layout)
 
 
 def create_extra_frame():
+    defaults = create_default_values()
     layout = [
-        parameter('jobnum', '0 1', key='jobnum'),
-        parameter('nodes x', 4, key='nodesx'),
-        parameter('nodes y', 2, key='nodesy'),
-        parameter('nodes z', 32, key='nodesz')
+        parameter('jobnum', defaults['jobnum'], key='jobnum'),
+        parameter('nodes x', defaults['nodesx'], key='nodesx'),
+        parameter('nodes y', defaults['nodesy'], key='nodesy'),
+        parameter('nodes z', defaults['nodesz'], key='nodesz'),
+        parameter('MPI processes',
+                  defaults['nodesx'] * defaults['nodesy'] * defaults['nodesz'],
+                  key='nprocs'),
+        [sg.Button('Optimize nodes')],
+        parameter('Predicted wall time [h]', 0, key='walltime', fix_unit=True),
+        parameter('Predicted core hours', 0, key='corehours', fix_unit=True),
+        parameter('Deadline [h]', 24, key='deadline'),
+        [sg.Button('Suggest processes')]
     ]
     return sg.Frame('その他設定', layout)
 
@@ -85,7 +96,15 @@ def create_check_frame():
     layout = [
         parameter('Debye Length [m]', 0, key='debye', fix_unit=True),
         parameter('Electron gyro radius [m]', 0, key='egyro', fix_unit=True),
-        parameter('Ion gyro radius [m]', 0, key='igyro', fix_unit=True)
+        parameter('Ion gyro radius [m]', 0, key='igyro', fix_unit=True),
+        parameter('Memory per rank [GiB]', 0, key='memory', fix_unit=True),
+        parameter('Memory total [GiB]', 0, key='memory_total', fix_unit=True),
+        parameter('Output volume [GiB]', 0, key='output_volume', fix_unit=True),
+        parameter('ωpe·dt', 0, key='wpe_dt', fix_unit=True),
+        parameter('c·dt/dx', 0, key='cfl', fix_unit=True),
+        parameter('vth·dt/dx', 0, key='vth_dt', fix_unit=True),
+        parameter('dx/λD', 0, key='dx_debye', fix_unit=True),
+        parameter('ωce·dt', 0, key='wce_dt', fix_unit=True)
     ]
     return sg.Frame('チェック', layout)
 
@@ -109,22 +128,29 @@ def create_main_frame(tab_creators, use_physical_dt):
          sg.Button('Restart Window'),
          sg.Button('Open Config'),
          sg.Button('Open Conversion'),
-         sg.Text('Base file: None', key='basefile', size=(100, 1))]
+         sg.Text('Base file: None', key='basefile', size=(100, 1))],
+        [sg.ProgressBar(1000, size=(20, 10), key='task_progress'),
+         sg.Button('Cancel', key='Cancel Task', disabled=True),
+         sg.Text('', key='task_status', size=(80, 1))]
     ]
     return sg.Frame('Parameter settings', layout)
 
 
-def create_template_frame():
+def create_template_frame(template_files=None):
     from pathlib import Path
 
-    template_dir = str((Path(__file__).parent.parent / "template").resolve())
-    template_files = glob.glob(f'{template_dir}/*.inp')
-    template_files = [os.path.basename(filename)
-                      for filename in template_files]
+    if template_files is None:
+        template_dir = str((Path(__file__).parent.parent / "template").resolve())
+        template_files = glob.glob(f'{template_dir}/*.inp')
+        template_files = [os.path.basename(filename)
+                          for filename in template_files]
     template_list = sg.Listbox(
-        template_files, key='template_file', size=(30, 30))
+        template_files, key='template_file', size=(30, 28), enable_events=True)
     layout = [
+        [sg.Text('Search'), sg.Input('', key='template_search',
+                                     size=(24, 1), enable_events=True)],
         [template_list],
+        [sg.Text('', key='template_summary', size=(30, 2))],
         [sg.Button('Apply Template'), sg.Button('Save Template')]
     ]
     return sg.Frame('Template files', layout)
@@ -0,0 +1,141 @@
+"""!!keyヘッダが無いパラメータファイルのdxとto_cを推定する.
+
+Loaderのapplyer (simple_plasma.pyの_n0, _Teなど) はファイルのEMSES単位系の値と(dx, to_c)から
+物理単位系の値を求める. 物理単位系の値が分かっているキー (hints, 例えば {'n0': 100}) について
+applyerの値がhintsと一致する(dx, to_c)を求める. さらに&plasmaのcvはEMSES単位系での光速
+(= to_c) であるため, cvも観測として用いる.
+
+applyerの値は dx^a * to_c^b に比例する (単位の変換の冪) ため, (log dx, log to_c) の
+線形の最小二乗で解ける. 冪は2点での差分から求める.
+
+    to_c : cv (またはhintsのTe, Tiなど速度から求まる値) で決まる
+    dx   : 周波数から求まる値 (n0, Bなど) で決まる. 無い場合は決まらず, fallbackの値とする
+
+confidence (0から1) は以下の積とする.
+
+    決まった未知数の割合 (dx, to_cの両方が決まれば1)
+    exp(-最大の相対誤差 / MISFIT_TOLERANCE) (解でのapplyerの値とhintsの値のずれ)
+    観測が未知数より多い (互いに確かめられる) 場合は1, そうでなければUNCHECKED
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+from ..lazy import np
+from ..units import get_units
+
+MISFIT_TOLERANCE = 0.1
+UNCHECKED = 0.8
+# 冪を求める差分の刻み (冪の関係は厳密に線形のため値によらない)
+STEP = math.log(2.0)
+# cvはファイルに書かれた厳密な値のため, 丸められたhintsより重く扱う
+CV_WEIGHT = 10.0
+# 推定した(dx, to_c)の有効桁数 (最小二乗の丸め誤差で 0.49999999999999956 などとしない)
+SIGNIFICANT_DIGITS = 12
+
+
+@dataclass
+class ConversionInference:
+    dx: float
+    to_c: float
+    confidence: float
+    # (dxが決まったか, to_cが決まったか)
+    determined: Tuple[bool, bool] = (False, False)
+    # 観測の名前 -> 解での相対誤差
+    residuals: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def convkey(self):
+        from emout import UnitConversionKey
+        return UnitConversionKey(dx=self.dx, to_c=self.to_c)
+
+    def summary(self):
+        names = ', '.join(self.residuals) or 'none'
+        return 'dx={:.6g} to_c={:.6g} confidence={:.2f} (from {})'.format(
+            self.dx, self.to_c, self.confidence, names)
+
+
+def _observations(inp, applyers, hints):
+    """(名前, lambda unit: 物理単位系の値, hintsの値) のリスト."""
+    observations = []
+    try:
+        cv = float(inp['plasma']['cv'])
+    except (KeyError, TypeError, ValueError):
+        cv = None
+    if cv is not None and cv > 0:
+        observations.append(('cv', lambda unit: unit.to_c, cv))
+
+    for key, value in (hints or {}).items():
+        if key not in applyers:
+            raise KeyError('no applyer for hint {!r}'.format(key))
+        applyer = applyers[key]
+        observations.append((key, lambda unit, applyer=applyer: applyer(inp, unit),
+                             float(value)))
+    return observations
+
+
+def _log_value(function, x):
+    try:
+        value = float(function(get_units(dx=math.exp(x[0]), to_c=math.exp(x[1]))))
+    except (ArithmeticError, IndexError, KeyError, TypeError, ValueError):
+        return None
+    return math.log(value) if value > 0 and math.isfinite(value) else None
+
+
+def _round(value):
+    return float('{:.{}g}'.format(value, SIGNIFICANT_DIGITS))
+
+
+def infer_conversion_key(inp, applyers, hints=None, fallback=(1.0, 10000.0)):
+    """inpの値とhints {GUIのキー: 物理単位系の値} から(dx, to_c)を推定する.
+
+    applyersはLoader.applyers. 決まらない未知数はfallback (dx, to_c) の値とする.
+    """
+    x0 = np.log(np.asarray(fallback, dtype=float))
+    rows = []
+    targets = []
+    used = []
+    for name, function, target in _observations(inp, applyers, hints):
+        if target <= 0:
+            continue
+        base = _log_value(function, x0)
+        shifted = [_log_value(function, x0 + STEP * np.eye(2)[j]) for j in range(2)]
+        if base is None or None in shifted:
+            continue
+        gradient = [(value - base) / STEP for value in shifted]
+        if max(abs(g) for g in gradient) < 1e-9:
+            continue  # (dx, to_c) によらない値は推定に用いない
+        weight = CV_WEIGHT if name == 'cv' else 1.0
+        rows.append([weight * g for g in gradient])
+        targets.append(weight * (math.log(target) - base))
+        used.append((name, function, target))
+
+    if not rows:
+        return ConversionInference(dx=float(fallback[0]), to_c=float(fallback[1]),
+                                   confidence=0.0)
+
+    A = np.array(rows)
+    b = np.array(targets)
+    delta, _, rank, _ = np.linalg.lstsq(A, b, rcond=None)  # 決まらない方向は0 (fallback)
+
+    # 決まらない方向 (AᵀAの零空間) の成分を持つ未知数は決まらない
+    eigenvalues, eigenvectors = np.linalg.eigh(A.T @ A)
+    determined = [True, True]
+    for value, vector in zip(eigenvalues, eigenvectors.T):
+        if value < 1e-9 * max(eigenvalues.max(), 1.0):
+            for j in range(2):
+                if abs(vector[j]) > 1e-6:
+                    determined[j] = False
+
+    dx, to_c = _round(math.exp(x0[0] + delta[0])), _round(math.exp(x0[1] + delta[1]))
+    x = np.log([dx, to_c])
+    residuals = {}
+    for name, function, target in used:
+        value = _log_value(function, x)
+        residuals[name] = abs(math.exp(value) / target - 1) if value is not None else math.inf
+
+    misfit = max(residuals.values())
+    confidence = (sum(determined) / 2 * math.exp(-misfit / MISFIT_TOLERANCE)
+                  * (1.0 if len(used) > rank else UNCHECKED))
+    return ConversionInference(dx=dx, to_c=to_c, confidence=confidence, determined=tuple(determined),
+                               residuals=residuals)
@@ -0,0 +1,134 @@
+"""入力の変更に合わせてチェックの値 (デバイ長, 数値安定性, メモリ, 計算時間など) を計算し直す.
+
+チェックの値は出力ごとの関数 (lambda values: {GUIのキー: 表示する値}) で求める.
+関数が参照したGUIのキーを記録し, 前回の計算から値が変わったキーを参照した出力だけを
+計算し直す (Derivedと同じく参照から依存関係を求めるため, 依存するキーを列挙しなくてよい).
+
+入力の変更はwatch_changesでCHANGED_EVENTとして通知する. Debouncerは最後の変更から
+一定時間 (config.iniの[Control] LiveCheckDelayMs) 経ってから計算するために用いる.
+"""
+import time
+from collections.abc import Mapping
+
+from ..lazy import sg
+
+CHANGED_EVENT = '-CHANGED-'
+
+# 入力中の値 (空欄, "1e" など) で計算できない場合の例外. その出力は前回の表示のままとする
+INPUT_ERRORS = (ArithmeticError, KeyError, TypeError, ValueError)
+
+
+class RecordingValues(Mapping):
+    """参照したキーを記録するGUIの値の辞書."""
+
+    def __init__(self, values):
+        self.values = values
+        self.keys_read = set()
+
+    def __getitem__(self, key):
+        self.keys_read.add(key)
+        return self.values[key]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class LiveChecks:
+    def __init__(self):
+        self.outputs = {}  # 出力の名前 -> lambda values: {GUIのキー: 値}
+        self.reads = {}  # 出力の名前 -> 前回の計算で参照したキーの集合
+        self.values = None  # 前回の計算に用いた値
+
+    def add_output(self, name, function):
+        self.outputs[name] = function
+
+    def stale(self, values):
+        """前回から値が変わったキーを参照した (または未計算の) 出力の名前のリスト."""
+        if self.values is None:
+            return list(self.outputs)
+        dirty = {key for key in set(values) | set(self.values)
+                 if values.get(key) != self.values.get(key)}
+        return [name for name in self.outputs
+                if name not in self.reads or self.reads[name] & dirty]
+
+    def compute(self, values, names, task=None):
+        """namesの出力を計算し, (GUIの値の更新, 出力の名前 -> 参照したキー) を返す.
+
+        スレッドで実行できるよう状態は変更しない. 結果はcommitで反映する.
+        """
+        updates = {}
+        reads = {}
+        for i, name in enumerate(names):
+            if task is not None:
+                task.progress(i / len(names), name)
+            recording = RecordingValues(values)
+            try:
+                updates.update(self.outputs[name](recording))
+            except INPUT_ERRORS:
+                reads[name] = None
+                continue
+            reads[name] = recording.keys_read
+        return updates, reads
+
+    def commit(self, values, reads):
+        """computeの結果を記録する. 計算できなかった出力 (None) は次の変更で再び計算する."""
+        for name, keys in reads.items():
+            if keys is None:
+                self.reads.pop(name, None)
+            else:
+                self.reads[name] = keys
+        self.values = values
+
+
+class Debouncer:
+    def __init__(self, delay):
+        self.delay = delay  # [s]
+        self.deadline = None
+
+    def touch(self):
+        self.deadline = time.monotonic() + self.delay
+
+    def timeout(self):
+        """read_all_windowsのtimeout [ms]. 待っている変更が無ければNone."""
+        if self.deadline is None:
+            return None
+        return max(int((self.deadline - time.monotonic()) * 1000), 1)
+
+    def due(self):
+        """最後の変更から時間が経っていればTrueを返し, 待っている変更を消す."""
+        if self.deadline is None or time.monotonic() < self.deadline:
+            return False
+        self.deadline = None
+        return True
+
+
+def watch_changes(window):
+    """入力の要素の値が変わったときにCHANGED_EVENTを通知する (values[CHANGED_EVENT]はキー).
+
+    プログラムからの更新 (読み込み, Optimize nodesなど) も通知される.
+    """
+    for key, element in window.key_dict.items():
+        notify = _notifier(window, key)
+        if isinstance(element, sg.Multiline):
+            element.Widget.bind('<<Modified>>', _modified(element.Widget, notify), add='+')
+        elif isinstance(element, (sg.Input, sg.Checkbox, sg.Radio, sg.Combo, sg.Spin)):
+            variable = element.TKStringVar
+            if variable is None:
+                variable = element.TKIntVar
+            if variable is not None:
+                variable.trace_add('write', notify)
+
+
+def _notifier(window, key):
+    return lambda *args: window.write_event_value(CHANGED_EVENT, key)
+
+
+def _modified(widget, notify):
+    def callback(event):
+        if widget.edit_modified():
+            widget.edit_modified(False)
+            notify()
+    return callback
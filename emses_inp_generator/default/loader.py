@@ -1,7 +1,20 @@
 import os
 
-import PySimpleGUI as sg
-from emout import InpFile, UnitConversionKey, Units
+from ..lazy import sg
+from ..species import emission_index
+from ..units import get_units
+
+
+class MissingConversionKey(ValueError):
+    """ファイルに!!keyヘッダが無く, dxとto_cが与えられていない.
+
+    inpは読み込んだファイル, inferenceは推定した(dx, to_c) (inference.ConversionInference).
+    """
+
+    def __init__(self, message, inp=None, inference=None):
+        super().__init__(message)
+        self.inp = inp
+        self.inference = inference
 
 
 class Loader:
@@ -16,8 +29,9 @@ class Loader:
             def exceptor(inp, unit): return True
         self.exceptors[key] = exceptor
 
-    def apply(self, inp, convkey, window):
-        unit = Units(convkey.dx, convkey.to_c)
+    def to_values(self, inp, convkey):
+        unit = get_units(convkey.dx, convkey.to_c)
+        values = {}
         for key, applyer in self.applyers.items():
             if not self.exceptors[key](inp, unit):
                 continue
@@ -25,41 +39,143 @@ class Loader:
                 value = applyer(inp, unit)
             except KeyError:
                 continue
+            values[key] = value
+        return values
+
+    def apply(self, inp, convkey, window):
+        self.update_window(self.to_values(inp, convkey), window)
+
+    def update_window(self, values, window, filename=None):
+        """GUIの値の辞書をウィンドウに反映する (UIのスレッドで呼ぶ)."""
+        for key, value in values.items():
             window[key].Update(value=value)
+        if filename is not None:
+            window['basefile'].Update('Base file: {}'.format(filename))
+
+    def load_values(self, filename, convkey=None, hints=None):
+        """GUIを用いずにパラメータファイルを読み込み, (InpFile, GUIの値の辞書)を返す.
+
+        ファイルに!!keyヘッダが無い場合はconvkeyを用いる. convkeyも無い場合は
+        hints (物理単位系の値が分かっているGUIのキーの辞書) から推定した値を
+        MissingConversionKey.inferenceに記録して送出する.
+        """
+        from emout import InpFile, UnitConversionKey
+
+        if convkey is None:
+            convkey = UnitConversionKey.load(filename)
+        inp = InpFile(filename)
+        if convkey is None:
+            raise self._missing(filename, inp, hints)
+
+        return inp, self.to_values(inp, convkey)
+
+    def read_values(self, filename, convkey=None, hints=None):
+        """load_valuesと同じだが, f90nmlを用いない高速な読み込み (namelist.load) を用いる.
+
+        (NamelistFile, GUIの値の辞書) を返す. 読めない形式の場合はload_valuesを用いる.
+        """
+        from emout import UnitConversionKey
+
+        from ..namelist import NamelistError, load
+
+        try:
+            inp = load(filename)
+        except NamelistError:
+            return self.load_values(filename, convkey, hints)
+
+        if convkey is None and inp.key is not None:
+            convkey = UnitConversionKey(*inp.key)
+        if convkey is None:
+            raise self._missing(filename, inp, hints)
+
+        return inp, self.to_values(inp, convkey)
+
+    def infer_values(self, filename, hints=None, fallback=None):
+        """問い合わせずに読み込み, (inp, GUIの値の辞書, 推定) を返す (古いファイルの一括の読み込み).
+
+        !!keyヘッダが無い場合は(dx, to_c)を推定し, 推定 (ConversionInference) の
+        confidenceで確からしさを記録する. ヘッダがあれば推定はNone.
+        """
+        try:
+            inp, values = self.read_values(filename)
+        except MissingConversionKey as e:
+            inference = self.infer_conversion_key(e.inp, hints, fallback)
+            return e.inp, self.to_values(e.inp, inference.convkey), inference
+        return inp, values, None
+
+    def infer_conversion_key(self, inp, hints=None, fallback=None):
+        """inpのcvとhintsから(dx, to_c)を推定する (default/inference.py).
+
+        決まらない値はfallback (省略時はGUIの初期値) とする.
+        """
+        from .inference import infer_conversion_key
+        from .values import create_default_values
+
+        if fallback is None:
+            defaults = create_default_values()
+            fallback = (defaults['dx'], defaults['em_c'])
+        return infer_conversion_key(inp, self.applyers, hints, fallback)
+
+    def _missing(self, filename, inp, hints):
+        return MissingConversionKey(
+            '{} has no "!!key" header; dx and to_c must be given'.format(filename),
+            inp, self.infer_conversion_key(inp, hints))
 
     def load(self, filename, window):
+        from emout import InpFile, UnitConversionKey
+
         if filename is None or not os.path.exists(filename):
             return None
 
         convkey = UnitConversionKey.load(filename)
         if convkey is None:
-            dx = sg.PopupGetText('このパラメータファイルに用いたグリッド幅[m]を入力してください')
-            try:
-                dx = float(dx)
-            except:
+            convkey = ask_conversion_key()
+            if convkey is None:
                 return None
 
-            to_c = sg.PopupGetText('このパラメータファイルに用いたEMSES単位系での光速の値を入力してください')
-            try:
-                to_c = float(to_c)
-            except:
-                return None
+        inp = InpFile(filename)
+        self.update_window(self.to_values(inp, convkey), window, filename)
 
-            convkey = UnitConversionKey(dx, to_c)
+        return inp
 
-        inp = InpFile(filename)
-        self.apply(inp, convkey, window)
 
-        window['basefile'].Update('Base file: {}'.format(filename))
+def ask_conversion_key(inference=None):
+    """!!keyヘッダが無いファイルのdxとto_cをダイアログで尋ねる. 取り消した場合はNone.
 
-        return inp
+    inference (ConversionInference) があれば, 決まった値を初期値とする.
+    """
+    from emout import UnitConversionKey
+
+    defaults = ['', '']
+    note = ''
+    if inference is not None:
+        for i, value in enumerate((inference.dx, inference.to_c)):
+            if inference.determined[i]:
+                defaults[i] = '{:.6g}'.format(value)
+        note = '\n(推定: {})'.format(inference.summary())
+
+    dx = sg.PopupGetText('このパラメータファイルに用いたグリッド幅[m]を入力してください' + note,
+                         default_text=defaults[0])
+    try:
+        dx = float(dx)
+    except:
+        return None
+
+    to_c = sg.PopupGetText('このパラメータファイルに用いたEMSES単位系での光速の値を入力してください' + note,
+                           default_text=defaults[1])
+    try:
+        to_c = float(to_c)
+    except:
+        return None
+
+    return UnitConversionKey(dx, to_c)
 
 
 def create_default_loader(use_physical_dt=False):
     loader = Loader()
 
     loader.add_applyer('use_em', lambda i, u: i['emflag'] == 1)
-    loader.add_applyer('use_pe', lambda i, u: i['nspec'] == 3)
+    loader.add_applyer('use_pe', lambda i, u: emission_index(i) is not None)
 
     loader.add_applyer('dx', lambda i, u: u.dx)
     loader.add_applyer('em_c', lambda i, u: u.to_c)
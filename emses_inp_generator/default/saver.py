@@ -1,45 +1,217 @@
+import copy
+import io
 import math
+import os
 
-from emout import UnitConversionKey, Units
+from ..derived import Derived
+from ..species import count_species
+from ..units import get_units
+
+# unitは(dx, em_c)で決まるため, 全てのsaverはこれらのキーに依存するものとする
+UNIT_KEYS = frozenset(('dx', 'em_c'))
 
 
 class Saver:
     def __init__(self):
         self.savers = []
         self.exceptors = []
+        self.depends = []  # saverとexceptorが読むGUIのキーの集合 (Noneは不明)
 
-    def add_saver(self, saver, exceptor=None):
+    def add_saver(self, saver, exceptor=None, depends=None):
+        """depends: saverとexceptorが読むGUIのキー. 省略すると毎回実行する."""
         if exceptor is None:
             def exceptor(inp, values, unit): return True
 
         self.savers.append(saver)
         self.exceptors.append(exceptor)
+        self.depends.append(None if depends is None else UNIT_KEYS | frozenset(depends))
+
+    def apply(self, inp, values):
+        """valuesはDerivedに包んで渡すため, saverは派生量 (values['wpe']など) も参照できる."""
+        from emout import UnitConversionKey
 
-    def save(self, filename, inp, values):
         dx = float(values['dx'])
         to_c = float(values['em_c'])
 
-        unit = Units(dx=dx, to_c=to_c)
+        unit = get_units(dx=dx, to_c=to_c)
         convkey = UnitConversionKey(dx=dx, to_c=to_c)
 
+        if not isinstance(values, Derived):
+            values = Derived(values)
         for saver, exceptor in zip(self.savers, self.exceptors):
             if exceptor(inp, values, unit):
                 saver(inp, values, unit)
-        inp.save(filename, convkey=convkey)
+        return convkey
+
+    def save(self, filename, inp, values):
+        convkey = self.apply(inp, values)
+        write_atomic(filename, dumps(inp, convkey).encode('utf-8'))
+
+    def relevant_keys(self, inp, values):
+        """(有効なsaverが読むGUIのキーの集合, 各saverが有効か) を返す.
+
+        有効なsaverにdependsが不明なものがあればキーの集合はNoneとする.
+        キーの集合の値が同じ2つの点は同じファイルになる (batch/cache.pyで用いる).
+        """
+        unit = get_units(dx=float(values['dx']), to_c=float(values['em_c']))
+        if not isinstance(values, Derived):
+            values = Derived(values)
+
+        keys = set()
+        enabled = tuple(bool(exceptor(inp, values, unit)) for exceptor in self.exceptors)
+        for depends, active in zip(self.depends, enabled):
+            if not active:
+                continue
+            if depends is None:
+                return None, enabled
+            keys |= depends
+        return frozenset(keys), enabled
+
+
+def copy_inp(inp):
+    """InpFileの複製を返す (__getattr__をnamelistに委譲するためdeepcopyできない)."""
+    from emout import InpFile
+
+    new = InpFile()
+    new.nml = copy.deepcopy(inp.nml)
+    new.convkey = inp.convkey
+    return new
+
+
+def dumps(inp, convkey, sort=False):
+    """InpFile.saveで書き出される文字列を返す. sortが真ならキーを並べ替える (内容の比較用)."""
+    import f90nml
+
+    f = io.StringIO()
+    if convkey is not None:
+        f.write('!!key {}\n'.format(convkey.keytext))
+    f90nml.write(inp.nml, f, force=True, sort=sort)
+    return f.getvalue()
+
+
+class IncrementalSaver:
+    """同じベースファイルから値を少しずつ変えて保存する (GUIの保存の繰り返し, スイープ).
+
+    作業用のInpFileを保持し, 前回から値が変わったキーに依存するsaverだけを実行する.
+    有効なsaver (exceptorの結果) が変わった場合はベースの複製から全て実行し直す.
+    書き出す内容が既存のファイルと同じ場合はファイルを書き換えない.
+    """
+
+    def __init__(self, saver, base):
+        self.saver = saver
+        self.base = base
+        self.inp = None
+        self.derived = None  # 前回の値と派生量
+        self.enabled = None
+        self.convkey = None
+        self.executed = []  # 直前のupdateで実行したsaverの名前
+        self._version = 0
+        self._written = {}  # ファイル名 -> (version, mtime_ns, size)
+
+    def update(self, values):
+        """作業用のInpFileに値を反映し, (InpFile, UnitConversionKey) を返す."""
+        from emout import UnitConversionKey
+
+        dx = float(values['dx'])
+        to_c = float(values['em_c'])
+        unit = get_units(dx=dx, to_c=to_c)
+
+        # 前回から変わったGUIのキーに依存する派生量だけが計算し直される
+        if self.derived is None:
+            self.derived = Derived(dict(values))
+            dirty = None
+        else:
+            dirty = self.derived.update(dict(values))
+        values = self.derived
+
+        inp = self.inp if self.inp is not None else self.base
+        enabled = tuple(bool(exceptor(inp, values, unit)) for exceptor in self.saver.exceptors)
+
+        if self.inp is None or enabled != self.enabled:
+            self.inp = copy_inp(self.base)
+            dirty = None
+
+        self.executed = []
+        for saver, depends, active in zip(self.saver.savers, self.saver.depends, enabled):
+            if not active:
+                continue
+            if dirty is not None and depends is not None and not depends & dirty:
+                continue
+            saver(self.inp, values, unit)
+            self.executed.append(saver.__name__)
+
+        if self.executed:
+            self._version += 1
+        self.enabled = enabled
+        self.convkey = UnitConversionKey(dx=dx, to_c=to_c)
+        return self.inp, self.convkey
+
+    def save(self, filename, values):
+        """ファイルを書き出した場合はTrue, 内容が同じで書き換えなかった場合はFalseを返す."""
+        self.update(values)
+        filename = os.fspath(filename)
+
+        stat = _stat(filename)
+        written = self._written.get(filename)
+        if written is not None and written == (self._version, *stat):
+            return False
+
+        text = dumps(self.inp, self.convkey)
+        data = text.encode('utf-8')
+        if stat[1] == len(data):
+            with open(filename, 'rb') as f:
+                unchanged = f.read() == data
+        else:
+            unchanged = False
+
+        if not unchanged:
+            write_atomic(filename, data)
+        self._written[filename] = (self._version, *_stat(filename))
+        return not unchanged
+
+
+def write_atomic(filename, data, mode=None):
+    """一時ファイルに書き出してからfilenameを置き換える.
+
+    filenameがキャッシュのファイル (batch/cache.py) へのリンクの場合に, リンク先を書き換えない.
+    """
+    filename = os.fspath(filename)
+    directory, name = os.path.split(filename)
+    temporary = os.path.join(directory, '.{}.{}.tmp'.format(name, os.getpid()))
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(temporary, mode)
+        os.replace(temporary, filename)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _stat(filename):
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None, None
+    return stat.st_mtime_ns, stat.st_size
 
 
 def create_default_saver(use_physical_dt=False):
     saver = Saver()
 
-    saver.add_saver(save_esorem)
-    saver.add_saver(save_job_con)
-    saver.add_saver(save_plasma)
+    saver.add_saver(save_esorem, depends=('use_em',))
+    saver.add_saver(save_job_con, depends=('jobnum', 'nstep'))
+    saver.add_saver(save_plasma, depends=())
     if use_physical_dt:
-        saver.add_saver(save_tmgrid_physical_dt)
+        saver.add_saver(save_tmgrid_physical_dt, depends=('dt', 'nx', 'ny', 'nz'))
     else:
-        saver.add_saver(save_tmgrid_emses_dt)
-    saver.add_saver(save_system)
-    saver.add_saver(save_mpi)
+        saver.add_saver(save_tmgrid_emses_dt, depends=('dt', 'nx', 'ny', 'nz'))
+    saver.add_saver(save_system, depends=('use_pe', 'extra_species'))
+    saver.add_saver(save_mpi, depends=('nodesx', 'nodesy', 'nodesz'))
 
     return saver
 
@@ -73,8 +245,7 @@ def save_tmgrid_physical_dt(inp, values, unit):
 
 
 def save_system(inp, values, unit):
-    nspec = 3 if values['use_pe'] else 2
-    inp['system']['nspec'] = nspec
+    inp['system']['nspec'] = count_species(values)
 
 
 def save_mpi(inp, values, unit):
@@ -0,0 +1,121 @@
+"""GUIの重い処理 (読み込み, 保存, チェック, テンプレートの検索) をスレッドで実行する.
+
+処理は列 (lane) ごとのスレッドで順に実行する.
+
+    io      : ファイルの読み込みと保存, テンプレートの読み直し (1スレッド, 投入した順に実行)
+    compute : チェックなどの計算 (ファイルや作業用のInpFileを変更しない処理)
+
+処理の結果と進捗はwindow.write_event_valueでイベントとして通知し, ウィンドウの更新は
+イベントループ (UIのスレッド) で行う. 処理の関数からウィンドウを操作しないこと.
+
+    TASK_EVENT     : values[TASK_EVENT] = Task (完了, 失敗, 取り消し)
+    PROGRESS_EVENT : values[PROGRESS_EVENT] = (Task, 進捗 (0から1), メッセージ)
+
+同じ名前の処理を投入すると前の処理は取り消され, 結果は捨てられる.
+取り消しは協調的で, 処理の関数がTask.check (またはTask.progress) を呼んだ時点で止まる.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TASK_EVENT = '-TASK-'
+PROGRESS_EVENT = '-PROGRESS-'
+LANES = ('io', 'compute')
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, name, function, args, on_done=None, message=''):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.on_done = on_done  # lambda result: None (UIのスレッドで呼ぶ)
+        self.message = message
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancelled = threading.Event()
+        self._runner = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def check(self):
+        """取り消された場合はTaskCancelledを送出する."""
+        if self.cancelled:
+            raise TaskCancelled(self.name)
+
+    def progress(self, fraction, message=''):
+        self.check()
+        self._runner._post(PROGRESS_EVENT, (self, fraction, message))
+
+    def _run(self):
+        try:
+            self.check()
+            self.result = self.function(self, *self.args)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        self._runner._post(TASK_EVENT, self)
+
+
+class TaskRunner:
+    def __init__(self, window):
+        self.window = window
+        self.executors = {lane: ThreadPoolExecutor(max_workers=1, thread_name_prefix=lane)
+                          for lane in LANES}
+        self.tasks = {}  # 名前 -> 実行中のTask
+        self._closed = False
+
+    def submit(self, name, function, *args, on_done=None, lane='io', message=''):
+        """function(task, *args) をスレッドで実行する. 同じ名前の実行中の処理は取り消す."""
+        previous = self.tasks.get(name)
+        if previous is not None:
+            previous.cancel()
+
+        task = Task(name, function, args, on_done=on_done, message=message)
+        task._runner = self
+        self.tasks[name] = task
+        task.future = self.executors[lane].submit(task._run)
+        return task
+
+    def finish(self, task):
+        """TASK_EVENTを受け取ったときにUIのスレッドで呼ぶ. 取り消されていなければon_doneを呼ぶ.
+
+        失敗した場合は例外を送出する.
+        """
+        if self.tasks.get(task.name) is task:
+            del self.tasks[task.name]
+        if task.cancelled:
+            return
+        if task.error is not None:
+            raise task.error
+        if task.on_done is not None:
+            task.on_done(task.result)
+
+    def running(self):
+        return [task for task in self.tasks.values() if not task.cancelled]
+
+    def cancel_all(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+    def shutdown(self):
+        self._closed = True
+        self.cancel_all()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+
+    def _post(self, key, value):
+        # ウィンドウを閉じた後の通知は捨てる
+        if not self._closed:
+            self.window.write_event_value(key, value)
@@ -1,7 +1,8 @@
-import PySimpleGUI as sg
-from emout import UnitConversionKey, Units
+from functools import lru_cache
 
 from ..gui import conversion
+from ..lazy import np, sg
+from ..units import UNITS_CACHE_SIZE, get_units
 
 
 def create_conversion_window(location=None):
@@ -70,23 +71,26 @@ convs = [
 ]
 
 
-def to_emses_unit(window, values, dx, to_c):
-    unit = Units(dx=dx, to_c=to_c)
-    for key, conv in convs:
-        em_key = 'em_{}'.format(key)
+@lru_cache(maxsize=UNITS_CACHE_SIZE)
+def conversion_ratios(dx, to_c):
+    """convsの各単位の (EMSES単位系での値 / 物理単位系での値) の配列."""
+    unit = get_units(dx=dx, to_c=to_c)
+    ratios = np.array([conv(unit).ratio for _, conv in convs])
+    ratios.setflags(write=False)
+    return ratios
+
 
-        physical_val = float(values[key])
-        value = conv(unit).trans(physical_val)
+def to_emses_unit(window, values, dx, to_c):
+    physical_vals = np.array([float(values[key]) for key, _ in convs])
+    em_vals = physical_vals * conversion_ratios(float(dx), float(to_c))
 
-        window[em_key].Update(value=value)
+    for (key, _), value in zip(convs, em_vals):
+        window['em_{}'.format(key)].Update(value=float(value))
 
 
 def to_physical_unit(window, values, dx, to_c):
-    unit = Units(dx=dx, to_c=to_c)
-    for key, conv in convs:
-        em_key = 'em_{}'.format(key)
-
-        em_val = float(values[em_key])
-        value = conv(unit).reverse(em_val)
+    em_vals = np.array([float(values['em_{}'.format(key)]) for key, _ in convs])
+    physical_vals = em_vals / conversion_ratios(float(dx), float(to_c))
 
-        window[key].Update(value=value)
+    for (key, _), value in zip(convs, physical_vals):
+        window[key].Update(value=float(value))
@@ -0,0 +1,20 @@
+def create_default_values():
+    """デフォルトで管理するGUIのキーとその初期値の辞書を返す.
+
+    GUIの入力欄の初期値と, GUIを用いない生成 (batch) で使用する初期値を兼ねる.
+    """
+    return {
+        'use_em': False,
+        'use_pe': False,
+        'dx': 1.0,
+        'em_c': 10000,
+        'dt': 0.01,
+        'nx': 64,
+        'ny': 64,
+        'nz': 512,
+        'nstep': 100000,
+        'jobnum': '0 1',
+        'nodesx': 4,
+        'nodesy': 2,
+        'nodesz': 32,
+    }
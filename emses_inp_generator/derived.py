@@ -0,0 +1,280 @@
+"""GUIの値から求める派生量 (wpe, path, 格子数, 穴の範囲など) を遅延評価する.
+
+派生量はQUANTITIESに名前と関数で登録する (@quantity). 関数はDerivedを受け取り,
+q['n0'] (GUIの値) やq['unit'] (他の派生量) を参照して値を返す.
+参照された名前は依存関係として記録され, 派生量どうしの有向非巡回グラフとなる.
+
+Derivedは1回の保存 (評価) の間, 各派生量を一度だけ計算して共有する.
+update()で値を差し替えると, 変わったGUIのキーに依存する派生量だけを捨てるため,
+スイープでは影響を受ける派生量だけが計算し直される.
+
+Derivedはvaluesと同じ辞書として扱えるため, saverにvaluesの代わりに渡す
+(反復するとGUIのキーだけを返す). 派生量の名前はGUIのキーと重ならないこと.
+追加のパラメータのモジュールも派生量を登録する (simple_hole.pyのterrain, emission_surfacesなど).
+
+EMSES単位系の派生量:
+    wpe, wpi, wc             : プラズマ周波数, 電子サイクロトロン周波数
+    pathe, pathi, pathp      : 電子, イオン, 光電子の熱速度
+    em_vdrie, em_vdrii       : 電子, イオンのドリフト速度
+    curf                     : 垂直に太陽光が照射される場合の光電子電流
+物理単位系の派生量:
+    qe_si, me_si, e0_si, mi_si : 素電荷, 電子の質量, 真空の誘電率, イオンの質量
+    debye_length, egyro_radius, igyro_radius [m] (磁場が無い場合の旋回半径は-1)
+その他:
+    unit        : emout.Units
+    species     : 粒子種の表 (species.SpeciesTable)
+    ngrid       : nx * ny * nz
+    npin        : プラズマ粒子の初期粒子数 (種ごと)
+    np_photo    : 光電子の粒子配列の大きさ (np_autoが真ならnp_photo_auto)
+    np_photo_auto : 放出面から見積もった光電子の粒子配列の大きさ
+    hole_bounds : 穴の範囲 (HoleBounds)
+"""
+import math
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from .species import SpeciesTable
+from .units import get_units
+
+QUANTITIES = {}
+
+
+def quantity(name):
+    def register(function):
+        QUANTITIES[name] = function
+        return function
+    return register
+
+
+class HoleBounds(NamedTuple):
+    xmin: float
+    xmax: float
+    ymin: float
+    ymax: float
+    zmin: float
+    zmax: float
+
+
+class Derived(Mapping):
+    def __init__(self, values):
+        self.values = values
+        self._cache = {}
+        self._depends = {}  # 派生量の名前 -> 直接参照した名前の集合
+        self._evaluating = []
+        self.evaluated = []  # 計算した派生量の名前 (順に記録する)
+
+    def __getitem__(self, key):
+        if self._evaluating:
+            self._depends[self._evaluating[-1]].add(key)
+        if key in self.values:
+            return self.values[key]
+        if key in self._cache:
+            return self._cache[key]
+        if key not in QUANTITIES:
+            raise KeyError(key)
+
+        self._depends[key] = set()
+        self._evaluating.append(key)
+        try:
+            value = QUANTITIES[key](self)
+        finally:
+            self._evaluating.pop()
+        self._cache[key] = value
+        self.evaluated.append(key)
+        return value
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def update(self, values):
+        """値を差し替え, 変わったGUIのキーの集合を返す."""
+        keys = set(values) | set(self.values)
+        dirty = {key for key in keys if values.get(key) != self.values.get(key)}
+        self.values = values
+        self.invalidate(dirty)
+        return dirty
+
+    def invalidate(self, keys):
+        """keysに (間接的に) 依存する派生量を捨てる."""
+        stale = set(keys)
+        changed = True
+        while changed:
+            changed = False
+            for name, depends in self._depends.items():
+                if name not in stale and depends & stale:
+                    stale.add(name)
+                    changed = True
+        for name in stale:
+            self._cache.pop(name, None)
+            self._depends.pop(name, None)
+
+
+@quantity('unit')
+def _unit(q):
+    return get_units(dx=float(q['dx']), to_c=float(q['em_c']))
+
+
+@quantity('qe_si')
+def _qe(q):
+    return get_units().qe.from_unit
+
+
+@quantity('me_si')
+def _me(q):
+    return get_units().me.from_unit
+
+
+@quantity('e0_si')
+def _e0(q):
+    return get_units().e0.from_unit
+
+
+@quantity('mi_si')
+def _mi(q):
+    return q['me_si'] * float(q['mi2me'])
+
+
+@quantity('species')
+def _species(q):
+    return SpeciesTable.from_values(q)
+
+
+@quantity('ngrid')
+def _ngrid(q):
+    return int(q['nx']) * int(q['ny']) * int(q['nz'])
+
+
+@quantity('npin')
+def _npin(q):
+    return int(q['np_per_grid']) * q['ngrid']
+
+
+@quantity('np_photo')
+def _np_photo(q):
+    if q.get('np_auto', False):
+        return q['np_photo_auto']
+    return int(float(q['nnp'])) * q['npin']
+
+
+@quantity('np_photo_auto')
+def _np_photo_auto(q):
+    """定常状態で領域内に存在する光電子の超粒子数 * 安全率 (np_safety).
+
+    放出面での光電子の超粒子の密度を dnsf * curfs / curf [1/grid^3] とし,
+    半マクスウェル分布の流束 n * vth / √(2π) で放出された超粒子が,
+    放出面の高さから領域の上端までを平均の法線速度 √(π/2) * vth で抜けるまで
+    (脱出時間) 領域内に留まるものとする. 表面に戻る光電子を無視するため,
+    超粒子数を多めに見積もる.
+    """
+    if 'zssurf' in q:
+        surfaces = [(s.area, s.curf, (s.zmin + s.zmax) / 2) for s in q['emission_surfaces']]
+    else:
+        surfaces = [(int(q['nx']) * int(q['ny']), q['curf'], 0.0)]
+
+    vth = q['pathp']
+    nz = int(q['nz'])
+    curf = q['curf']
+    dnsf = float(q['dnsfp'])
+    if curf == 0 or vth == 0:
+        return 0
+
+    count = 0.0
+    for area, curfs, z in surfaces:
+        density = dnsf * abs(curfs / curf)
+        flux = density * vth / math.sqrt(2 * math.pi)
+        escape_time = max(nz - z, 1.0) / (math.sqrt(math.pi / 2) * vth)
+        count += area * flux * escape_time
+    return int(math.ceil(count * float(q.get('np_safety', 2.0))))
+
+
+def _plasma_frequency(n0, m, q):
+    return math.sqrt(n0 * 1e6 * q['qe_si'] * q['qe_si'] / m / q['e0_si'])
+
+
+def _thermal_velocity(T, m, q):
+    return math.sqrt(q['qe_si'] * T / m)
+
+
+@quantity('wpe')
+def _wpe(q):
+    return q['unit'].f.trans(_plasma_frequency(float(q['n0']), q['me_si'], q))
+
+
+@quantity('wpi')
+def _wpi(q):
+    return q['unit'].f.trans(_plasma_frequency(float(q['n0']), q['mi_si'], q))
+
+
+@quantity('wc')
+def _wc(q):
+    return q['unit'].f.trans(q['qe_si'] * float(q['B']) * 1e-9 / q['me_si'])
+
+
+@quantity('pathe')
+def _pathe(q):
+    return q['unit'].v.trans(_thermal_velocity(float(q['Te']), q['me_si'], q))
+
+
+@quantity('pathi')
+def _pathi(q):
+    return q['unit'].v.trans(_thermal_velocity(float(q['Ti']), q['mi_si'], q))
+
+
+@quantity('pathp')
+def _pathp(q):
+    return q['unit'].v.trans(_thermal_velocity(float(q['Tp']), q['me_si'], q))
+
+
+@quantity('em_vdrie')
+def _vdrie(q):
+    return q['unit'].v.trans(float(q['vdrie']))
+
+
+@quantity('em_vdrii')
+def _vdrii(q):
+    return q['unit'].v.trans(float(q['vdrii']))
+
+
+@quantity('curf')
+def _curf(q):
+    return q['unit'].J.trans(float(q['Jp']) * 1e-6)
+
+
+@quantity('hole_bounds')
+def _hole_bounds(q):
+    nx = int(q['nx'])
+    ny = int(q['ny'])
+    zssurf = float(q['zssurf'])
+    hole_xlen = float(q['hole_xlen'])
+    hole_ylen = float(q['hole_ylen'])
+    return HoleBounds(xmin=(nx - hole_xlen) / 2,
+                      xmax=(nx + hole_xlen) / 2,
+                      ymin=(ny - hole_ylen) / 2,
+                      ymax=(ny + hole_ylen) / 2,
+                      zmin=zssurf - float(q['hole_depth']),
+                      zmax=zssurf)
+
+
+@quantity('debye_length')
+def _debye_length(q):
+    return math.sqrt(q['e0_si'] * float(q['Te']) / (float(q['n0']) * 1e6 * q['qe_si']))
+
+
+def _gyro_radius(m, T, q):
+    B = float(q['B']) * 1e-9
+    if B == 0:
+        return -1
+    return math.sqrt(m * q['qe_si'] * T) / (q['qe_si'] * B)
+
+
+@quantity('egyro_radius')
+def _egyro_radius(q):
+    return _gyro_radius(q['me_si'], float(q['Te']), q)
+
+
+@quantity('igyro_radius')
+def _igyro_radius(q):
+    return _gyro_radius(q['mi_si'], float(q['Ti']), q)
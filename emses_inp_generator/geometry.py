@@ -0,0 +1,353 @@
+"""表面の地形と太陽光の向きから光電子の放出面を求める.
+
+地形は表面 (z = zssurf) に置いた長方形の箱, 穴, 段差 (Feature) による高さの分布で表す.
+Featureは順に重ね, 重なる部分は後のものの高さとする. 領域の外は平らな表面とし,
+x, y方向の周期境界を越える影は考えない.
+
+放出面は上面 (nemd = 3) と, 高さの変わる境界の壁 (nemd = ±1, ±2, 符号は法線の向き) の
+うち, 太陽光が当たり影にならない部分である. 同じ平面上の照らされた部分は長方形に
+まとめ, 最小限のEmissionSurfaceとする. 各面の電流は curf * (法線・太陽の方向).
+
+太陽光の向き:
+    zenith  : 天頂角 [deg]
+    azimuth : 太陽光が水平方向に進む向き [deg] (x軸から反時計回り, 0で+x方向)
+
+影の境界となる座標 (柱の上面の角を太陽光に沿って平面へ投影したもの) で各平面を分割し,
+小領域の中心から太陽へ向かう光線と全ての柱の交差を配列で一度に判定する.
+複数の太陽の向きも1回の判定にまとめる (sweep). 太陽光がx-z平面かy-z平面にある場合は
+結果が厳密になり, それ以外の場合は影の境界が斜めになるため, resolution [grid] 以下に
+分割した階段状の近似となる.
+
+地形の記述 (parse_features) は1行に1つで, #以降はコメントとする.
+    box  xmin xmax ymin ymax height  : 箱
+    hole xmin xmax ymin ymax depth   : 穴
+    step x|-x|y|-y position height   : positionより+ (-x, -yなら-) 側をheightだけ高くする
+"""
+import math
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List
+
+from .lazy import np
+
+if TYPE_CHECKING:
+    from emout import InpFile
+
+EPS = 1e-9
+
+# 判定する (点, 柱) の組の数の上限 (メモリ使用量を抑えるため分割する)
+CHUNKSIZE = 1 << 20
+
+# 平面の法線の軸 -> 平面上の2つの軸
+TANGENTS = {0: (1, 2), 1: (0, 2), 2: (0, 1)}
+
+
+@dataclass
+class EmissionSurface:
+    nemd: int
+    curf: float
+    xmin: float
+    xmax: float
+    ymin: float
+    ymax: float
+    zmin: float
+    zmax: float
+
+    @property
+    def area(self):
+        """放出面の面積 [grid^2]."""
+        dx = self.xmax - self.xmin
+        dy = self.ymax - self.ymin
+        dz = self.zmax - self.zmin
+        return {1: dy * dz, 2: dx * dz, 3: dx * dy}[abs(self.nemd)]
+
+    def saveinp(self, inp: 'InpFile', index: int):
+        inp.setlist('emissn', 'nemd', self.nemd, start_index=index)
+        inp.setlist('emissn', 'curfs', self.curf, start_index=index)
+        inp.setlist('emissn', 'xmine', self.xmin, start_index=index)
+        inp.setlist('emissn', 'xmaxe', self.xmax, start_index=index)
+        inp.setlist('emissn', 'ymine', self.ymin, start_index=index)
+        inp.setlist('emissn', 'ymaxe', self.ymax, start_index=index)
+        inp.setlist('emissn', 'zmine', self.zmin, start_index=index)
+        inp.setlist('emissn', 'zmaxe', self.zmax, start_index=index)
+
+
+@dataclass(frozen=True)
+class Feature:
+    xmin: float
+    xmax: float
+    ymin: float
+    ymax: float
+    # 表面からの高さ [grid] (穴は負)
+    height: float
+
+
+def box(xmin, xmax, ymin, ymax, height):
+    return Feature(xmin, xmax, ymin, ymax, height)
+
+
+def hole(xmin, xmax, ymin, ymax, depth):
+    return Feature(xmin, xmax, ymin, ymax, -depth)
+
+
+def step(direction, position, height):
+    inf = math.inf
+    bounds = {
+        'x': (position, inf, -inf, inf),
+        '-x': (-inf, position, -inf, inf),
+        'y': (-inf, inf, position, inf),
+        '-y': (-inf, inf, -inf, position),
+    }
+    if direction not in bounds:
+        raise ValueError('direction must be one of x, -x, y, -y: {!r}'.format(direction))
+    return Feature(*bounds[direction], height)
+
+
+FEATURE_ARGS = {'box': 5, 'hole': 5, 'step': 3}
+
+
+def parse_features(text):
+    """地形の記述からFeatureのリストを作る."""
+    features = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+
+        kind, args = words[0].lower(), words[1:]
+        if kind not in FEATURE_ARGS:
+            raise ValueError('line {}: unknown feature {!r}'.format(lineno, words[0]))
+        if len(args) != FEATURE_ARGS[kind]:
+            raise ValueError('line {}: {} takes {} values'.format(
+                lineno, kind, FEATURE_ARGS[kind]))
+
+        try:
+            if kind == 'step':
+                features.append(step(args[0].lower(), float(args[1]), float(args[2])))
+            else:
+                features.append({'box': box, 'hole': hole}[kind](*map(float, args)))
+        except ValueError as e:
+            raise ValueError('line {}: {}'.format(lineno, e)) from None
+    return features
+
+
+def sun_vector(zenith, azimuth=0.0):
+    """太陽の方向の単位ベクトル. 引数が配列なら形状は (..., 3)."""
+    theta = np.radians(zenith)
+    phi = np.radians(azimuth)
+    vector = np.stack(np.broadcast_arrays(-np.sin(theta) * np.cos(phi),
+                                          -np.sin(theta) * np.sin(phi),
+                                          np.cos(theta)), axis=-1)
+    # 丸め誤差で軸に平行な光が斜めにならないようにする
+    return np.where(np.abs(vector) < EPS, 0.0, vector)
+
+
+def _unique(values):
+    values = np.unique(values)
+    return values[np.concatenate(([True], np.diff(values) > EPS))]
+
+
+def _slab(p, s, lower, upper):
+    """光線 p + t * s が lower < x < upper にある t の範囲."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = (lower - p) / s
+        t1 = (upper - p) / s
+    parallel = s == 0
+    inside = (lower < p) & (p < upper)
+    tmin = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1))
+    tmax = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1))
+    return tmin, tmax
+
+
+def _rectangles(mask):
+    """真の小領域を長方形 (u0, u1, v0, v1) (小領域の番号) にまとめる.
+
+    u方向の各列でv方向に連続する区間を求め, 隣の列に同じ区間があれば延ばす.
+    """
+    padded = np.zeros((mask.shape[0] + 1, mask.shape[1] + 2), dtype=np.int8)
+    padded[:-1, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+
+    rectangles = []
+    opened = {}  # (v0, v1) -> u0
+    for i, row in enumerate(edges):
+        runs = set(zip(np.flatnonzero(row == 1).tolist(),
+                       np.flatnonzero(row == -1).tolist()))
+        for run in [run for run in opened if run not in runs]:
+            rectangles.append((opened.pop(run), i) + run)
+        for run in runs:
+            opened.setdefault(run, i)
+    return sorted(rectangles)
+
+
+class Plane:
+    """法線が軸axisの向き (sign = ±1) で, 座標coordにある面の集まり."""
+
+    def __init__(self, axis, sign, coord, rects):
+        self.axis = axis
+        self.sign = sign
+        self.coord = coord
+        self.rects = np.asarray(rects, dtype=float)  # (面の数, 4): u0, u1, v0, v1
+
+    @property
+    def nemd(self):
+        return self.sign * (self.axis + 1)
+
+    def contains(self, u, v):
+        r = self.rects
+        return np.any((r[:, 0] < u[..., None]) & (u[..., None] < r[:, 1])
+                      & (r[:, 2] < v[..., None]) & (v[..., None] < r[:, 3]), axis=-1)
+
+
+class Terrain:
+    def __init__(self, nx, ny, zssurf, features=()):
+        self.nx = nx
+        self.ny = ny
+        self.zssurf = zssurf
+        self.features = list(features)
+
+        def edges(n, lower, upper):
+            coords = [0, n] + [c for f in self.features for c in (lower(f), upper(f))]
+            return _unique(np.clip(np.array(coords, dtype=float), 0, n))
+
+        self.xs = edges(nx, lambda f: f.xmin, lambda f: f.xmax)
+        self.ys = edges(ny, lambda f: f.ymin, lambda f: f.ymax)
+
+        cx = (self.xs[:-1] + self.xs[1:]) / 2
+        cy = (self.ys[:-1] + self.ys[1:]) / 2
+        self.heights = np.full((cx.size, cy.size), float(zssurf))
+        for f in self.features:
+            inside = (((f.xmin < cx) & (cx < f.xmax))[:, None]
+                      & ((f.ymin < cy) & (cy < f.ymax))[None, :])
+            self.heights[inside] = zssurf + f.height
+
+        # 影を落とす柱 (x0, x1, y0, y1, 上面の高さ). 太陽が地平線より上の場合だけ判定する (sweep)
+        # ため光線は上に向かい, 最も低い柱は遮らない
+        i, j = np.nonzero(self.heights > self.heights.min())
+        self.columns = np.stack([self.xs[i], self.xs[i + 1],
+                                 self.ys[j], self.ys[j + 1], self.heights[i, j]], axis=-1)
+        self.planes = self._planes()
+
+    def _planes(self):
+        xs, ys, h = self.xs, self.ys, self.heights
+        faces = {}  # (axis, sign, coord) -> [(u0, u1, v0, v1), ...]
+
+        for (i, j), top in np.ndenumerate(h):
+            faces.setdefault((2, 1, top), []).append((xs[i], xs[i + 1], ys[j], ys[j + 1]))
+
+        # 境界の壁は高い側の柱の面で, 低い側を向く
+        for i, j in zip(*np.nonzero(h[:-1, :] != h[1:, :])):
+            low, high = sorted((h[i, j], h[i + 1, j]))
+            sign = 1 if h[i, j] > h[i + 1, j] else -1
+            faces.setdefault((0, sign, xs[i + 1]), []).append((ys[j], ys[j + 1], low, high))
+        for i, j in zip(*np.nonzero(h[:, :-1] != h[:, 1:])):
+            low, high = sorted((h[i, j], h[i, j + 1]))
+            sign = 1 if h[i, j] > h[i, j + 1] else -1
+            faces.setdefault((1, sign, ys[j + 1]), []).append((xs[i], xs[i + 1], low, high))
+
+        # 上面を高い順, 次にx, yの壁の順とする
+        order = sorted(faces, key=lambda k: (-k[0], -k[2] if k[0] == 2 else k[2], k[1]))
+        return [Plane(axis, sign, float(coord), faces[axis, sign, coord])
+                for axis, sign, coord in order]
+
+    def _breaks(self, plane, sun, resolution):
+        """planeを分割する座標 (u, v) を返す."""
+        ua, va = TANGENTS[plane.axis]
+        r = plane.rects
+        ubreaks = [r[:, 0], r[:, 1]]
+        vbreaks = [r[:, 2], r[:, 3]]
+
+        # 柱の上面の角を太陽光に沿ってplaneへ投影する
+        c = self.columns
+        corners = np.stack([c[:, [0, 0, 1, 1]], c[:, [2, 3, 2, 3]],
+                            np.repeat(c[:, 4:], 4, axis=1)], axis=-1).reshape(-1, 3)
+        t = (corners[:, plane.axis] - plane.coord) / sun[plane.axis]
+        projected = corners[t > 0] - t[t > 0, None] * sun
+        ubreaks.append(projected[:, ua])
+        vbreaks.append(projected[:, va])
+
+        ulower, uupper = r[:, 0].min(), r[:, 1].max()
+        vlower, vupper = r[:, 2].min(), r[:, 3].max()
+        if sun[0] != 0 and sun[1] != 0:
+            ubreaks.append(np.arange(ulower, uupper, resolution))
+            vbreaks.append(np.arange(vlower, vupper, resolution))
+
+        ubreaks = np.clip(np.concatenate(ubreaks), ulower, uupper)
+        vbreaks = np.clip(np.concatenate(vbreaks), vlower, vupper)
+        return _unique(ubreaks), _unique(vbreaks)
+
+    def shadowed(self, points, suns):
+        """各点 (..., 3) から太陽 (..., 3) へ向かう光線が柱に遮られるか."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        suns = np.broadcast_to(suns, points.shape)
+        c = self.columns
+        result = np.zeros(len(points), dtype=bool)
+
+        rows = max(1, CHUNKSIZE // max(1, len(c)))
+        for start in range(0, len(points), rows):
+            p = points[start:start + rows, None, :]
+            s = suns[start:start + rows, None, :]
+            txmin, txmax = _slab(p[..., 0], s[..., 0], c[:, 0], c[:, 1])
+            tymin, tymax = _slab(p[..., 1], s[..., 1], c[:, 2], c[:, 3])
+            enter = np.maximum(np.maximum(txmin, tymin), 0)
+            leave = np.minimum(txmax, tymax)
+            with np.errstate(invalid='ignore'):
+                # 交差しない場合 (enter = inf) の高さはnanとなり, 遮られない
+                blocked = (leave > enter + EPS) & (p[..., 2] + enter * s[..., 2] < c[:, 4] - EPS)
+            result[start:start + rows] = blocked.any(axis=-1)
+        return result
+
+    def sweep(self, curf, zeniths, azimuths=0.0, resolution=1.0):
+        """各太陽の向きについて, EmissionSurfaceのリストを返す.
+
+        太陽が地平線以下 (zenith >= 90) の場合は地面が光を遮るため, 放出面は無い.
+        """
+        suns = sun_vector(zeniths, azimuths).reshape(-1, 3)
+
+        # 全ての (太陽の向き, 平面) の小領域の中心をまとめて判定する
+        jobs = []
+        points = []
+        sun_index = []
+        for k, sun in enumerate(suns):
+            if sun[2] <= 0:
+                continue
+            for plane in self.planes:
+                flux = plane.sign * sun[plane.axis]
+                if flux <= EPS:
+                    continue
+                ubreaks, vbreaks = self._breaks(plane, sun, resolution)
+                u, v = np.meshgrid((ubreaks[:-1] + ubreaks[1:]) / 2,
+                                   (vbreaks[:-1] + vbreaks[1:]) / 2, indexing='ij')
+                inside = plane.contains(u, v)
+
+                ua, va = TANGENTS[plane.axis]
+                p = np.empty((np.count_nonzero(inside), 3))
+                p[:, plane.axis] = plane.coord
+                p[:, ua] = u[inside]
+                p[:, va] = v[inside]
+                points.append(p)
+                sun_index.append(np.full(len(p), k))
+                jobs.append((k, plane, flux, ubreaks, vbreaks, inside))
+
+        if points:
+            index = np.concatenate(sun_index)
+            shadowed = self.shadowed(np.concatenate(points), suns[index])
+        offset = 0
+
+        surfaces = [[] for _ in suns]
+        for k, plane, flux, ubreaks, vbreaks, inside in jobs:
+            lit = inside.copy()
+            n = np.count_nonzero(inside)
+            lit[inside] = ~shadowed[offset:offset + n]
+            offset += n
+
+            ua, va = TANGENTS[plane.axis]
+            for u0, u1, v0, v1 in _rectangles(lit):
+                bounds = [(plane.coord, plane.coord)] * 3
+                bounds[ua] = (float(ubreaks[u0]), float(ubreaks[u1]))
+                bounds[va] = (float(vbreaks[v0]), float(vbreaks[v1]))
+                surfaces[k].append(EmissionSurface(plane.nemd, curf * float(flux),
+                                                   *bounds[0], *bounds[1], *bounds[2]))
+        return surfaces
+
+    def emission_surfaces(self, curf, zenith, azimuth=0.0, resolution=1.0):
+        return self.sweep(curf, zenith, azimuth, resolution)[0]
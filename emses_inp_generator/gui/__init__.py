@@ -1,2 +1,3 @@
 from .basic_components import (basis_parameter, conversion, parameter,
-                                  radio_box, selectIndex, checkboxes)
+                                  radio_box, selectIndex, checkboxes,
+                                  radio_values, checkbox_values)
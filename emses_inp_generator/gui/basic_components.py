@@ -1,7 +1,7 @@
 import glob
 import os
 
-import PySimpleGUI as sg
+from ..lazy import sg
 
 name_size = (30, 1)
 value_size = (20, 1)
@@ -51,6 +51,16 @@ def selectIndex(values, name):
     return None
 
 
+def radio_values(group_id, n, default_index=0):
+    return {'{}{}'.format(group_id, i): (i == default_index) for i in range(n)}
+
+
+def checkbox_values(base_key, n, defaults=False):
+    if not isinstance(defaults, (list, tuple)):
+        defaults = [defaults] * n
+    return {'{}{}'.format(base_key, i): bool(defaults[i]) for i in range(n)}
+
+
 def conversion(name, key, default=0, em_default=0):
     name_text = sg.Text(name, size=name_size)
     physical_unit = sg.InputText(str(default), size=value_size, key=key)
@@ -67,6 +77,6 @@ def checkboxes(name, *checks, base_key, defaults=None):
         defaults = [defaults] * len(checks)
 
     name_text = sg.Text(name, size=name_size)
-    check_boxes = [sg.Checkbox(check, key='{}{}'.format(
+    check_boxes = [sg.Checkbox(check, default=defaults[i], key='{}{}'.format(
         base_key, i)) for i, check in enumerate(checks)]
     return sg.Column([[name_text, *check_boxes]])
@@ -0,0 +1,21 @@
+"""重いモジュールを最初に属性を参照したときに読み込む.
+
+PySimpleGUI (Tk) はウィンドウを作るときまで, numpyは配列を扱うときまで
+読み込まないようにし, GUIを用いない処理 (batchなど) や inpgen --help の起動を速くする.
+"""
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+sg = LazyModule('PySimpleGUI')
+np = LazyModule('numpy')
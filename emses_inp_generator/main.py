@@ -44,72 +44,215 @@
     nodesx : nodes x
     nodesy : nodes y
     nodesz : nodes z
+    nprocs : MPI processes (Optimize nodesでnodes x, y, zを決める)
+    deadline : Deadline [h] (Suggest processesでnprocsを決める)
+    walltime : Predicted wall time [h]
+    corehours : Predicted core hours
+
+    template_search : テンプレートの検索の条件 (templates.pyを参照)
+    template_file : テンプレートのファイル名
+    template_summary : 選択したテンプレートの説明
 
     debye : Debye Length [m]
     egyro : Electron gyro radius [m]
     igyro : Ion gyro radius [m]
+    memory : Memory per rank [GiB]
+    memory_total : Memory total [GiB]
+    output_volume : Output volume [GiB]
+    wpe_dt : ωpe·dt
+    cfl : c·dt/dx
+    vth_dt : vth·dt/dx
+    dx_debye : dx/λD
+    wce_dt : ωce·dt
 """
+import importlib
 import math
 import os
+import sys
 from argparse import ArgumentParser
 from configparser import ConfigParser
 
-import PySimpleGUI as sg
-
-from .additional import add_additional_parameter
-from .default import (
-    WindowCreator,
-    create_conversion_window,
-    create_default_loader,
-    create_default_saver,
-    to_emses_unit,
-    to_physical_unit,
-)
-from .default.config_manager import create_config_window, reset_config, update_config
-from emout import InpFile, UnitConversionKey, Units
-
 from pathlib import Path
+from types import SimpleNamespace
+
+# PySimpleGUI, emout, numpyは読み込みに時間がかかるため, ウィンドウを作るとき
+# (main関数内) に読み込む. inpgen --helpやサブコマンドの起動を遅くしないこと.
 
 
 ROOT_DIR = Path(__file__).parent
 
+# inpgen <subcommand> ...: GUIを起動せずに実行するコマンド ("モジュール[:関数]")
+SUBCOMMANDS = {
+    "batch": "emses_inp_generator.batch.cli",
+    "cost": "emses_inp_generator.analysis.cli:cost_main",
+    "diff": "emses_inp_generator.batch.report:diff_main",
+    "diurnal": "emses_inp_generator.batch.diurnal",
+    "particles": "emses_inp_generator.analysis.cli:particles_main",
+    "report": "emses_inp_generator.batch.report",
+    "store": "emses_inp_generator.batch.store",
+    "templates": "emses_inp_generator.templates",
+}
+
+
+def update_window(window, updates):
+    for key, value in updates.items():
+        window[key].Update(value=value)
+
+
+def cost_updates(values, cost_model):
+    from .analysis import cost_inputs
+
+    inputs = cost_inputs(values)
+    wall = cost_model.predict(inputs)
+    return {
+        "walltime": "{:.4g}".format(wall / 3600),
+        "corehours": "{:.4g}".format(wall * inputs["nranks"] / 3600),
+    }
+
+
+def update_cost(window, values, cost_model):
+    update_window(window, cost_updates(values, cost_model))
+
+
+def search_templates(task, templates, query):
+    task.progress(0.0, "テンプレートを読み込んでいます")
+    templates.refresh()
+    return [entry["name"] for entry in templates.search(query)]
+
+
+def create_live_checks(config, cost_model):
+    """チェックの値を出力ごとに求める. 入力の変更では参照したキーが変わった出力だけを計算し直す."""
+    from .analysis import (
+        GIB,
+        MemoryModel,
+        check_stability,
+        estimate_memory,
+        estimate_output,
+    )
+    from .default.live import LiveChecks
+    from .derived import Derived
+
+    use_physical_dt = config["Control"].getboolean("UsePhysicalDt")
+    memory_model = MemoryModel.from_config(config)
+
+    def lengths(values):
+        derived = Derived(values)
+        return {
+            "debye": derived["debye_length"],
+            "egyro": derived["egyro_radius"],
+            "igyro": derived["igyro_radius"],
+        }
+
+    def memory(values):
+        memory = estimate_memory(values, memory_model)
+        return {
+            "memory": "{:.4g}".format(memory.bytes_per_rank / GIB),
+            "memory_total": "{:.4g}".format(memory.total_bytes / GIB),
+        }
+
+    def output(values):
+        output = estimate_output(values)
+        return {"output_volume": "{:.4g}".format(output.total_bytes / GIB)}
+
+    def stability(values):
+        numbers, _ = check_stability(values, use_physical_dt=use_physical_dt)
+        return {name: "{:.4g}".format(float(number)) for name, number in numbers.items()}
+
+    live = LiveChecks()
+    live.add_output("lengths", lengths)
+    live.add_output("memory", memory)
+    live.add_output("cost", lambda values: cost_updates(values, cost_model))
+    live.add_output("output", output)
+    live.add_output("stability", stability)
+    return live
+
+
+def check_messages(values, config):
+    """Checkで表示するメッセージ (出力の予算の超過, 数値安定性の問題) のリスト."""
+    from .analysis import GIB, estimate_output, suggest_interval, violations
+
+    messages = []
+    output = estimate_output(values)
+    budget = config.getfloat("Output", "BudgetGiB", fallback=math.inf) * GIB
+    if output.total_bytes > budget:
+        interval = suggest_interval(values, budget)
+        message = "出力の総量 {:.4g} GiB が予算 {:.4g} GiB を超えています.".format(
+            output.total_bytes / GIB, budget / GIB
+        )
+        if interval is not None:
+            message += "\n予算内に収まる最小の場の出力間隔: {} step".format(interval)
+        messages.append(message)
+
+    problems = violations(
+        values, use_physical_dt=config["Control"].getboolean("UsePhysicalDt")
+    )
+    if len(problems) > 0:
+        messages.append(
+            "数値安定性の確認:\n"
+            + "\n".join(
+                "{}: {:.4g} ({})".format(label, number, severity)
+                for label, number, severity in problems
+            )
+        )
+    return messages
+
+
+def check_values(task, values, config, live):
+    """Checkの計算. (GUIの値の更新, 参照したキー, 表示するメッセージのリスト) を返す."""
+    updates, reads = live.compute(values, list(live.outputs), task)
+    return updates, reads, check_messages(values, config)
+
+
+def suggest_processes(task, values, config, cost_model):
+    from .analysis import cheapest_nranks, cost_inputs, optimize_nodes
+
+    max_processes = config.getint("Cost", "MaxProcesses", fallback=4096)
+    candidates = []
+    for k in range(max_processes.bit_length()):
+        task.progress(k / max_processes.bit_length(), "Suggest processes")
+        if len(optimize_nodes(values, 2 ** k)) > 0:
+            candidates.append(2 ** k)
+    return cheapest_nranks(
+        cost_inputs(values),
+        float(values["deadline"]) * 3600,
+        candidates,
+        model=cost_model,
+    )
+
+
+def optimize_decomposition(task, values, nprocs):
+    from .analysis import best_nodes
+
+    task.progress(0.0, "Optimize nodes")
+    return best_nodes(values, nprocs)
 
-def debye(values):
-    # Since the conversion function is not used, dx and to_c are filled with meaningless values.
-    unit = Units(dx=0.001, to_c=10000)
-    qe = unit.qe.from_unit
-    e0 = unit.e0.from_unit
-    n0 = float(values["n0"]) * 1e6
-    Te = float(values["Te"])
-    return math.sqrt(e0 * qe * Te / (n0 * qe * qe))
-
-
-def egyro(values):
-    # Since the conversion function is not used, dx and to_c are filled with meaningless values.
-    unit = Units(dx=0.001, to_c=10000)
-    qe = unit.qe.from_unit
-    me = unit.me.from_unit
-    Te = float(values["Te"])
-    B = float(values["B"]) * 1e-9
-    if B == 0:
-        return -1
-    return math.sqrt(me * qe * Te) / (qe * B)
-
-
-def igyro(values):
-    # Since the conversion function is not used, dx and to_c are filled with meaningless values.
-    unit = Units(dx=0.001, to_c=10000)
-    qe = unit.qe.from_unit
-    mi = unit.me.from_unit * float(values["mi2me"])
-    Ti = float(values["Ti"])
-    B = float(values["B"]) * 1e-9
-    if B == 0:
-        return -1
-    return math.sqrt(mi * qe * Ti) / (qe * B)
+
+def optimize_species(task, values, target, budget):
+    """(ParticlePlan, GUIの値の更新) を返す."""
+    from .analysis import optimize_particles, plan_overrides
+
+    task.progress(0.0, "Optimize particles")
+    plan = optimize_particles(values, target, budget)
+    return plan, plan_overrides(values, plan)
+
+
+def show_tasks(window, runner, fraction=0.0, message=None):
+    """実行中の処理の進捗を表示する."""
+    # メッセージの無い処理 (入力に合わせたチェックの計算) は表示しない
+    running = [task for task in runner.running() if task.message]
+    if message is None:
+        message = ", ".join(task.message for task in running)
+    window["task_status"].Update(value=message)
+    window["task_progress"].UpdateBar(int(fraction * 1000) if running else 0)
+    window["Cancel Task"].Update(disabled=len(running) == 0)
 
 
 def parse_args():
-    parser = ArgumentParser()
+    parser = ArgumentParser(
+        epilog="subcommands: {} (see inpgen <subcommand> --help)".format(
+            ", ".join(SUBCOMMANDS)
+        )
+    )
     parser.add_argument("inppath", nargs="?", default=None)
     parser.add_argument(
         "--config", default=str((ROOT_DIR / "config.ini").resolve()), help="Config file"
@@ -117,9 +260,42 @@ def parse_args():
     return parser.parse_args()
 
 
+def run_subcommand(argv):
+    module_name, _, function_name = SUBCOMMANDS[argv[0]].partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name or "main")(argv[1:])
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        return run_subcommand(sys.argv[1:])
+
     args = parse_args()
 
+    import PySimpleGUI as sg
+    from emout import InpFile
+
+    from .additional import add_additional_parameter
+    from .analysis import CostModel
+    from .default import (
+        IncrementalSaver,
+        WindowCreator,
+        create_conversion_window,
+        create_default_loader,
+        create_default_saver,
+        to_emses_unit,
+        to_physical_unit,
+    )
+    from .default.config_manager import (
+        create_config_window,
+        reset_config,
+        update_config,
+    )
+    from .default.live import CHANGED_EVENT, Debouncer, watch_changes
+    from .default.loader import MissingConversionKey, ask_conversion_key
+    from .default.tasks import PROGRESS_EVENT, TASK_EVENT, TaskRunner
+    from .templates import TemplateIndex, describe
+
     config = ConfigParser()
     config.read(args.config)
 
@@ -133,19 +309,187 @@ def main():
 
     add_additional_parameter(config, wc, loader, saver)
 
+    # テンプレートの一覧は前回のキャッシュで表示し, 読み直しはスレッドで行う
+    templates = TemplateIndex(ROOT_DIR / "template", loader=loader)
+
     main_window = wc.create_window(
-        use_physical_dt=config["Control"].getboolean("UsePhysicalDt")
+        use_physical_dt=config["Control"].getboolean("UsePhysicalDt"),
+        template_files=templates.names(),
     )
     conv_window = None
     config_window = None
 
-    inppath = args.inppath or ROOT_DIR / config["Default"]["DefaultInpPath"]
-    inp = loader.load(inppath, main_window)
-    if inp is None:
-        inp = InpFile()
+    cost_model = CostModel.from_config(config, root_dir=ROOT_DIR)
+
+    # 入力が変わるたびに, 最後の変更からdelay経ってチェックの値を計算し直す (0以下では行わない)
+    live = create_live_checks(config, cost_model)
+    delay = config.getint("Control", "LiveCheckDelayMs", fallback=300)
+    debouncer = Debouncer(delay / 1000)
+    if delay > 0:
+        watch_changes(main_window)
+    latest = None  # メインウィンドウの最新の値
+
+    # 読み込み, 保存, チェックはスレッドで実行し, 結果をイベントで受け取る
+    runner = TaskRunner(main_window)
+    # 保存のたびに, 前回から値が変わったsaverだけを実行する.
+    # 読み込みと保存は同じ列 (io) で順に実行するため, 読み込みの処理で置き換える
+    session = SimpleNamespace(incremental=IncrementalSaver(saver, InpFile()))
+
+    def load(task, filename, convkey, hints):
+        if not os.path.exists(filename):
+            return None
+        task.progress(0.0, "Loading {}".format(filename))
+        inp, loaded = loader.load_values(filename, convkey, hints)
+        task.check()
+        session.incremental = IncrementalSaver(saver, inp)
+        return filename, loaded
+
+    def save(task, filename, values):
+        task.progress(0.0, "Saving {}".format(filename))
+        session.incremental.save(filename, values)
+        return filename
+
+    def on_loaded(result):
+        if result is not None:
+            loader.update_window(result[1], main_window, result[0])
+
+    def submit_load(filename, convkey=None):
+        # !!keyヘッダが無いファイルのdxは現在のn0から推定し, ダイアログの初期値とする
+        hints = None
+        if latest is not None:
+            try:
+                hints = {"n0": float(latest["n0"])}
+            except (KeyError, ValueError):
+                pass
+        runner.submit(
+            "load",
+            load,
+            str(filename),
+            convkey,
+            hints,
+            on_done=on_loaded,
+            message="Loading {}".format(filename),
+        )
+
+    def submit_search(query):
+        runner.submit(
+            "templates",
+            search_templates,
+            templates,
+            query,
+            on_done=lambda names: main_window["template_file"].Update(values=names),
+            message="Searching templates",
+        )
+
+    def submit_save(filename, values, on_done=None):
+        runner.submit(
+            "save:{}".format(filename),
+            save,
+            filename,
+            dict(values),
+            on_done=on_done,
+            message="Saving {}".format(filename),
+        )
+
+    def on_computed(result, values):
+        update_window(main_window, result[0])
+        live.commit(values, result[1])
+
+    def submit_live(values):
+        names = live.stale(values)
+        if len(names) == 0:
+            return
+        runner.submit(
+            "live",
+            live.compute,
+            values,
+            names,
+            on_done=lambda result: on_computed(result, values),
+            lane="compute",
+        )
+
+    def on_checked(result, values):
+        on_computed(result, values)
+        for message in result[2]:
+            sg.popup(message)
+
+    def submit_check(values):
+        runner.submit(
+            "check",
+            check_values,
+            values,
+            config,
+            live,
+            on_done=lambda result: on_checked(result, values),
+            lane="compute",
+            message="Check",
+        )
+
+    def on_nodes(nodes, values, nprocs):
+        if nodes is None:
+            sg.popup("{}プロセスで可能な分割がありません".format(nprocs))
+            return
+        main_window["nodesx"].Update(value=nodes[0])
+        main_window["nodesy"].Update(value=nodes[1])
+        main_window["nodesz"].Update(value=nodes[2])
+        values.update(nodesx=nodes[0], nodesy=nodes[1], nodesz=nodes[2])
+        update_cost(main_window, values, cost_model)
+
+    def submit_nodes(values, nprocs):
+        runner.submit(
+            "nodes",
+            optimize_decomposition,
+            values,
+            nprocs,
+            on_done=lambda nodes: on_nodes(nodes, values, nprocs),
+            lane="compute",
+            message="Optimize nodes",
+        )
+
+    def on_particles(result, values):
+        plan, overrides = result
+        for key, value in overrides.items():
+            main_window[key].Update(value=value)
+        values.update(overrides)
+        update_cost(main_window, values, cost_model)
+        if plan.limited:
+            sg.popup(
+                "予算内では目標の雑音のレベルに届きません (雑音のレベル {:.4g})".format(
+                    plan.noise
+                )
+            )
+
+    def submit_particles(values, target, budget):
+        runner.submit(
+            "particles",
+            optimize_species,
+            values,
+            target,
+            budget,
+            on_done=lambda result: on_particles(result, values),
+            lane="compute",
+            message="Optimize particles",
+        )
+
+    def on_suggested(nprocs):
+        if nprocs is None:
+            sg.popup("締め切りまでに終わるプロセス数がありません")
+            return
+        main_window["nprocs"].Update(value=nprocs)
+
+    submit_search("")
+    submit_load(args.inppath or ROOT_DIR / config["Default"]["DefaultInpPath"])
+    show_tasks(main_window, runner)
 
     while True:
-        window, event, values = sg.read_all_windows()
+        window, event, values = sg.read_all_windows(timeout=debouncer.timeout())
+
+        if event == sg.TIMEOUT_KEY:
+            if debouncer.due() and latest is not None:
+                submit_live(latest)
+            continue
+        if window == main_window and values is not None:
+            latest = dict(values)
 
         if window == sg.WIN_CLOSED:
             break
@@ -160,6 +504,30 @@ def main():
                 config_window.close()
                 config_window = None
 
+        if event == CHANGED_EVENT:
+            debouncer.touch()
+
+        if event == PROGRESS_EVENT:
+            task, fraction, message = values[PROGRESS_EVENT]
+            if not task.cancelled and task.message:
+                show_tasks(main_window, runner, fraction, message)
+
+        if event == TASK_EVENT:
+            task = values[TASK_EVENT]
+            try:
+                runner.finish(task)
+            except MissingConversionKey as e:
+                convkey = ask_conversion_key(e.inference)
+                if convkey is not None:
+                    submit_load(task.args[0], convkey)
+            except Exception as e:
+                sg.popup("{} に失敗しました:\n{}".format(task.message, e))
+            show_tasks(main_window, runner)
+
+        if event == "Cancel Task":
+            runner.cancel_all()
+            show_tasks(main_window, runner, message="Cancelled")
+
         if event == "Save":
             filename = sg.popup_get_file(
                 "保存するファイル名を指定してください",
@@ -171,7 +539,8 @@ def main():
             )
             if filename is None or len(filename) == 0:
                 continue
-            saver.save(filename, inp, values)
+            submit_save(filename, values)
+            show_tasks(main_window, runner)
 
         if event == "Load":
             filename = sg.popup_get_file(
@@ -184,9 +553,8 @@ def main():
             )
             if filename is None or len(filename) == 0:
                 continue
-            res = loader.load(filename, main_window)
-            if res is not None:
-                inp = res
+            submit_load(filename)
+            show_tasks(main_window, runner)
 
         if event == "Apply Template" or event == "template_file_double_clicked":
             if len(values["template_file"]) == 0:
@@ -195,9 +563,8 @@ def main():
             filename = values["template_file"][0]
             filepath = str((ROOT_DIR / "template" / filename).resolve())
 
-            res = loader.load(filepath, main_window)
-            if res is not None:
-                inp = res
+            submit_load(filepath)
+            show_tasks(main_window, runner)
 
         if event == "Save Template":
             filename = sg.popup_get_file(
@@ -211,12 +578,59 @@ def main():
             )
             if filename is None or len(filename) == 0:
                 continue
-            saver.save(filename, inp, values)
+            query = values["template_search"]
+            submit_save(filename, values, on_done=lambda _: submit_search(query))
+            show_tasks(main_window, runner)
+
+        if event == "template_search":
+            submit_search(values["template_search"])
+            show_tasks(main_window, runner)
+
+        if event == "template_file" and len(values["template_file"]) > 0:
+            entry = templates.entries.get(values["template_file"][0])
+            if entry is not None:
+                main_window["template_summary"].Update(value=describe(entry))
 
         if event == "Check":
-            main_window["debye"].Update(value=debye(values))
-            main_window["egyro"].Update(value=egyro(values))
-            main_window["igyro"].Update(value=igyro(values))
+            submit_check(dict(values))
+            show_tasks(main_window, runner)
+
+        if event == "Optimize nodes":
+            try:
+                nprocs = int(values["nprocs"])
+            except ValueError:
+                sg.popup_error("プロセス数が不正です: {!r}".format(values["nprocs"]))
+                continue
+            submit_nodes(dict(values), nprocs)
+            show_tasks(main_window, runner)
+
+        if event == "Optimize particles":
+            try:
+                target = float(values["noise_target"])
+                budget = str(values["np_budget"]).strip()
+                budget = float(budget) if budget else None
+            except ValueError:
+                sg.popup_error(
+                    "雑音のレベルの目標または超粒子数の予算が不正です: {!r}, {!r}".format(
+                        values["noise_target"], values["np_budget"]
+                    )
+                )
+                continue
+            submit_particles(dict(values), target, budget)
+            show_tasks(main_window, runner)
+
+        if event == "Suggest processes":
+            runner.submit(
+                "suggest",
+                suggest_processes,
+                dict(values),
+                config,
+                cost_model,
+                on_done=on_suggested,
+                lane="compute",
+                message="Suggest processes",
+            )
+            show_tasks(main_window, runner)
 
         if event == "Open Conversion":
             if conv_window is not None:
@@ -241,6 +655,7 @@ def main():
         if event == "Restart Window":
             res = sg.popup_ok_cancel("Can I just restart this window?")
             if res == "OK":
+                runner.shutdown()
                 main_window.close()
                 if conv_window is not None:
                     conv_window.close()
@@ -265,6 +680,7 @@ def main():
             with open("config.ini", "w", encoding="utf-8") as f:
                 config.write(f)
 
+    runner.shutdown()
     main_window.close()
 
 
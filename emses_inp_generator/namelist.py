@@ -0,0 +1,451 @@
+"""plasma.inpの形式のnamelistを高速に読み書きする.
+
+f90nml (emout.InpFile) を用いずに, ファイルを1行ずつ読んで以下を扱う.
+
+    !!key dx=[..],to_c=[..] : 1行目の単位変換キー (UnitConversionKey.loadと同じ形式)
+    &group ... /            : グループ (&endによる終端を含む)
+    key = v1, v2            : 値のリスト (複数行にわたってもよい)
+    key(1:2) = v1, v2       : 添字の範囲 (key(3), key(3:)も可)
+    ! comment               : コメント (文字列の中の!は除く)
+
+値は参照されたときに初めて変換する. 元の行は全て保持し, setで変更した変数の行だけを
+書き換えるため, 変更しなければdumps()は読み込んだ文字列とバイト単位で一致する.
+
+多次元の添字, 同じ名前のグループの繰り返しなど, この形式で用いないものは
+NamelistErrorとする (emout.InpFileで読むこと).
+"""
+import re
+
+KEY_PATTERN = re.compile(r'!!key\s+dx=\[([+-]?\d+(?:\.\d+)?)\],to_c=\[([+-]?\d+(?:\.\d+)?)\]')
+GROUP_PATTERN = re.compile(r'[&$]([A-Za-z_]\w*)')
+ASSIGN_PATTERN = re.compile(r'([A-Za-z_][\w%]*)\s*(?:\(([^)]*)\))?\s*=')
+# 値の途中から始まる次の代入文 (a = 1, b = 2 のように同じ行に並ぶ場合)
+NEXT_ASSIGN_PATTERN = re.compile(r'[\s,]([A-Za-z_][\w%]*)\s*(?:\([^)]*\))?\s*=')
+REPEAT_PATTERN = re.compile(r'(\d+)\*(.*)')
+LINE_ASSIGN_PATTERN = re.compile(
+    r'\s*([A-Za-z_][\w%]*)\s*(?:\(([^),]*)\))?\s*=([^=/!\'"&$(]*)$')
+LINE_GROUP_PATTERN = re.compile(r'\s*[&$](?![Ee][Nn][Dd]\b)([A-Za-z_]\w*)\s*$')
+LINE_END_PATTERN = re.compile(r'\s*(?:/|[&$][Ee][Nn][Dd])\s*$')
+
+INDENT = '    '
+
+
+class NamelistError(ValueError):
+    pass
+
+
+def parse_key(line):
+    """!!keyの行から(dx, to_c)を返す. !!keyの行でなければNone."""
+    if not line.startswith('!!key'):
+        return None
+    m = KEY_PATTERN.match(line.strip())
+    if m is None:
+        return None
+    return float(m.group(1)), float(m.group(2))
+
+
+def _mask_strings(text):
+    """文字列の中身を'_'に置き換え, コメントを除いた文字列を返す (長さは変えない)."""
+    if "'" not in text and '"' not in text:
+        index = text.find('!')
+        return text if index < 0 else text[:index]
+
+    chars = list(text)
+    quote = None
+    for i, c in enumerate(text):
+        if quote is not None:
+            if c == quote:
+                quote = None
+            else:
+                chars[i] = '_'
+        elif c == "'" or c == '"':
+            quote = c
+        elif c == '!':
+            return ''.join(chars[:i])
+    return ''.join(chars)
+
+
+def _split_tokens(raw):
+    """値の文字列を要素の文字列のリストにする (空の要素はNone)."""
+    masked = _mask_strings(raw)
+    if '(' in masked:
+        raise NamelistError('Complex values are not supported: {}'.format(raw.strip()))
+
+    tokens = []
+    position = 0
+    pieces = masked.split(',')
+    for i, piece in enumerate(pieces):
+        text = raw[position:position + len(piece)]
+        position += len(piece) + 1
+
+        words = piece.split()
+        if len(words) == 0:
+            # 最後のカンマの後ろは値としない (a = 1, 2, )
+            if i < len(pieces) - 1:
+                tokens.append(None)
+            continue
+        if len(words) == 1:
+            tokens.append(text.strip())
+            continue
+
+        # 空白区切りの値 (a = 1 2 3)
+        offset = 0
+        for word in words:
+            start = piece.index(word, offset)
+            offset = start + len(word)
+            tokens.append(text[start:offset])
+    return tokens
+
+
+def _convert(token):
+    if token is None:
+        return None
+
+    first = token[0]
+    if first == "'" or first == '"':
+        return token[1:-1].replace(first * 2, first)
+
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token.replace('d', 'e').replace('D', 'e'))
+    except ValueError:
+        pass
+
+    lower = token.lower()
+    if lower.startswith('.t') or lower == 't':
+        return True
+    if lower.startswith('.f') or lower == 'f':
+        return False
+    raise NamelistError('Invalid value: {}'.format(token))
+
+
+def parse_values(raw):
+    """値の文字列 ("1, 2*0.5, 'a'") をPythonの値のリストにする."""
+    values = []
+    for token in _split_tokens(raw):
+        if token is not None and '*' in token and token[0] not in '\'"':
+            m = REPEAT_PATTERN.match(token)
+            if m:
+                value = _convert(m.group(2) or None)
+                values.extend([value] * int(m.group(1)))
+                continue
+        values.append(_convert(token))
+    return values
+
+
+def _start_of(index):
+    if index is None:
+        return None
+    if ',' in index:
+        raise NamelistError('Multi-dimensional indices are not supported: ({})'.format(index))
+    first = index.split(':')[0].strip()
+    return int(first) if first else 1
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '.true.' if value else '.false.'
+    if isinstance(value, str):
+        return "'{}'".format(value.replace("'", "''"))
+    return repr(value)
+
+
+def format_entry(name, value, start_index=None, indent=INDENT):
+    """f90nmlと同じ形式の代入文の行を返す."""
+    if not isinstance(value, (list, tuple)):
+        return '{}{} = {}\n'.format(indent, name, format_value(value))
+    if start_index is None:
+        head = name
+    else:
+        head = '{}({}:{})'.format(name, start_index, start_index + len(value) - 1)
+    return '{}{} = {}\n'.format(indent, head, ', '.join(map(format_value, value)))
+
+
+class Entry:
+    """1つの代入文. 値 (values) は初めて参照されたときに変換する."""
+
+    __slots__ = ('name', 'index', 'raw', 'first_line', 'last_line', '_values')
+
+    def __init__(self, name, index, raw, line):
+        self.name = name
+        self.index = index
+        self.raw = raw
+        self.first_line = line
+        self.last_line = line
+        self._values = None
+
+    @property
+    def start(self):
+        """開始添字. 添字が無ければNone."""
+        return _start_of(self.index)
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = parse_values(self.raw)
+        return self._values
+
+
+class Group:
+    __slots__ = ('name', 'first_line', 'last_line', 'entries', '_merged')
+
+    def __init__(self, name, line):
+        self.name = name
+        self.first_line = line
+        self.last_line = None
+        self.entries = {}  # 変数名 -> [Entry, ...]
+        self._merged = {}
+
+    def value(self, name):
+        """変数の値を返す (emout.InpFileと同じく, 添字が無く値が1つならスカラー)."""
+        if name in self._merged:
+            return self._merged[name]
+        value, _ = _merge(self.entries[name])
+        self._merged[name] = value
+        return value
+
+    def start_index(self, name):
+        _, start = _merge(self.entries[name])
+        return start
+
+    def to_dict(self):
+        return {name: self.value(name) for name in self.entries}
+
+
+def _merge(entries):
+    """(値, 開始添字) を返す. 添字を持つ代入文が無ければ開始添字はNone."""
+    if all(entry.start is None for entry in entries):
+        values = entries[-1].values
+        return (values[0] if len(values) == 1 else list(values)), None
+
+    start = min(entry.start or 1 for entry in entries)
+    merged = []
+    for entry in entries:
+        offset = (entry.start or 1) - start
+        values = entry.values
+        if len(merged) < offset + len(values):
+            merged.extend([None] * (offset + len(values) - len(merged)))
+        for i, value in enumerate(values):
+            if value is not None:
+                merged[offset + i] = value
+    return merged, start
+
+
+class NamelistFile:
+    """読み込んだnamelistファイル.
+
+    emout.InpFileと同じく, inp['nx'] (全グループから探す) や
+    inp['intp']['path'] (グループの辞書) で値を参照できる.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.key = parse_key(lines[0]) if lines else None
+        self.groups = {}
+        self._owners = {}  # 変数名 -> 最初に現れたグループ名
+        self._shared_lines = set()
+        self._parse()
+
+    @property
+    def convkey(self):
+        if self.key is None:
+            return None
+        from emout import UnitConversionKey
+        return UnitConversionKey(*self.key)
+
+    def _parse(self):
+        group = None
+        entry = None
+        for number, line in enumerate(self.lines):
+            # よく現れる形の行 (代入文1つ, グループの開始と終端) は正規表現1回で処理する
+            if group is not None:
+                m = LINE_ASSIGN_PATTERN.match(line)
+                if m is not None:
+                    name = m.group(1).lower()
+                    entry = Entry(name, m.group(2), m.group(3), number)
+                    group.entries.setdefault(name, []).append(entry)
+                    self._owners.setdefault(name, group.name)
+                    continue
+                if LINE_END_PATTERN.match(line):
+                    group.last_line = number
+                    group = None
+                    entry = None
+                    continue
+            else:
+                m = LINE_GROUP_PATTERN.match(line)
+                if m is not None:
+                    name = m.group(1).lower()
+                    if name in self.groups:
+                        raise NamelistError('Repeated group: &{}'.format(name))
+                    group = Group(name, number)
+                    self.groups[name] = group
+                    continue
+
+            text = _mask_strings(line)
+            if not text or text.isspace():
+                continue
+
+            statements = 0
+            position = len(text) - len(text.lstrip())
+            while position < len(text):
+                c = text[position]
+                if c.isspace() or (c == ',' and entry is None):
+                    position += 1
+                    continue
+                statements += 1
+
+                if group is None:
+                    m = GROUP_PATTERN.match(text, position)
+                    if m is None:
+                        # グループの外の文字列は無視する
+                        break
+                    name = m.group(1).lower()
+                    if name in self.groups:
+                        raise NamelistError('Repeated group: &{}'.format(name))
+                    group = Group(name, number)
+                    self.groups[name] = group
+                    position = m.end()
+                    continue
+
+                if c == '/' or ((c == '&' or c == '$')
+                                and text[position + 1:position + 4].lower() == 'end'):
+                    group.last_line = number
+                    group = None
+                    entry = None
+                    position += 1 if c == '/' else 4
+                    continue
+
+                m = ASSIGN_PATTERN.match(text, position)
+                if m is not None:
+                    name = m.group(1).lower()
+                    entry = Entry(name, m.group(2), '', number)
+                    group.entries.setdefault(name, []).append(entry)
+                    self._owners.setdefault(name, group.name)
+                    position = m.end()
+                elif entry is None:
+                    raise NamelistError('Line {}: unexpected text: {}'.format(
+                        number + 1, line.strip()))
+
+                # 値は次の代入文かグループの終端まで続く
+                end = len(text)
+                slash = text.find('/', position)
+                if slash >= 0:
+                    end = slash
+                if '=' in text[position:end]:
+                    m = NEXT_ASSIGN_PATTERN.search(text, position, end)
+                    if m is not None:
+                        end = m.start() + 1
+                entry.raw += line[position:end] + ' '
+                entry.last_line = number
+                position = end
+
+            if statements > 1:
+                self._shared_lines.add(number)
+
+        if group is not None:
+            raise NamelistError('Group &{} is not terminated'.format(group.name))
+
+    def __contains__(self, key):
+        return key in self.groups or key in self._owners
+
+    def __getitem__(self, key):
+        if key in self.groups:
+            return self.groups[key].to_dict()
+        if key in self._owners:
+            return self.groups[self._owners[key]].value(key)
+        raise KeyError(key)
+
+    def get(self, group, name, default=None):
+        if group not in self.groups or name not in self.groups[group].entries:
+            return default
+        return self.groups[group].value(name)
+
+    def start_index(self, group, name):
+        return self.groups[group].start_index(name)
+
+    def to_dict(self):
+        return {name: group.to_dict() for name, group in self.groups.items()}
+
+    def _editable_entries(self, group, name):
+        entries = self.groups[group].entries.get(name, [])
+        for entry in entries:
+            for number in range(entry.first_line, entry.last_line + 1):
+                if number in self._shared_lines:
+                    raise NamelistError(
+                        'Line {}: {} shares the line with other statements'.format(
+                            number + 1, name))
+        return entries
+
+    def _replace_lines(self, replacements):
+        """{行番号: 新しい行のリスト} で行を置き換え, 解析し直す."""
+        lines = []
+        for number, line in enumerate(self.lines):
+            lines.extend(replacements.get(number, [line]))
+        self.__init__(lines)
+
+    def set(self, group, name, value, start_index=None):
+        """変数の値を設定する. 他の行は変更しない.
+
+        既存の代入文は最初のものの位置に1行にまとめて書き換える.
+        グループが無ければファイルの末尾に追加する.
+        """
+        name = name.lower()
+        if group not in self.groups:
+            text = '&{}\n{}/\n'.format(group, format_entry(name, value, start_index))
+            lines = list(self.lines)
+            if lines and not lines[-1].endswith('\n'):
+                lines[-1] += '\n'
+            self.__init__(lines + ['\n', text])
+            return
+
+        entries = self._editable_entries(group, name)
+        if len(entries) == 0:
+            line = format_entry(name, value, start_index)
+            end = self.groups[group].last_line
+            self._replace_lines({end: [line, self.lines[end]]})
+            return
+
+        first = self.lines[entries[0].first_line]
+        indent = first[:len(first) - len(first.lstrip())]
+        replacements = {}
+        for entry in entries:
+            for number in range(entry.first_line, entry.last_line + 1):
+                replacements[number] = []
+        replacements[entries[0].first_line] = [
+            format_entry(name, value, start_index, indent=indent)]
+        self._replace_lines(replacements)
+
+    def remove(self, group, name):
+        replacements = {}
+        for entry in self._editable_entries(group, name.lower()):
+            for number in range(entry.first_line, entry.last_line + 1):
+                replacements[number] = []
+        self._replace_lines(replacements)
+
+    def dumps(self):
+        return ''.join(self.lines)
+
+    def save(self, filename):
+        from .default.saver import write_atomic
+
+        write_atomic(filename, self.dumps().encode('utf-8'))
+
+
+def parse(text):
+    return NamelistFile(text.splitlines(keepends=True))
+
+
+def load(filename):
+    with open(filename, 'r', encoding='utf-8', newline='') as f:
+        return NamelistFile(f.readlines())
+
+
+def load_key(filename):
+    """ファイルの1行目の!!keyから(dx, to_c)を返す. 無ければNone."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        return parse_key(f.readline())
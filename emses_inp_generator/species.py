@@ -0,0 +1,226 @@
+"""粒子種の表.
+
+種の並びは電子, イオン, 追加の種 (GUIのextra_species), 光電子 (use_pe) の順とする.
+光電子のように表面から放出される種 (emission) は常に最後に置く.
+各列を種の数の長さの配列として持ち, 種ごとのnamelistのベクトル (wp, qm, path, peth,
+vdri, npinなど) を配列の演算でまとめて求める.
+
+GUIのextra_speciesは1行に1種で, #以降はコメントとする.
+
+    name charge mass density temperature [drift [np_per_grid]]
+
+    charge [e], mass [me], density [/cc], temperature [eV], drift [m/s]
+    np_per_grid : 1格子あたりの超粒子数 (省略時はPICパラメータの値)
+
+イオンの1格子あたりの超粒子数はPICパラメータのnp_per_grid_i (空欄では電子と同じ) とする.
+
+準中性は自動では調整しないため, 追加の種の密度は電子とイオン (n0) と合わせて決めること.
+"""
+from dataclasses import dataclass
+from typing import List
+
+from .lazy import np
+
+# 種ごとの値を持つGUIのキー (これらに依存するsaverのdependsに加える)
+SPECIES_KEYS = ('n0', 'Te', 'Ti', 'mi2me', 'vdrie', 'vdrii', 'vdthz', 'vdthxy',
+                'np_per_grid', 'np_per_grid_i', 'extra_species', 'use_pe', 'Tp')
+
+SPECIES_ARGS = ('charge', 'mass', 'density', 'temperature', 'drift', 'np_per_grid')
+REQUIRED_ARGS = 4
+
+
+@dataclass
+class Species:
+    name: str
+    charge: float
+    mass: float
+    density: float
+    temperature: float
+    drift: float = 0.0
+    np_per_grid: float = None
+    emission: bool = False
+
+
+def parse_species(text):
+    """extra_speciesの記述からSpeciesのリストを作る."""
+    species = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        name, args = words[0], words[1:]
+        if not REQUIRED_ARGS <= len(args) <= len(SPECIES_ARGS):
+            raise ValueError('line {}: expected "name {} [{} [{}]]"'.format(
+                lineno, ' '.join(SPECIES_ARGS[:REQUIRED_ARGS]), *SPECIES_ARGS[REQUIRED_ARGS:]))
+        try:
+            species.append(Species(name, *map(float, args)))
+        except ValueError as e:
+            raise ValueError('line {}: {}'.format(lineno, e)) from None
+    return species
+
+
+def format_species(species):
+    """parse_speciesの逆 (Loaderで用いる)."""
+    lines = []
+    for s in species:
+        args = [s.charge, s.mass, s.density, s.temperature, s.drift]
+        if s.np_per_grid is not None:
+            args.append(s.np_per_grid)
+        lines.append(' '.join([s.name] + ['{:.10g}'.format(arg) for arg in args]))
+    return '\n'.join(lines)
+
+
+def count_species(values):
+    """nspec. numpyや単位系を用いずに数える."""
+    extra = parse_species(values.get('extra_species', '') or '')
+    return 2 + len(extra) + bool(values.get('use_pe', False))
+
+
+def create_species(values) -> List[Species]:
+    """GUIの値から全ての種のリストを作る."""
+    n0 = float(values['n0'])
+    np_per_grid = float(values.get('np_per_grid', 0))
+    np_per_grid_i = str(values.get('np_per_grid_i', '')).strip()
+    species = [
+        Species('e', -1.0, 1.0, n0, float(values['Te']), float(values['vdrie'])),
+        Species('i', 1.0, float(values['mi2me']), n0, float(values['Ti']),
+                float(values['vdrii']),
+                np_per_grid=float(np_per_grid_i) if np_per_grid_i else None),
+    ]
+    species += parse_species(values.get('extra_species', '') or '')
+    if values['use_pe']:
+        species.append(Species('pe', -1.0, 1.0, n0, float(values.get('Tp', 1.0)),
+                               np_per_grid=0, emission=True))
+
+    for s in species:
+        if s.np_per_grid is None:
+            s.np_per_grid = np_per_grid
+    return species
+
+
+class SpeciesTable:
+    def __init__(self, species, vdthz=0.0, vdthxy=0.0):
+        self.names = [s.name for s in species]
+        self.charge = np.array([s.charge for s in species])
+        self.mass = np.array([s.mass for s in species])
+        self.density = np.array([s.density for s in species])
+        self.temperature = np.array([s.temperature for s in species])
+        self.drift = np.array([s.drift for s in species])
+        self.np_per_grid = np.array([s.np_per_grid for s in species])
+        self.emission = np.array([s.emission for s in species], dtype=bool)
+        self.vdthz = float(vdthz)
+        self.vdthxy = float(vdthxy)
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(create_species(values), values['vdthz'], values['vdthxy'])
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nspec(self):
+        return len(self)
+
+    @property
+    def nplasma(self):
+        """放出される種を除いた (領域内に初期に存在する) 種の数."""
+        return int(np.count_nonzero(~self.emission))
+
+    def vectors(self, unit, ngrid):
+        """種ごとのnamelistの値 {(グループ, 名前): リスト} を返す.
+
+        vdri, vdthz, vdthxyは放出される種を除いた種の分だけ返す.
+        """
+        qe = unit.qe.from_unit
+        me = unit.me.from_unit
+        e0 = unit.e0.from_unit
+        q = self.charge * qe
+        m = self.mass * me
+
+        wp = unit.f.trans(np.sqrt(self.density * 1e6 * q * q / m / e0))
+        path = unit.v.trans(np.sqrt(qe * self.temperature / m))
+        plasma = ~self.emission
+        nplasma = self.nplasma
+
+        return {
+            ('plasma', 'wp'): wp.tolist(),
+            ('intp', 'qm'): (self.charge / self.mass).tolist(),
+            ('intp', 'path'): path.tolist(),
+            ('intp', 'peth'): path.tolist(),
+            ('intp', 'npin'): (self.np_per_grid.astype(int) * ngrid).tolist(),
+            ('intp', 'vdri'): unit.v.trans(self.drift[plasma]).tolist(),
+            ('intp', 'vdthz'): [self.vdthz] * nplasma,
+            ('intp', 'vdthxy'): [self.vdthxy] * nplasma,
+        }
+
+
+def emission_index(inp):
+    """ファイルの放出される種 (最後の種でnpin = 0) の番号 (1から). 無ければNone."""
+    nspec = inp['nspec']
+    npin = inp['npin'] if isinstance(inp['npin'], list) else [inp['npin']]
+    if nspec >= 3 and len(npin) >= nspec and npin[nspec - 1] == 0:
+        return nspec
+    return None
+
+
+def _span(inp, group, name):
+    current = inp[group][name]
+    length = len(current) if isinstance(current, list) else 1
+    start = (inp.nml[group].start_index.get(name) or [None])[0] or 1
+    return start, length
+
+
+def truncate(inp, group, name, n):
+    """name(n+1:) を削除する."""
+    if name not in inp[group]:
+        return
+    start, length = _span(inp, group, name)
+    for index in reversed(range(max(n + 1, start), start + length)):
+        inp.remove(name, index=index)
+
+
+def getentry(inp, group, name, index, default=None):
+    """name(index) を返す. 無い場合はdefault."""
+    if name not in inp[group]:
+        return default
+    start, length = _span(inp, group, name)
+    if not start <= index < start + length:
+        return default
+    current = inp[group][name]
+    value = current[index - start] if isinstance(current, list) else current
+    return default if value is None else value
+
+
+def setentry(inp, group, name, index, value, first):
+    """name(index) = value とし, name(first:index-1) と name(index+1:) を削除する.
+
+    name(:first-1) (元のファイルの電子やイオンの値など) は残す.
+    途中の要素は削除すると後の要素がずれるため空 (Fortranの初期値) にする.
+    """
+    inp.setlist(group, name, value, start_index=index)
+    truncate(inp, group, name, index)
+
+    start, length = _span(inp, group, name)
+    current = inp[group][name]
+    for i in range(max(first, start), index):
+        current[i - start] = None
+    while start < index and current[0] is None:
+        inp.remove(name, index=start)
+        start += 1
+        current = inp[group][name]
+
+
+def setvector(inp, group, name, values):
+    """name(1:n) = values とし, n+1番目以降の値 (前回の保存や元のファイルのもの) を削除する."""
+    inp.setlist(group, name, list(values))
+    truncate(inp, group, name, len(values))
+
+
+def padvector(inp, group, name, n):
+    """name(1:n) を最後の値で埋めて長さnにする (元のファイルの値を追加の種に用いる)."""
+    if name not in inp[group]:
+        return
+    current = inp[group][name]
+    current = current if isinstance(current, list) else [current]
+    setvector(inp, group, name, (current + [current[-1]] * n)[:n])
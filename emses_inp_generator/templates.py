@@ -0,0 +1,255 @@
+"""テンプレートファイルの索引.
+
+テンプレートのディレクトリの*.inpをLoaderで読み込んだGUIの値 (格子数, nspec, use_em,
+物理単位系のn0, Te, Bなど) をキャッシュファイル (INDEX_NAME) に保存し, 検索に用いる.
+
+キャッシュは各ファイルの (mtime, サイズ) が変わったときだけ内容のハッシュを計算し,
+ハッシュも変わったファイルだけを読み直す (refresh). 変更が無ければファイルは開かない.
+
+検索の条件 (search) は空白区切りで, 全てを満たすものを返す.
+
+    nz=512, n0>=100, Te<5  : GUIの値の比較 (=, !=, <, <=, >, >=)
+    pe, em, hole            : use_pe, use_em, use_holeが真 (先頭に-を付けると偽)
+    pe=no                   : -peと同じ (コマンドラインで-から始まる語を避ける場合)
+    その他の語              : ファイル名に含まれる (大文字小文字を区別しない)
+
+inpgen templates [条件 ...] で同じ検索をGUIを用いずに行える.
+"""
+import hashlib
+import json
+import operator
+import os
+import re
+from argparse import ArgumentParser
+from pathlib import Path
+
+from .species import count_species
+
+TEMPLATE_DIR = Path(__file__).parent / 'template'
+INDEX_NAME = '.index.json'
+INDEX_VERSION = 1
+
+FLAGS = {
+    'pe': 'use_pe',
+    'em': 'use_em',
+    'hole': 'use_hole',
+}
+
+CONDITION_PATTERN = re.compile(r'([A-Za-z_][\w/]*)\s*(==|!=|<=|>=|=|<|>)\s*(.+)')
+OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def create_template_loader(config=None):
+    """config.iniで有効なパラメータの値を全て読み込むLoaderを作る."""
+    from .additional import add_additional_parameter
+    from .batch.generator import load_config
+    from .default.loader import create_default_loader
+    from .default.saver import create_default_saver
+
+    if config is None:
+        config = load_config()
+    use_physical_dt = config['Control'].getboolean('UsePhysicalDt')
+    loader = create_default_loader(use_physical_dt=use_physical_dt)
+    saver = create_default_saver(use_physical_dt=use_physical_dt)
+    add_additional_parameter(config, None, loader, saver)
+    return loader
+
+
+def _hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _parse_literal(text):
+    lower = text.lower()
+    if lower in ('true', 'yes', 'on'):
+        return True
+    if lower in ('false', 'no', 'off'):
+        return False
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _matches(value, op, expected):
+    if isinstance(expected, bool) or isinstance(value, bool):
+        return op(bool(value), bool(expected))
+    if isinstance(expected, float):
+        try:
+            return op(float(value), expected)
+        except (TypeError, ValueError):
+            return False
+    return op(str(value), expected)
+
+
+def compile_query(query):
+    """検索の条件の文字列を, 索引のエントリを受け取って真偽を返す関数にする."""
+    tests = []
+    for word in query.split():
+        m = CONDITION_PATTERN.fullmatch(word)
+        if m is not None:
+            key, op, expected = m.group(1), OPERATORS[m.group(2)], _parse_literal(m.group(3))
+            key = FLAGS.get(key, key)
+            tests.append(lambda e, k=key, o=op, x=expected:
+                         k in e['values'] and _matches(e['values'][k], o, x))
+            continue
+
+        negate = word.startswith('-')
+        flag = FLAGS.get(word.lstrip('-').lower())
+        if flag is not None:
+            tests.append(lambda e, k=flag, n=negate:
+                         bool(e['values'].get(k, False)) != n)
+            continue
+
+        text = word.lower()
+        tests.append(lambda e, t=text: t in e['name'].lower())
+
+    return lambda entry: all(test(entry) for test in tests)
+
+
+def describe(entry):
+    """一覧に表示する1行の説明."""
+    if entry.get('error'):
+        return 'error: {}'.format(entry['error'])
+    values = entry['values']
+    parts = ['{}x{}x{}'.format(values.get('nx'), values.get('ny'), values.get('nz'))]
+    parts.append('nspec={}'.format(count_species(values)))
+    for flag, key in FLAGS.items():
+        if values.get(key):
+            parts.append(flag)
+    for key, unit in (('n0', '/cc'), ('Te', 'eV'), ('B', 'nT')):
+        if key in values:
+            parts.append('{}={:.4g} {}'.format(key, float(values[key]), unit))
+    return ', '.join(parts)
+
+
+class TemplateIndex:
+    def __init__(self, directory=TEMPLATE_DIR, loader=None, cache_path=None):
+        self.directory = Path(directory)
+        self.cache_path = Path(cache_path or self.directory / INDEX_NAME)
+        self._loader = loader
+        self.entries = {}  # ファイル名 -> エントリ
+        self._load_cache()
+
+    @property
+    def loader(self):
+        if self._loader is None:
+            self._loader = create_template_loader()
+        return self._loader
+
+    def _signature(self):
+        return sorted(self.loader.applyers)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get('version') != INDEX_VERSION or cache.get('keys') != self._signature():
+            return
+        self.entries = {entry['name']: entry for entry in cache['entries']}
+
+    def _save_cache(self):
+        cache = {
+            'version': INDEX_VERSION,
+            'keys': self._signature(),
+            'entries': [self.entries[name] for name in sorted(self.entries)],
+        }
+        temporary = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(temporary, self.cache_path)
+        except OSError:
+            # 書き込めない場所にインストールされている場合はキャッシュしない
+            pass
+
+    def _read(self, path, stat, digest):
+        entry = {
+            'name': path.name,
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha1': digest,
+            'values': {},
+            'error': None,
+        }
+        try:
+            _, entry['values'] = self.loader.read_values(path)
+        except Exception as e:
+            entry['error'] = str(e) or type(e).__name__
+        return entry
+
+    def refresh(self):
+        """変更されたファイルだけを読み直す. 読み直したファイル名のリストを返す."""
+        entries = {}
+        updated = []
+        changed = False
+        with os.scandir(self.directory) as it:
+            paths = sorted(Path(e.path) for e in it
+                           if e.name.endswith('.inp') and e.is_file())
+
+        for path in paths:
+            stat = path.stat()
+            entry = self.entries.get(path.name)
+            if (entry is not None and entry['mtime'] == stat.st_mtime_ns
+                    and entry['size'] == stat.st_size):
+                entries[path.name] = entry
+                continue
+
+            changed = True
+            digest = _hash(path)
+            if entry is not None and entry['sha1'] == digest:
+                entry = dict(entry, mtime=stat.st_mtime_ns, size=stat.st_size)
+            else:
+                entry = self._read(path, stat, digest)
+                updated.append(path.name)
+            entries[path.name] = entry
+
+        changed |= len(entries) != len(self.entries)
+        self.entries = entries
+        if changed:
+            self._save_cache()
+        return updated
+
+    def names(self):
+        return sorted(self.entries)
+
+    def search(self, query=''):
+        """条件を満たすエントリのリストを, ファイル名の順に返す."""
+        test = compile_query(query)
+        return [self.entries[name] for name in self.names() if test(self.entries[name])]
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(prog='inpgen templates',
+                            description='Search template files by their parameters')
+    parser.add_argument('query', nargs='*',
+                        help='Conditions such as "pe hole nz=512 n0>=100"')
+    parser.add_argument('--dir', default=None, help='Template directory')
+    parser.add_argument('--config', default=None, help='Config file')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the cache')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from .batch.generator import load_config
+
+    args = parse_args(argv)
+    loader = create_template_loader(load_config(args.config))
+    index = TemplateIndex(args.dir or TEMPLATE_DIR, loader=loader)
+    if args.rebuild:
+        index.entries = {}
+    index.refresh()
+
+    for entry in index.search(' '.join(args.query)):
+        print('{:<30} {}'.format(entry['name'], describe(entry)))
@@ -0,0 +1,65 @@
+"""物理単位系とEMSES単位系の変換 (emout.Units) を共有・ベクトル化する.
+
+emout.Unitsは(dx, to_c)だけで決まるため, 同じ組のUnitsは使い回す.
+to_emses / to_physicalは値の配列 (スイープの列など) を一度に変換する.
+単位の名前にはUnitsの属性名 ('v', 'f', 'J', 't', ...) を用いる.
+"""
+from functools import lru_cache
+
+from .lazy import np
+
+# 物理定数 (qe, me, e0など) のみを用いる場合の(dx, to_c).
+# 物理定数の値はdx, to_cによらないため, 値そのものに意味はない.
+CONSTANT_DX = 0.001
+CONSTANT_TO_C = 10000
+
+UNITS_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=UNITS_CACHE_SIZE)
+def _cached_units(dx, to_c):
+    from emout import Units
+    return Units(dx=dx, to_c=to_c)
+
+
+def get_units(dx=CONSTANT_DX, to_c=CONSTANT_TO_C):
+    """(dx, to_c)に対応するemout.Unitsを返す (LRUキャッシュ付き)."""
+    return _cached_units(float(dx), float(to_c))
+
+
+def clear_units_cache():
+    _cached_units.cache_clear()
+
+
+def ratio(name, dx, to_c):
+    """EMSES単位系での値 / 物理単位系での値.
+
+    dx, to_cは配列でもよく, その場合は(dx, to_c)の組ごとに比を求めて返す.
+    """
+    dx = np.asarray(dx, dtype=float)
+    to_c = np.asarray(to_c, dtype=float)
+    if dx.ndim == 0 and to_c.ndim == 0:
+        return getattr(get_units(dx, to_c), name).ratio
+
+    dx, to_c = np.broadcast_arrays(dx, to_c)
+    if dx.size > 0 and (dx == dx.flat[0]).all() and (to_c == to_c.flat[0]).all():
+        return np.full(dx.shape, getattr(get_units(dx.flat[0], to_c.flat[0]), name).ratio)
+
+    # 組を整数の符号にしてから一意にする (np.unique(axis=0) より速い)
+    dxs, dx_index = np.unique(dx.ravel(), return_inverse=True)
+    to_cs, to_c_index = np.unique(to_c.ravel(), return_inverse=True)
+    codes, inverse = np.unique(dx_index * len(to_cs) + to_c_index, return_inverse=True)
+    ratios = np.array([getattr(get_units(dxs[code // len(to_cs)],
+                                         to_cs[code % len(to_cs)]), name).ratio
+                       for code in codes])
+    return ratios[inverse.ravel()].reshape(dx.shape)
+
+
+def to_emses(name, values, dx, to_c):
+    """物理単位系の値 (配列可) をEMSES単位系に変換する."""
+    return np.asarray(values, dtype=float) * ratio(name, dx, to_c)
+
+
+def to_physical(name, values, dx, to_c):
+    """EMSES単位系の値 (配列可) を物理単位系に変換する."""
+    return np.asarray(values, dtype=float) / ratio(name, dx, to_c)
@@ -14,6 +14,10 @@ setup(
     long_description_content_type="text/markdown",
     version='1.0.0',
     install_requires=_require_packages('requirements.txt'),
+    extras_require={
+        # inpgen batchのsweep mode = "sobol"
+        'sobol': ['scipy'],
+    },
     author='Nkzono99',
     author_email='210x218x@gsuite.stu.kobe-u.ac.jp',
     url='https://github.com/Nkzono99/emses_inp_generator',
@@ -21,7 +25,17 @@ setup(
     entry_points={
         'console_scripts': [
             'inpgen = emses_inp_generator.main:main',
-        ]
+        ],
+        # 追加のパラメータのプラグイン (emses_inp_generator/additional/registry.py)
+        'emses_inp_generator.parameters': [
+            'simple_plasma = emses_inp_generator.additional.registry:SIMPLE_PLASMA',
+            'pic = emses_inp_generator.additional.registry:PIC',
+            'photo_electron = emses_inp_generator.additional.registry:PHOTO_ELECTRON',
+            'boundary = emses_inp_generator.additional.registry:BOUNDARY',
+            'simple_hole = emses_inp_generator.additional.registry:SIMPLE_HOLE',
+            'file_io = emses_inp_generator.additional.registry:FILE_IO',
+            'charge_acceleration = emses_inp_generator.additional.registry:CHARGE_ACCELERATION',
+        ],
     },
     classifiers=[
         "Programming Language :: Python :: 3",
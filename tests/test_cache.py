@@ -0,0 +1,37 @@
+import os
+
+from emses_inp_generator.batch import InpGenerator
+from emses_inp_generator.batch.cache import InpCache
+
+
+def test_saving_over_a_linked_output_keeps_the_cache_object(tmp_path):
+    cached = InpGenerator(cache=InpCache(tmp_path / 'cache'))
+    cached.save(tmp_path / 'a.inp', {'nx': 32})
+    cached.save(tmp_path / 'b.inp', {'nx': 32})
+    source = cached.cache.object_path(cached.last_digest)
+    content = source.read_text()
+    assert os.path.samefile(source, tmp_path / 'a.inp')
+
+    InpGenerator().save(tmp_path / 'a.inp', {'nx': 64})
+
+    assert source.read_text() == content
+    assert (tmp_path / 'b.inp').read_text() == content
+    assert (tmp_path / 'a.inp').read_text() != content
+    assert not os.path.samefile(source, tmp_path / 'a.inp')
+
+
+def test_generator_saves_keep_the_cache_within_max_bytes(tmp_path):
+    probe = InpGenerator(cache=InpCache(tmp_path / 'probe'))
+    probe.save(tmp_path / 'probe.inp', {'nx': 32})
+    object_bytes = probe.cache.size()
+
+    cache = InpCache(tmp_path / 'cache', max_bytes=2.5 * object_bytes)
+    generator = InpGenerator(cache=cache)
+    for nx in (32, 40, 48, 56, 64):
+        generator.save(tmp_path / 'out{}.inp'.format(nx), {'nx': nx})
+        assert cache.size() <= cache.max_bytes
+        assert cache.object_path(generator.last_digest).exists()
+
+    assert len(cache._objects()) == 2
+    for nx in (32, 40, 48, 56, 64):
+        assert 'nx = {}'.format(nx) in (tmp_path / 'out{}.inp'.format(nx)).read_text()
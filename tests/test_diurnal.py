@@ -0,0 +1,22 @@
+from emses_inp_generator.batch.cli import create_generator
+from emses_inp_generator.batch.diurnal import angle_range, plan
+from emses_inp_generator.species import getentry
+
+
+def test_night_steps_share_one_layout_without_emission(tmp_path):
+    spec = {'values': {'use_pe': True, 'use_hole': True, 'features': 'box 20 30 20 30 5'}}
+    generator = create_generator(spec, None)
+    zeniths = angle_range(60.0, 130.0, 10.0)
+    rows = [{'zenith': z, 'azimuth': 0.0} for z in zeniths]
+
+    jobs, manifest = plan(rows, generator, spec, tmp_path)
+
+    night = [row for row in manifest if row['zenith'] >= 90.0]
+    assert len(night) == 5
+    assert [row['written'] for row in night] == [1, 0, 0, 0, 0]
+    assert len({row['path'] for row in night}) == 1
+
+    job = next(job for job in jobs if job[1]['zenith'] == 90.0)
+    assert job[2]['emission_surfaces'] == []
+    inp, _ = generator.generate(job[1], job[2])
+    assert getentry(inp, 'emissn', 'nepl', inp['nspec']) == 0
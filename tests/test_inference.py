@@ -0,0 +1,36 @@
+from emses_inp_generator.batch import InpGenerator
+from emses_inp_generator.batch import report
+from emses_inp_generator.default.inference import infer_conversion_key
+from emses_inp_generator.templates import create_template_loader
+
+
+def _headerless(tmp_path, overrides):
+    inp, _ = InpGenerator().generate(overrides)
+    filename = tmp_path / 'plasma.inp'
+    inp.convkey = None  # !!keyヘッダを書かない
+    inp.save(filename)
+    return inp, filename
+
+
+def test_inferred_key_is_rounded(tmp_path):
+    inp, _ = _headerless(tmp_path, {'dx': 0.5, 'n0': 100})
+    inference = infer_conversion_key(inp, create_template_loader().applyers,
+                                     {'n0': 100}, (1.0, 10000.0))
+    assert inference.dx == 0.5
+    assert inference.to_c == 10000.0
+    assert all(inference.determined)
+
+
+def test_report_rejects_undetermined_dx_by_default(tmp_path):
+    _, filename = _headerless(tmp_path, {'dx': 0.5, 'n0': 100})
+
+    report._init_worker(None, None)
+    _, _, values, error = report.read_run(filename)
+    assert 'dx not determined' in error
+    assert values == {}
+
+    report._init_worker(None, None, {'n0': 100})
+    _, _, values, error = report.read_run(filename)
+    assert error == ''
+    assert values['key_source'] == 'inferred'
+    assert values['n0'] == 100
@@ -0,0 +1,36 @@
+from emses_inp_generator.analysis import (GIB, estimate_memory, optimize_particles,
+                                          particle_budget, particle_costs, plan_overrides)
+from emses_inp_generator.batch import InpGenerator
+
+OVERRIDES = {'use_pe': True, 'np_auto': False, 'nnp': 10,
+             'nx': 256, 'ny': 256, 'nz': 512, 'np_per_grid': 50}
+
+
+def _values():
+    return InpGenerator().values(OVERRIDES)
+
+
+def test_memory_budget_counts_the_photoelectron_buffer_per_electron():
+    values = _values()
+    costs = particle_costs(values)
+    assert costs[0] > 1.0
+    assert all(c == 1.0 for c in costs[1:])
+
+    for gib in (50, 500):
+        budget = particle_budget(values, gib * GIB)
+        plan = optimize_particles(values, budget=budget, costs=costs)
+        assert not plan.limited
+
+        optimized = dict(values)
+        optimized.update(plan_overrides(values, plan))
+        assert estimate_memory(optimized).total_bytes <= gib * GIB
+
+    plan = optimize_particles(values, budget=particle_budget(values, 500 * GIB), costs=costs)
+    assert min(plan.np_per_grid) > 1
+
+
+def test_minimum_over_budget_is_limited():
+    values = _values()
+    plan = optimize_particles(values, budget=1.0, minimum=1)
+    assert plan.np_per_grid == [1, 1]
+    assert plan.limited
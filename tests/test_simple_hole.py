@@ -0,0 +1,64 @@
+import pytest
+
+from emses_inp_generator.batch import InpGenerator
+from emses_inp_generator.geometry import Terrain, parse_features
+from emses_inp_generator.species import getentry
+
+EXTRA_SPECIES = 'O+ 1 29376 10 0.5 4e5\nH+ 1 1836 5 0.5 4e5'
+
+
+def _start_index(inp, name):
+    return inp.nml['emissn'].start_index[name][0]
+
+
+def test_nepl_is_written_for_photoelectrons_after_extra_species():
+    generator = InpGenerator()
+    inp, _ = generator.generate({'use_pe': True, 'use_hole': True,
+                                 'extra_species': EXTRA_SPECIES})
+
+    assert inp['nspec'] == 5
+    assert _start_index(inp, 'nepl') == 5
+    assert getentry(inp, 'emissn', 'nepl', 5) == len(inp['nemd'])
+    assert getentry(inp, 'emissn', 'nepl', 3) is None
+
+
+def test_nepl_moves_when_only_species_change():
+    generator = InpGenerator()
+    incremental = generator.incremental
+
+    inp, _ = incremental.update(generator._values_with({'use_pe': True, 'use_hole': True}, None))
+    assert inp['nspec'] == 3
+    assert _start_index(inp, 'nepl') == 3
+
+    inp, _ = incremental.update(generator._values_with(
+        {'use_pe': True, 'use_hole': True, 'extra_species': EXTRA_SPECIES}, None))
+    assert inp['nspec'] == 5
+    assert _start_index(inp, 'nepl') == 5
+    assert getentry(inp, 'emissn', 'nepl', 3) is None
+    assert getentry(inp, 'emissn', 'nepl', 5) == len(inp['nemd'])
+
+
+def test_emission_planes_are_removed_without_photoelectrons():
+    generator = InpGenerator()
+    inp, _ = generator.generate({'use_pe': False, 'use_hole': True,
+                                 'extra_species': EXTRA_SPECIES})
+
+    assert inp['nspec'] == 4
+    assert 'nepl' not in inp['emissn']
+    assert 'nemd' not in inp
+
+
+@pytest.mark.parametrize('features', ['step x 32 5', 'box 20 30 20 30 5'])
+@pytest.mark.parametrize('zenith', [90.0, 100.0, 120.0, 180.0])
+def test_no_emission_below_horizon(features, zenith):
+    terrain = Terrain(64, 64, 10, parse_features(features))
+    assert terrain.emission_surfaces(1.0, zenith) == []
+    assert len(terrain.emission_surfaces(1.0, 60.0)) > 0
+
+
+def test_night_saves_no_emission_planes():
+    generator = InpGenerator()
+    inp, _ = generator.generate({'use_pe': True, 'use_hole': True, 'zenith': 120.0,
+                                 'features': 'step x 32 5'})
+    assert getentry(inp, 'emissn', 'nepl', inp['nspec']) == 0
+    assert 'nemd' not in inp
@@ -0,0 +1,21 @@
+from emses_inp_generator.batch import store as store_module
+from emses_inp_generator.batch.store import CampaignStore
+
+SPEC = {'sweep': {'axes': {'n0': [10, 20, 30]}}}
+
+
+def test_materialize_all_skips_existing_and_fsyncs_each_directory_once(tmp_path, monkeypatch):
+    store = CampaignStore.create(tmp_path / 'store', SPEC)
+    outdir = tmp_path / 'out'
+    store.materialize(0, outdir)
+
+    synced = []
+    monkeypatch.setattr(store_module, 'fsync_directory', synced.append)
+    assert store.materialize_all(outdir=outdir) == 2
+
+    new = [store.path(index, outdir).parent for index in (1, 2)]
+    assert sorted(synced) == sorted(new + [outdir])
+
+    synced.clear()
+    assert store.materialize_all(outdir=outdir) == 0
+    assert synced == []
@@ -0,0 +1,66 @@
+import pytest
+
+from emses_inp_generator.batch.sweep import iter_points
+
+AXES = {'n0': {'min': 1.0, 'max': 100.0}}
+
+
+@pytest.mark.parametrize('mode', ['lhs', 'sobol'])
+def test_sampled_modes_require_samples(mode):
+    with pytest.raises(ValueError, match='samples'):
+        list(iter_points({'mode': mode, 'axes': AXES}))
+    with pytest.raises(ValueError, match='samples'):
+        list(iter_points({'mode': mode, 'samples': 0, 'axes': AXES}))
+
+
+@pytest.mark.parametrize('mode', ['lhs', 'sobol'])
+def test_sampled_modes_yield_samples(mode):
+    points = list(iter_points({'mode': mode, 'samples': 8, 'seed': 0, 'axes': AXES}))
+    assert len(points) == 8
+    assert all(1.0 <= point['n0'] <= 100.0 for point in points)
+
+
+def test_product_does_not_need_samples():
+    points = list(iter_points({'axes': {'n0': [1, 10], 'Te': [1.0, 2.0]}}))
+    assert len(points) == 4
+
+
+def test_load_spec_rejects_sampled_sweep_without_samples(tmp_path):
+    from emses_inp_generator.batch.spec import load_spec
+
+    filename = tmp_path / 'spec.json'
+    filename.write_text('{"sweep": {"mode": "sobol", "axes": {"n0": {"min": 1, "max": 10}}}}')
+    with pytest.raises(ValueError, match='samples'):
+        load_spec(filename)
+
+
+def test_sweep_without_axes_is_rejected(tmp_path):
+    from emses_inp_generator.batch.store import CampaignStore
+
+    with pytest.raises(ValueError, match='axes'):
+        list(iter_points({'mode': 'product'}))
+    with pytest.raises(ValueError, match='axes'):
+        CampaignStore.create(tmp_path / 'store', {'sweep': {'mode': 'lhs', 'samples': 4}})
+
+
+def test_sobol_without_scipy_names_the_dependency(monkeypatch):
+    import importlib.util
+
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec',
+                        lambda name, *args: None if name == 'scipy' else find_spec(name, *args))
+    with pytest.raises(ImportError, match='scipy'):
+        list(iter_points({'mode': 'sobol', 'samples': 4, 'axes': AXES}))
+
+
+@pytest.mark.parametrize('mode', ['lhs', 'sobol'])
+def test_unseeded_sweep_is_shared_by_all_runs(mode):
+    from emses_inp_generator.batch.spec import iter_runs
+
+    spec = {'runs': [{'name': 'a'}, {'name': 'b'}],
+            'sweep': {'mode': mode, 'samples': 4, 'axes': AXES}}
+    runs = list(iter_runs(spec))
+    assert len(runs) == 8
+    a = [overrides['n0'] for name, _, overrides in runs if name.startswith('a_')]
+    b = [overrides['n0'] for name, _, overrides in runs if name.startswith('b_')]
+    assert a == b